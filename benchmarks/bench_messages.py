@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Round-trip latency & throughput of send_message_to / wait_for_message_from
+
+A listener in another process echoes each message back. Messages are
+binary so that the payload size is exactly what's sent, whatever the
+serialiser; see bench_serialisers for the cost of serialising. The
+smallest messages are sent again with config.COLLECT_STATS set to show
+what counting them costs.
+"""
+import networkzero as nw0
+
+import common
+
+SIZES = [16, 1024, 64 * 1024, 1024 * 1024]
+N_WARMUP = 20
+
+def _echo(address, n_messages):
+    for _ in range(n_messages):
+        message = nw0.wait_for_message_from(address, copy=False)
+        nw0.send_reply_to(address, message)
+
+def _n_messages(size, quick):
+    n = 200 if quick else 2000
+    if size >= 1024 * 1024:
+        n //= 10
+    return n
+
+def round_trip(size, n_messages, collect_stats=False):
+    params = {"size" : size}
+    if collect_stats:
+        params["collect_stats"] = True
+    was_collecting, nw0.config.COLLECT_STATS = nw0.config.COLLECT_STATS, collect_stats
+    address = nw0.address()
+    echo = common.processes.Process(target=_echo, args=(address, N_WARMUP + n_messages))
+    echo.start()
+    try:
+        message = b"x" * size
+        #
+        # The first messages include the listener process starting up
+        # and the connection being made
+        #
+        for _ in range(N_WARMUP):
+            nw0.send_message_to(address, message, wait_for_reply_s=30, copy=False)
+
+        samples = []
+        started_at = common.clock()
+        for _ in range(n_messages):
+            t0 = common.clock()
+            nw0.send_message_to(address, message, wait_for_reply_s=30, copy=False)
+            samples.append(common.clock() - t0)
+        elapsed = common.clock() - started_at
+    finally:
+        nw0.config.COLLECT_STATS = was_collecting
+        echo.join(5)
+        if echo.is_alive():
+            echo.terminate()
+
+    return common.result(
+        "message_round_trip", params,
+        latency=common.latencies(samples),
+        per_second=n_messages / elapsed,
+        mb_per_second=2 * size * n_messages / elapsed / 1e6,
+    )
+
+def run(quick=False):
+    results = [round_trip(size, _n_messages(size, quick)) for size in SIZES]
+    results.append(round_trip(SIZES[0], _n_messages(SIZES[0], quick), collect_stats=True))
+    return results
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Throughput of send_news_to to a subscriber using wait_for_news_from
+or iter_news_from
+
+A publisher in another process sends news as fast as it can. News which
+the subscriber can't keep up with is dropped once its queue is full (see
+set_news_policy) so how much was delivered is measured as well as how fast.
+"""
+import time
+
+import networkzero as nw0
+
+import common
+
+SIZES = [16, 1024, 64 * 1024]
+
+def _publish(address, n_items, size, subscribed):
+    #
+    # Keep announcing until the subscriber has seen an announcement, so
+    # that none of the news measured is sent before it's subscribed
+    #
+    while not subscribed.is_set():
+        nw0.send_news_to(address, "hello")
+        time.sleep(0.01)
+    data = b"x" * size
+    for _ in range(n_items):
+        nw0.send_news_to(address, "data", data)
+    #
+    # The end marker could be dropped along with other news if the
+    # subscriber's queue is full, so send it a few times
+    #
+    for _ in range(10):
+        time.sleep(0.05)
+        nw0.send_news_to(address, "end")
+
+def _receive_with_wait(address):
+    while True:
+        yield nw0.wait_for_news_from(address, wait_for_s=30, is_raw=True)
+
+def _receive_with_iter(address):
+    return nw0.iter_news_from(address, wait_for_s=30, is_raw=True)
+
+RECEIVERS = {
+    "wait_for_news_from" : _receive_with_wait,
+    "iter_news_from" : _receive_with_iter,
+}
+
+def throughput(api, size, n_items):
+    address = nw0.address()
+    subscribed = common.processes.Event()
+    publisher = common.processes.Process(target=_publish, args=(address, n_items, size, subscribed))
+    publisher.start()
+    n_received = 0
+    first_at = last_at = None
+    try:
+        for topic, data in RECEIVERS[api](address):
+            if topic is None or topic == "end":
+                break
+            elif topic == "hello":
+                subscribed.set()
+            else:
+                last_at = common.clock()
+                if first_at is None:
+                    first_at = last_at
+                n_received += 1
+    finally:
+        publisher.join(30)
+        if publisher.is_alive():
+            publisher.terminate()
+
+    elapsed = (last_at - first_at) if n_received > 1 else None
+    return common.result(
+        "news_throughput", {"api" : api, "size" : size},
+        sent=n_items,
+        received=n_received,
+        delivered=float(n_received) / n_items,
+        per_second=n_received / elapsed if elapsed else None,
+        mb_per_second=size * n_received / elapsed / 1e6 if elapsed else None,
+    )
+
+def run(quick=False):
+    n_items = 10000 if quick else 100000
+    return [
+        throughput(api, size, n_items if size < 64 * 1024 else n_items // 10)
+            for api in sorted(RECEIVERS)
+            for size in SIZES
+    ]
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Cost of serialising & unserialising typical messages with each of the
+serialisers available, and of compressing them
+"""
+import networkzero as nw0
+
+import common
+
+MESSAGES = {
+    "small_text" : "hello",
+    "command" : ["move", {"x" : 10, "y" : -5, "speed" : 1.5}],
+    "1000_ints" : list(range(1000)),
+    "64k_text" : "x" * (64 * 1024),
+    "records" : [{"id" : n, "name" : "item %d" % n, "tags" : ["a", "b"], "value" : n * 0.5} for n in range(500)],
+}
+
+def _time_per_call(function, arg, n_calls):
+    started_at = common.clock()
+    for _ in range(n_calls):
+        function(arg)
+    return (common.clock() - started_at) / n_calls
+
+def serialiser_cost(serialiser, name, message, n_calls):
+    message_bytes = nw0.serialisers.serialise(message, serialiser)
+    serialise_s = _time_per_call(lambda m: nw0.serialisers.serialise(m, serialiser), message, n_calls)
+    unserialise_s = _time_per_call(nw0.serialisers.unserialise, message_bytes, n_calls)
+    return common.result(
+        "serialiser", {"serialiser" : serialiser, "message" : name},
+        bytes=len(message_bytes),
+        serialise_us=serialise_s * 1e6,
+        unserialise_us=unserialise_s * 1e6,
+    )
+
+def compressor_cost(compressor, name, message, n_calls):
+    message_bytes = nw0.serialisers.serialise(message)
+    compressed = nw0.compressors.compress(message_bytes, compressor)
+    compress_s = _time_per_call(lambda m: nw0.compressors.compress(m, compressor), message_bytes, n_calls)
+    decompress_s = _time_per_call(nw0.compressors.decompress, compressed, n_calls)
+    return common.result(
+        "compressor", {"compressor" : compressor, "message" : name},
+        bytes=len(message_bytes),
+        compressed_bytes=len(compressed),
+        compress_us=compress_s * 1e6,
+        decompress_us=decompress_s * 1e6,
+    )
+
+def run(quick=False):
+    n_calls = 200 if quick else 2000
+    results = []
+    #
+    # This process only unserialises what it serialised itself so it's
+    # safe to accept every serialiser, including pickle
+    #
+    nw0.config.ACCEPTED_SERIALISERS.update(nw0.serialisers.names())
+    for serialiser in nw0.serialisers.names():
+        for name, message in sorted(MESSAGES.items()):
+            results.append(serialiser_cost(serialiser, name, message, n_calls))
+    #
+    # Only messages over the threshold are compressed at all
+    #
+    for compressor in nw0.compressors.names():
+        for name, message in sorted(MESSAGES.items()):
+            if len(nw0.serialisers.serialise(message)) >= nw0.config.COMPRESSION_THRESHOLD:
+                results.append(compressor_cost(compressor, name, message, n_calls))
+    return results
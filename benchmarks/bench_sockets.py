@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Cost of setting up a socket: creating, binding or connecting one for
+each role, and the first round-trip to a listener which has just started
+
+Every socket here is for a new address so none of them comes from the
+sockets cache. Each is closed once it's been measured so that the cache's
+own evictions aren't measured along with it.
+"""
+import threading
+
+import networkzero as nw0
+from networkzero import sockets
+
+import common
+
+ROLES = ["speaker", "listener", "publisher", "subscriber"]
+#
+# A subscriber waits until it's connected so there must be a publisher
+# already bound for it to connect to
+#
+PEERS = {"subscriber" : "publisher"}
+
+def _discard(socket):
+    identifier = socket.address, socket.role
+    local_sockets = sockets._sockets._local_sockets()
+    sockets._sockets._close_socket(identifier, local_sockets.pop(identifier), "evicted_lru")
+
+def setup_cost(role, n_sockets):
+    samples = []
+    for _ in range(n_sockets):
+        address = nw0.address()
+        peer = sockets.get_socket(address, PEERS[role]) if role in PEERS else None
+        t0 = common.clock()
+        socket = sockets.get_socket(address, role)
+        samples.append(common.clock() - t0)
+        _discard(socket)
+        if peer is not None:
+            _discard(peer)
+    return common.result("socket_setup", {"role" : role}, latency=common.latencies(samples))
+
+def _reply_once(address, ready):
+    #
+    # Get the listening socket first so that the first message isn't
+    # sent before anything is bound to the address
+    #
+    sockets.get_socket(address, "listener")
+    ready.set()
+    message = nw0.wait_for_message_from(address, wait_for_s=30)
+    nw0.send_reply_to(address, message)
+
+def first_round_trip(n_listeners):
+    samples = []
+    for _ in range(n_listeners):
+        address = nw0.address()
+        ready = threading.Event()
+        listener = threading.Thread(target=_reply_once, args=(address, ready))
+        listener.start()
+        ready.wait()
+        t0 = common.clock()
+        nw0.send_message_to(address, "hello", wait_for_reply_s=30)
+        samples.append(common.clock() - t0)
+        listener.join()
+        _discard(sockets.get_socket(address, "speaker"))
+    return common.result("first_round_trip", {}, latency=common.latencies(samples))
+
+def run(quick=False):
+    n = 50 if quick else 500
+    results = [setup_cost(role, n) for role in ROLES]
+    results.append(first_round_trip(n))
+    return results
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Timing, percentiles & result records shared by the benchmarks
+
+Every benchmark produces a list of results, each a dictionary with the
+benchmark's name, the parameters it was run with and its measurements.
+Times are in microseconds; throughputs per second.
+"""
+import multiprocessing
+import time
+
+clock = getattr(time, "perf_counter", time.time)
+
+#
+# Peers run in processes of their own so that they don't share the GIL
+# with the code being measured. They're spawned rather than forked
+# because a forked child can't safely use its parent's ZeroMQ context.
+#
+try:
+    processes = multiprocessing.get_context("spawn")
+except AttributeError:
+    processes = multiprocessing
+
+def percentile(sorted_samples, p):
+    """Return the nearest-rank `p`th percentile of samples already sorted
+    """
+    if not sorted_samples:
+        return None
+    rank = int(round(p / 100.0 * (len(sorted_samples) - 1)))
+    return sorted_samples[rank]
+
+def latencies(samples_s):
+    """Summarise a list of durations in seconds as microsecond percentiles
+    """
+    samples = sorted(s * 1e6 for s in samples_s)
+    return {
+        "n" : len(samples),
+        "mean_us" : sum(samples) / len(samples) if samples else None,
+        "min_us" : samples[0] if samples else None,
+        "p50_us" : percentile(samples, 50),
+        "p90_us" : percentile(samples, 90),
+        "p99_us" : percentile(samples, 99),
+        "max_us" : samples[-1] if samples else None,
+    }
+
+def result(benchmark, params, **measures):
+    record = {"benchmark" : benchmark, "params" : params}
+    record.update(measures)
+    return record
+
+def describe(record):
+    """Return one line of text summarising a result for the console
+    """
+    params = ", ".join("%s=%s" % item for item in sorted(record["params"].items()))
+    measures = []
+    for name in (
+        "p50_us", "p99_us", "per_second", "mb_per_second", "delivered",
+        "bytes", "serialise_us", "unserialise_us", "compressed_bytes", "compress_us", "decompress_us"
+    ):
+        value = record.get(name)
+        if value is None and "latency" in record:
+            value = record["latency"].get(name)
+        if value is not None:
+            measures.append("%s=%.6g" % (name, value))
+    return "%-24s %-40s %s" % (record["benchmark"], params, " ".join(measures))
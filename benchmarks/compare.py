@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Compare the results of two benchmark runs
+
+Usage:
+    python benchmarks/compare.py before.json after.json
+
+For each result in both runs, the main measurements are shown side by
+side with the change as a percentage. Bear in mind that runs on different
+machines, or with a different configuration (shown at the top), aren't
+really comparable.
+"""
+import json
+import sys
+
+MEASURES = ["p50_us", "p99_us", "per_second", "mb_per_second", "delivered", "serialise_us", "unserialise_us", "compress_us", "decompress_us"]
+
+def _key(result):
+    return result["benchmark"], tuple(sorted(result["params"].items()))
+
+def _measures(result):
+    measures = {}
+    for name in MEASURES:
+        value = result.get(name)
+        if value is None and "latency" in result:
+            value = result["latency"].get(name)
+        if value is not None:
+            measures[name] = value
+    return measures
+
+def compare(before, after):
+    for name in sorted(set(before["environment"]) | set(after["environment"])):
+        if name in ("started_at",):
+            continue
+        value_before = before["environment"].get(name)
+        value_after = after["environment"].get(name)
+        if value_before != value_after:
+            print("%s: %s -> %s" % (name, value_before, value_after))
+
+    results_before = dict((_key(r), r) for r in before["results"])
+    for result in after["results"]:
+        key = _key(result)
+        if key not in results_before:
+            continue
+        benchmark, params = key
+        measures_before = _measures(results_before[key])
+        for name, value in sorted(_measures(result).items()):
+            value_before = measures_before.get(name)
+            if value_before is None:
+                continue
+            change = "%+.1f%%" % (100.0 * (value - value_before) / value_before) if value_before else "-"
+            print("%-20s %-36s %-14s %12.6g %12.6g %8s" % (
+                benchmark, ", ".join("%s=%s" % p for p in params), name, value_before, value, change
+            ))
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else args
+    if len(args) != 2:
+        print(__doc__)
+        return 1
+    with open(args[0]) as f:
+        before = json.load(f)
+    with open(args[1]) as f:
+        after = json.load(f)
+    compare(before, after)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Run the networkzero benchmarks and write their results as JSON
+
+Usage:
+    python benchmarks/run.py [--quick] [--output results.json] [benchmark ...]
+
+where each benchmark is one of: messages, news, serialisers, sockets
+[default: all of them]. The results of two runs can be compared with
+compare.py.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import zmq
+
+import networkzero as nw0
+
+import common
+import bench_messages
+import bench_news
+import bench_serialisers
+import bench_sockets
+
+BENCHMARKS = {
+    "messages" : bench_messages,
+    "news" : bench_news,
+    "serialisers" : bench_serialisers,
+    "sockets" : bench_sockets,
+}
+
+def _git_commit():
+    try:
+        output = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.STDOUT
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode("ascii").strip()
+
+def environment():
+    """Return what's needed to tell whether two runs can be compared
+    """
+    return {
+        "started_at" : datetime.datetime.now().isoformat(),
+        "python" : platform.python_version(),
+        "platform" : platform.platform(),
+        "machine" : platform.machine(),
+        "cpu_count" : os.cpu_count() if hasattr(os, "cpu_count") else None,
+        "pyzmq" : zmq.pyzmq_version(),
+        "libzmq" : zmq.zmq_version(),
+        "git_commit" : _git_commit(),
+        "config" : {
+            "SOCKET_PROFILE" : nw0.config.SOCKET_PROFILE,
+            "USE_IPC" : nw0.config.USE_IPC,
+            "USE_IO_THREAD" : nw0.config.USE_IO_THREAD,
+            "COMPRESSOR" : nw0.config.COMPRESSOR,
+        },
+    }
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run the networkzero benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help="benchmarks to run: %s [default: all]" % ", ".join(sorted(BENCHMARKS)))
+    parser.add_argument("--quick", action="store_true", help="run fewer iterations, eg as a smoke test")
+    parser.add_argument("--output", default="benchmark-results.json", help="file to write the results to")
+    args = parser.parse_args(args)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmark(s): %s" % ", ".join(sorted(unknown)))
+
+    record = {"environment" : environment(), "quick" : args.quick, "results" : []}
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        print("Running %s..." % name)
+        for result in BENCHMARKS[name].run(quick=args.quick):
+            print(common.describe(result))
+            record["results"].append(result)
+
+    with open(args.output, "w") as f:
+        json.dump(record, f, indent=2, sort_keys=True)
+    print("Results written to %s" % args.output)
+
+#
+# The benchmarks' peers are spawned processes which import this module
+# again, so nothing must run at import time
+#
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,6 @@
 from __future__ import print_function
+import uuid
+
 import networkzero as nw0
 
 try:
@@ -7,10 +9,22 @@ try:
 except NameError:
     pass
 
+#
+# If no answer comes within 10 seconds, ask again -- and give each anagram
+# an id of its own so that, if the server has found the answer by then,
+# it sends it again rather than searching all over again. If there's still
+# no answer, the service is taken to be unavailable
+#
+nw0.config.SEND_RETRIES = 2
+
 service = nw0.discover("anagram")
 while True:
     anagram = input("Enter anagram: ")
-    word = nw0.send_message_to(service, anagram)
+    try:
+        word = nw0.send_message_to(service, anagram, wait_for_reply_s=10, request_id=uuid.uuid4().hex)
+    except nw0.core.SocketTimedOutError:
+        print("The anagram service isn't answering; try again later")
+        break
     if word:
         print(word)
     else:
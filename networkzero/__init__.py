@@ -65,8 +65,11 @@ from .core import (
     address, action_and_params,
     string_to_bytes, bytes_to_string
 )
-from .discovery import advertise, discover, discover_all, discover_group
+from .discovery import advertise, discover, discover_all, discover_group, discover_forwarder
 from .messenger import (
-    send_message_to, wait_for_message_from, send_reply_to,
-    send_news_to, wait_for_news_from
+    send_message_to, send_messages_to, wait_for_message_from, send_reply_to,
+    send_news_to, send_news_batch, wait_for_news_from, iter_news_from,
+    send_stream_to, iter_stream_from, send_file_to, receive_file_from,
+    set_serialiser, set_news_policy
 )
+from .metrics import stats, reset_stats
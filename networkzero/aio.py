@@ -0,0 +1,523 @@
+# -*- coding: utf-8 -*-
+"""asyncio versions of the messenger functions
+
+Each of the functions here behaves like its counterpart in the messenger
+module but is a coroutine, so one event loop can carry on many
+conversations at once without tying up a thread for each::
+
+    import asyncio
+    import networkzero as nw0
+    import networkzero.aio as nw0_aio
+
+    async def ask(address, name):
+        return await nw0_aio.send_message_to(address, name)
+
+    async def main():
+        echo_address = nw0.discover("echo")
+        replies = await asyncio.gather(*(ask(echo_address, name) for name in ["Alice", "Bob"]))
+        print(replies)
+
+    asyncio.run(main())
+
+This module needs Python 3.7 or later and is not imported by the
+networkzero package itself, so the rest of it can still be used with
+older versions.
+
+Sockets are cached per event loop by address in the same way as the
+blocking functions cache them per thread, and a closed loop's sockets
+are closed (freeing any addresses they were bound to) as a finished
+thread's are. A listening or publishing address can be bound only once
+in a process, whether by blocking or by asyncio code. As with the
+blocking functions, only one message at a time can be waited for &
+replied to on any one listening address.
+"""
+import asyncio
+import collections
+
+import zmq
+import zmq.asyncio
+
+from . import config
+from . import core
+from . import metrics
+from . import sockets
+
+_logger = core.get_logger(__name__)
+EMPTY = None
+
+class Socket(sockets.Socket, zmq.asyncio.Socket):
+
+    #
+    # Waiting for a subscriber's connections would block the event loop;
+    # awaiting news will wait for them anyway.
+    #
+    waits_for_connections = False
+
+    async def ready(self):
+        """Wait, without blocking the event loop, until the socket is ready
+        to use. (See sockets.Socket._wait_for_subscribers).
+        """
+        if self.role in self.publishing_roles:
+            timeout_ms = self._subscribers_pending_ms()
+            while timeout_ms is not None:
+                await self.poll(timeout_ms)
+                timeout_ms = self._subscribers_pending_ms()
+            self._collect_subscriptions()
+
+    def lock(self):
+        """Return a lock which keeps one request / reply conversation
+        from overlapping with another on this socket
+        """
+        lock = self.__dict__.get('_lock')
+        if lock is None:
+            lock = self.__dict__['_lock'] = asyncio.Lock()
+        return lock
+
+class Context(zmq.asyncio.Context):
+
+    _socket_class = Socket
+
+    def socket(self, *args, **kwargs):
+        sockets._configure_context(self)
+        return super(Context, self).socket(*args, **kwargs)
+
+#
+# Share the blocking sockets' ZeroMQ context so both use the same I/O
+# threads and can talk to each other over inproc:// if needed
+#
+context = Context.shadow(sockets.context.underlying)
+
+class Sockets(sockets.Sockets):
+
+    def __init__(self):
+        sockets.Sockets.__init__(self, context)
+        #
+        # An address can only be bound once, whether from blocking or
+        # from asyncio code, so share the record of bound addresses with
+        # the blocking sockets. Share the choice of serialiser, too.
+        #
+        self._lock = sockets._sockets._lock
+        self._sockets = sockets._sockets._sockets
+        self._serialisers = sockets._sockets._serialisers
+        self._news_policies = sockets._sockets._news_policies
+        self._news_caches = sockets._sockets._news_caches
+        self._forwarders = sockets._sockets._forwarders
+        self._reply_caches = sockets._sockets._reply_caches
+        self._reaping = sockets._sockets._reaping
+        #
+        # Each event loop's cache of sockets, kept until the loop is closed
+        # (as each thread's is kept until the thread finishes) so that the
+        # addresses its sockets were bound to can be freed then
+        #
+        self._loop_sockets = {}
+
+    def _local_sockets(self):
+        """Return the cache of sockets which can be used by the running event loop
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            return self._loop_sockets[loop]
+        except KeyError:
+            with self._lock:
+                return self._loop_sockets.setdefault(loop, collections.OrderedDict())
+
+    def _finished_caches(self):
+        """Remove & return the caches of any event loops which have been
+        closed; call with self._lock held
+        """
+        closed = [loop for loop in self._loop_sockets if loop.is_closed()]
+        return [self._loop_sockets.pop(loop) for loop in closed]
+
+    async def get_ready_socket(self, address, role):
+        socket = self.get_socket(address, role)
+        await socket.ready()
+        return socket
+
+    async def _receive_with_timeout(self, socket, timeout_s, use_multipart=False, copy=True):
+        """Wait for activity on the socket and either return what's
+        received or time out if timeout_s expires without anything
+        on the socket.
+        """
+        if timeout_s is config.FOREVER:
+            timeout_ms = None
+        else:
+            timeout_ms = int(1000 * timeout_s)
+
+        if not await socket.poll(timeout_ms):
+            raise core.SocketTimedOutError(timeout_s)
+        if use_multipart:
+            return await socket.recv_multipart(copy=copy)
+        else:
+            return await socket.recv(copy=copy)
+
+    async def wait_for_message_from(self, address, wait_for_s, copy=True):
+        socket = await self.get_ready_socket(address, "listener")
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if wait_for_s is config.FOREVER:
+            deadline = None
+        else:
+            deadline = sockets._clock() + wait_for_s
+        while True:
+            if deadline is None:
+                timeout_s = config.FOREVER
+            else:
+                timeout_s = max(0, deadline - sockets._clock())
+            try:
+                frames = await self._receive_with_timeout(socket, timeout_s, use_multipart=True, copy=copy)
+            except (core.SocketTimedOutError):
+                address_stats.timed_out()
+                return None
+            address_stats.received(frames)
+            request_id, frames = sockets._split_request_id(frames)
+            if request_id is not None:
+                reply_frames, is_new = self._reply_cache(socket.address).start(request_id)
+                if not is_new:
+                    await socket.send_multipart(reply_frames, copy=False)
+                    address_stats.sent(reply_frames)
+                    address_stats.duplicated()
+                    continue
+            try:
+                message, serialiser = address_stats.serialising(sockets._unserialise_from_frames, frames)
+            except Exception:
+                #
+                # As with Sockets.wait_for_message_from, reply to a message
+                # which can't be unserialised so that the socket can go on
+                # receiving
+                #
+                _logger.exception("Unable to unserialise message from %s", socket.address)
+                reply_frames = sockets._serialise_to_frames(None)
+                await socket.send_multipart(reply_frames, copy=False)
+                address_stats.sent(reply_frames)
+                if request_id is not None:
+                    self._reply_cache(socket.address).forget(request_id)
+                continue
+            socket.__dict__['_request_id'] = request_id
+            socket.__dict__['_reply_serialiser'] = serialiser
+            return message
+
+    async def wait_for_concurrent_message_from(self, address, wait_for_s, copy=True):
+        socket = await self.get_ready_socket(address, "concurrent_listener")
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if wait_for_s is config.FOREVER:
+            deadline = None
+        else:
+            deadline = sockets._clock() + wait_for_s
+        while True:
+            if deadline is None:
+                timeout_s = config.FOREVER
+            else:
+                timeout_s = max(0, deadline - sockets._clock())
+            try:
+                frames = await self._receive_with_timeout(socket, timeout_s, use_multipart=True, copy=copy)
+            except (core.SocketTimedOutError):
+                address_stats.timed_out()
+                return None, None
+            envelope, frames = sockets._split_envelope(frames)
+            address_stats.received(frames)
+            request_id, frames = sockets._split_request_id(frames)
+            if request_id is not None:
+                reply_frames, is_new = self._reply_cache(socket.address).start(request_id, envelope)
+                if not is_new:
+                    address_stats.duplicated()
+                    if reply_frames is not None:
+                        await socket.send_multipart(envelope + reply_frames, copy=False)
+                        address_stats.sent(reply_frames)
+                    continue
+            try:
+                message, serialiser = address_stats.serialising(sockets._unserialise_from_frames, frames)
+            except Exception:
+                _logger.exception("Unable to unserialise message from %s", socket.address)
+                reply_frames = sockets._serialise_to_frames(None)
+                envelopes = [envelope]
+                if request_id is not None:
+                    envelopes.extend(self._reply_cache(socket.address).forget(request_id))
+                for envelope in envelopes:
+                    await socket.send_multipart(envelope + reply_frames, copy=False)
+                    address_stats.sent(reply_frames)
+                continue
+            return message, sockets.ReplyHandle(socket.address, envelope, serialiser, request_id)
+
+    async def send_message_to(self, address, message, wait_for_reply_s, serialiser=None, copy=True, request_id=None):
+        caddress = core.address(address)
+        address_stats = metrics._stats.for_address(caddress, "speaker")
+        if serialiser is None:
+            serialiser = self._serialisers.get(caddress)
+        message_frames = address_stats.serialising(sockets._serialise_to_frames, message, serialiser)
+        if request_id is not None:
+            message_frames = sockets._request_id_frames(request_id) + message_frames
+        timeout_s = wait_for_reply_s
+        waited_s = 0
+        n_retries = 0
+        while True:
+            socket = await self.get_ready_socket(address, "speaker")
+            #
+            # Other coroutines can run while this one waits for a reply so
+            # keep them from evicting the socket from the cache meanwhile
+            #
+            with socket.in_use():
+                async with socket.lock():
+                    #
+                    # If another coroutine gave up waiting for its reply
+                    # while this one waited its turn, the socket has been
+                    # replaced; use the new one instead.
+                    #
+                    if socket.closed:
+                        continue
+                    sent_at = sockets._clock()
+                    await socket.send_multipart(message_frames, copy=False)
+                    address_stats.sent(message_frames)
+                    try:
+                        frames = await self._receive_with_timeout(socket, timeout_s, use_multipart=True, copy=copy)
+                    except core.SocketTimedOutError:
+                        address_stats.timed_out()
+                        self._replace_socket(socket)
+                        waited_s += timeout_s
+                        if n_retries == config.SEND_RETRIES:
+                            raise core.SocketTimedOutError(waited_s, n_retries + 1)
+                    except:
+                        self._replace_socket(socket)
+                        raise
+                    else:
+                        address_stats.round_tripped(sockets._clock() - sent_at)
+                        address_stats.received(frames)
+                        reply, _ = address_stats.serialising(sockets._unserialise_from_frames, frames)
+                        return reply
+
+            n_retries += 1
+            _logger.warn("No reply from %s; sending again (retry %d of %d)", socket.address, n_retries, config.SEND_RETRIES)
+            address_stats.retried()
+            timeout_s = timeout_s * config.SEND_RETRY_BACKOFF
+
+    async def send_reply_to(self, address, reply, serialiser=None):
+        if isinstance(address, sockets.ReplyHandle):
+            return await self._send_concurrent_reply_to(address, reply, serialiser)
+        socket = await self.get_ready_socket(address, "listener")
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if serialiser is None:
+            serialiser = socket.__dict__.get('_reply_serialiser')
+        reply_frames = address_stats.serialising(sockets._serialise_to_frames, reply, serialiser)
+        await socket.send_multipart(reply_frames, copy=False)
+        address_stats.sent(reply_frames)
+        request_id = socket.__dict__.pop('_request_id', None)
+        if request_id is not None:
+            self._reply_cache(socket.address).finish(request_id, reply_frames)
+
+    async def _send_concurrent_reply_to(self, handle, reply, serialiser=None):
+        socket = await self.get_ready_socket(handle.address, "concurrent_listener")
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if serialiser is None:
+            serialiser = handle.serialiser
+        reply_frames = address_stats.serialising(sockets._serialise_to_frames, reply, serialiser)
+        await socket.send_multipart(handle.envelope + reply_frames, copy=False)
+        address_stats.sent(reply_frames)
+        if handle.request_id is not None:
+            for envelope in self._reply_cache(socket.address).finish(handle.request_id, reply_frames):
+                await socket.send_multipart(envelope + reply_frames, copy=False)
+                address_stats.sent(reply_frames)
+
+    async def send_news_to(self, address, topic, data, serialiser=None):
+        socket = await self.get_ready_socket(address, self._publisher_role(address))
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if serialiser is None:
+            serialiser = self._serialisers.get(socket.address)
+        news_frames = address_stats.serialising(sockets._serialise_for_pubsub, topic, data, serialiser)
+        await socket.send_multipart(news_frames, copy=False)
+        address_stats.sent(news_frames)
+
+    async def send_news_batch(self, address, news, serialiser=None):
+        socket = await self.get_ready_socket(address, self._publisher_role(address))
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if serialiser is None:
+            serialiser = self._serialisers.get(socket.address)
+        batch = []
+        for topic, data in news:
+            batch.append(address_stats.serialising(sockets._serialise_for_pubsub, topic, data, serialiser))
+        n_sent = 0
+        with socket._refusing_to_drop():
+            for frames in batch:
+                try:
+                    await socket.send_multipart(frames, zmq.NOBLOCK, copy=False)
+                except zmq.Again:
+                    break
+                address_stats.sent(frames)
+                n_sent += 1
+        return n_sent
+
+    async def wait_for_news_from(self, address, topic, wait_for_s, is_raw=False, copy=True):
+        socket = self._get_subscriber(address, topic)
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        limit = sockets.DRAIN_LIMIT if socket._conflated_prefixes else 1
+        if wait_for_s is config.FOREVER:
+            deadline = None
+        else:
+            deadline = sockets._clock() + wait_for_s
+        with socket.in_use():
+            try:
+                while True:
+                    frames = socket._next_news(copy)
+                    if frames is not None:
+                        address_stats.received(frames)
+                        news = address_stats.serialising(sockets._unserialise_for_pubsub, frames, is_raw)
+                        return news
+                    if deadline is None:
+                        timeout_s = config.FOREVER
+                    else:
+                        timeout_s = max(0, deadline - sockets._clock())
+                    frames = await self._receive_with_timeout(socket, timeout_s, use_multipart=True, copy=copy)
+                    socket._take_news(frames, limit, copy)
+            except core.SocketTimedOutError:
+                address_stats.timed_out()
+                return None, None
+
+    async def iter_news_from(self, address, topic, wait_for_s, is_raw=False, copy=True, batch=None):
+        if batch is not None and batch < 1:
+            raise core.NetworkZeroError("A batch must hold at least one item of news, not %r" % batch)
+        socket = self._get_subscriber(address, topic)
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        limit = batch or sockets.DRAIN_LIMIT
+        with socket.in_use():
+            while True:
+                news = []
+                while len(news) < limit:
+                    frames = socket._next_news(copy)
+                    if frames is None:
+                        break
+                    address_stats.received(frames)
+                    news.append(address_stats.serialising(sockets._unserialise_for_pubsub, frames, is_raw))
+                if not news:
+                    try:
+                        frames = await self._receive_with_timeout(socket, wait_for_s, use_multipart=True, copy=copy)
+                    except core.SocketTimedOutError:
+                        address_stats.timed_out()
+                        return
+                    socket._take_news(frames, limit, copy)
+                elif batch is None:
+                    for item in news:
+                        yield item
+                else:
+                    yield news
+
+_sockets = Sockets()
+
+async def send_message_to(address, message=EMPTY, wait_for_reply_s=config.FOREVER, serialiser=None, copy=True, request_id=None):
+    """Send a message and return the reply
+
+    Several coroutines can send to the same address at once: their
+    messages are sent one after another, each waiting for its reply.
+
+    :param address: a nw0 address (eg from `nw0.discover`)
+    :param message: any simple Python object, including text & tuples, or binary data
+    :param wait_for_reply_s: how many seconds to wait for a reply [default: forever]
+    :param serialiser: the name of a serialiser [default: the address's, or JSON]
+    :param copy: whether a binary reply is returned as bytes or as a memoryview [default: bytes]
+    :param request_id: text or bytes identifying this request (see
+        :func:`networkzero.messenger.send_message_to`) [default: none]
+
+    :returns: the reply returned from the address
+    :raises SocketTimedOutError: if no reply comes in time
+    """
+    if config.TRACE:
+        core._trace("send_message_to", address=address, message=message, request_id=request_id)
+    if isinstance(address, list):
+        raise core.InvalidAddressError("Multiple addresses are not allowed")
+    return await _sockets.send_message_to(address, message, wait_for_reply_s, serialiser, copy, request_id)
+
+async def wait_for_message_from(address, wait_for_s=config.FOREVER, autoreply=False, copy=True, concurrent=False):
+    """Wait for a message
+
+    If `concurrent` is True, each message comes with a reply handle to
+    pass to :func:`send_reply_to` and many messages can await replies at
+    once. (See :func:`networkzero.messenger.wait_for_message_from`).
+
+    :param address: a nw0 address (eg from `nw0.advertise`)
+    :param wait_for_s: how many seconds to wait for a message before giving up [default: forever]
+    :param autoreply: whether to send an empty reply [default: No]
+    :param copy: whether a binary message is returned as bytes or as a memoryview [default: bytes]
+    :param concurrent: whether to allow several messages to await replies at once [default: No]
+
+    :returns: the message received from another address or None if out of time;
+        if `concurrent` is True, a 2-tuple of (message, reply handle) or (None, None)
+    """
+    if config.TRACE:
+        core._trace("wait_for_message_from", address=address, wait_for_s=wait_for_s, concurrent=concurrent)
+    if concurrent:
+        message, reply_handle = await _sockets.wait_for_concurrent_message_from(address, wait_for_s, copy)
+        if reply_handle is not None and autoreply:
+            await _sockets.send_reply_to(reply_handle, EMPTY)
+        return message, reply_handle
+
+    message = await _sockets.wait_for_message_from(address, wait_for_s, copy)
+    if message is not None and autoreply:
+        await _sockets.send_reply_to(address, EMPTY)
+    return message
+
+async def send_reply_to(address, reply=EMPTY, serialiser=None):
+    """Reply to a message previously received
+
+    :param address: a nw0 address (eg from `nw0.advertise`) or the reply
+        handle returned with a message by a concurrent listener
+    :param reply: any simple Python object, including text & tuples, or binary data
+    :param serialiser: the name of a serialiser [default: the one the message used]
+    """
+    if config.TRACE:
+        core._trace("send_reply_to", address=address, reply=reply)
+    return await _sockets.send_reply_to(address, reply, serialiser)
+
+async def send_news_to(address, topic, data=None, serialiser=None):
+    """Publish news to all subscribers
+
+    :param address: a nw0 address, eg from `nw0.advertise`
+    :param topic: any text object
+    :param data: any simple Python object including test & tuples, or binary data [default: empty]
+    :param serialiser: the name of a serialiser [default: the address's, or JSON]
+    """
+    if config.TRACE:
+        core._trace("send_news_to", address=address, topic=topic, data=data)
+    return await _sockets.send_news_to(address, topic, data, serialiser)
+
+async def send_news_batch(address, news, serialiser=None):
+    """Publish many items of news to all subscribers at once
+    (See :func:`networkzero.messenger.send_news_batch`).
+
+    :param address: a nw0 address, eg from `nw0.advertise`
+    :param news: a list (or other iterable) of 2-tuples of (topic, data)
+    :param serialiser: the name of a serialiser [default: the address's, or JSON]
+
+    :returns: how many items of news were sent
+    """
+    if config.TRACE:
+        core._trace("send_news_batch", address=address)
+    return await _sockets.send_news_batch(address, news, serialiser)
+
+async def wait_for_news_from(address, prefix=config.EVERYTHING, wait_for_s=config.FOREVER, is_raw=False, copy=True):
+    """Wait for news whose topic starts with `prefix`.
+
+    :param address: a nw0 address, eg from `nw0.discover`
+    :param prefix: any text object [default: all messages]
+    :param wait_for_s: how many seconds to wait before giving up [default: forever]
+    :param is_raw: whether the data was sent as binary data [default: No]
+    :param copy: whether raw data is returned as bytes or as a memoryview [default: bytes]
+
+    :returns: a 2-tuple of (topic, data) or (None, None) if out of time
+    """
+    if config.TRACE:
+        core._trace("wait_for_news_from", address=address, prefix=prefix, wait_for_s=wait_for_s)
+    return await _sockets.wait_for_news_from(address, prefix, wait_for_s, is_raw, copy)
+
+def iter_news_from(address, prefix=config.EVERYTHING, wait_for_s=config.FOREVER, is_raw=False, copy=True, batch=None):
+    """Generate news whose topic starts with `prefix` as it arrives, for
+    use with `async for`. (See :func:`networkzero.messenger.iter_news_from`).
+
+    :param address: a nw0 address, eg from `nw0.discover`
+    :param prefix: any text object [default: all messages]
+    :param wait_for_s: how many seconds to wait for news before stopping [default: forever]
+    :param is_raw: whether the data was sent as binary data [default: No]
+    :param copy: whether raw data is returned as bytes or as a memoryview [default: bytes]
+    :param batch: if given, generate lists of up to this many items of news at a time
+
+    :returns: an asynchronous generator of 2-tuples of (topic, data), or of
+        lists of them if `batch` is given, which stops if no news comes in time
+    """
+    if config.TRACE:
+        core._trace("iter_news_from", address=address, prefix=prefix, wait_for_s=wait_for_s)
+    return _sockets.iter_news_from(address, prefix, wait_for_s, is_raw, copy, batch)
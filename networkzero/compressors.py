@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Compressors which shrink serialised messages on the wire
+
+Compression is off unless config.COMPRESSOR names one of the compressors
+registered here. Three are built in:
+
+    * zlib -- always available
+    * lz4 -- available if the lz4 package is installed
+    * zstd -- available if the zstandard package is installed
+
+Only messages & news which serialise to at least
+config.COMPRESSION_THRESHOLD bytes are compressed, and only if that makes
+them smaller. Binary data is never compressed. A compressed message is
+prefixed with a one-byte tag identifying its compressor, in a range which
+can't start either a JSON document or a serialiser's output (see the
+serialisers module). The receiving end decompresses any message with
+such a tag, whatever its own config.COMPRESSOR, so long as it has the
+compressor installed and it's in config.ACCEPTED_COMPRESSORS.
+
+However little was sent, no more than config.MAX_DECOMPRESSED_SIZE bytes
+are ever decompressed from one message; anything which would decompress
+to more is refused, so that a few compressed bytes from a peer can't
+fill this process's memory.
+"""
+import zlib
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from . import config
+from . import core
+
+_logger = core.get_logger(__name__)
+
+VALID_TAGS = set(range(0x10, 0x20))
+
+class _Compressor(object):
+    """Convenience container for a named pair of compress / decompress
+    functions and the tag which marks their output on the wire
+    """
+
+    def __init__(self, name, tag, compress, decompress):
+        self.name = name
+        self.tag = tag
+        self.compress = compress
+        self.decompress = decompress
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.__class__.__name__, self.name)
+
+_compressors = {}
+_compressors_by_tag = {}
+#
+# Compressors which are known but not installed here, so that a message
+# compressed by one of them can be refused with a helpful error
+#
+_missing_by_tag = {}
+
+def register(name, tag, compress, decompress, accept=True):
+    """Register a compressor under a name so it can be used for messages & news
+
+    :param name: any text, used to select the compressor in config.COMPRESSOR
+    :param tag: an integer in VALID_TAGS identifying the compressor on the wire
+    :param compress: a function taking bytes and returning bytes
+    :param decompress: a function taking bytes and the most bytes it may
+        produce, and returning bytes; it should stop decompressing as soon
+        as it has produced more than that
+    :param accept: whether messages compressed with this should be accepted [default: yes]
+    """
+    if tag not in VALID_TAGS:
+        raise core.NetworkZeroError("Compressor tag must be one of %s, not %r" % (sorted(VALID_TAGS), tag))
+    tag_bytes = bytes(bytearray([tag]))
+    existing = _compressors_by_tag.get(tag_bytes)
+    if existing and existing.name != name:
+        raise core.NetworkZeroError("Tag %d is already used by compressor %s" % (tag, existing.name))
+
+    compressor = _Compressor(name, tag_bytes, compress, decompress)
+    _compressors[name] = compressor
+    _compressors_by_tag[tag_bytes] = compressor
+    _missing_by_tag.pop(tag_bytes, None)
+    if accept:
+        config.ACCEPTED_COMPRESSORS.add(name)
+    return compressor
+
+def names():
+    """Return the names of all the compressors available in this process
+    """
+    return sorted(_compressors)
+
+def check_name(name):
+    """Raise an exception if no compressor is registered as `name`
+    """
+    if name not in _compressors:
+        raise core.NetworkZeroError("No compressor is registered as %r; try one of %s" % (name, ", ".join(names())))
+
+def compress(message_bytes, name=None):
+    """Compress serialised bytes with a named compressor if they're large
+    enough for it to be worthwhile, tagging them if they're compressed
+
+    :param message_bytes: bytes, eg from :func:`networkzero.serialisers.serialise`
+    :param name: the name of a registered compressor [default: config.COMPRESSOR]
+    :returns: bytes
+    """
+    if name is None:
+        name = config.COMPRESSOR
+    if name is None or len(message_bytes) < config.COMPRESSION_THRESHOLD:
+        return message_bytes
+
+    compressor = _compressors.get(name)
+    if compressor is None:
+        check_name(name)
+    compressed = compressor.tag + compressor.compress(message_bytes)
+    if len(compressed) < len(message_bytes):
+        return compressed
+    else:
+        return message_bytes
+
+def decompress(message_bytes):
+    """Decompress bytes produced by :func:`compress`, returning bytes
+    which weren't compressed as they are
+
+    :param message_bytes: a bytes-like object
+    :returns: a bytes-like object
+    """
+    tag = bytes(message_bytes[:1])
+    compressor = _compressors_by_tag.get(tag)
+    if compressor is not None:
+        if compressor.name not in config.ACCEPTED_COMPRESSORS:
+            raise core.NetworkZeroError("Refusing a message compressed with %s; add it to config.ACCEPTED_COMPRESSORS to accept it" % compressor.name)
+        decompressed = compressor.decompress(message_bytes[1:], config.MAX_DECOMPRESSED_SIZE)
+        if len(decompressed) > config.MAX_DECOMPRESSED_SIZE:
+            raise core.NetworkZeroError("Refusing a message which decompresses to more than %d bytes" % config.MAX_DECOMPRESSED_SIZE)
+        return decompressed
+    if tag in _missing_by_tag:
+        raise core.NetworkZeroError("Cannot decompress a message compressed with %s, which is not installed" % _missing_by_tag[tag])
+    return message_bytes
+
+#
+# Built-in compressors
+#
+#
+# Each decompresses at most one byte more than it may produce, which is
+# enough for decompress to tell that the message is too large
+#
+def _zlib_decompress(message_bytes, max_size):
+    return zlib.decompressobj().decompress(message_bytes, max_size + 1)
+
+register("zlib", 0x10, zlib.compress, _zlib_decompress)
+
+if lz4_frame is not None:
+    def _lz4_decompress(message_bytes, max_size):
+        return lz4_frame.LZ4FrameDecompressor().decompress(message_bytes, max_length=max_size + 1)
+
+    register("lz4", 0x11, lz4_frame.compress, _lz4_decompress)
+else:
+    _missing_by_tag[b"\x11"] = "lz4"
+
+if zstandard is not None:
+    def _zstd_compress(message_bytes):
+        return zstandard.ZstdCompressor().compress(message_bytes)
+
+    def _zstd_decompress(message_bytes, max_size):
+        #
+        # Reading from a stream never makes more than was asked for,
+        # whatever size the frame claims to decompress to
+        #
+        with zstandard.ZstdDecompressor().stream_reader(bytes(message_bytes)) as reader:
+            return reader.read(max_size + 1)
+
+    register("zstd", 0x12, _zstd_compress, _zstd_decompress)
+else:
+    _missing_by_tag[b"\x12"] = "zstd"
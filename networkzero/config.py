@@ -4,6 +4,8 @@
 ENCODING = "UTF-8"
 class _Forever(object):
     def __repr__(self): return "<Forever>"
+    # Unpickled (eg in a spawned process) as this module's FOREVER
+    def __reduce__(self): return "FOREVER"
 FOREVER = _Forever()
 SHORT_WAIT = 1 # 1 second
 EVERYTHING = ""
@@ -25,5 +27,155 @@ BEACON_ADVERT_FREQUENCY_S = 2
 #
 ADVERT_TTL_S = 10 * BEACON_ADVERT_FREQUENCY_S
 
+#
+# A new subscriber will wait up to this long to connect to its
+# publishers, and a new publisher up to this long for its first
+# subscriber before sending any news
+#
+SLOW_JOINER_TIMEOUT_S = 0.5
+
+#
+# Each thread keeps at most this many sockets, closing the least
+# recently used when it needs another, and closes any socket which
+# hasn't been used for this long (FOREVER to keep idle sockets open).
+# Only speakers are closed this way: the other sockets, eg listeners,
+# publishers & subscribers, hold something which would be lost.
+#
+SOCKET_CACHE_SIZE = 64
+SOCKET_IDLE_TIMEOUT_S = 5 * 60
+
+#
+# A speaker which gets no reply in time closes its connection, which
+# can't be used again, and opens another. It then sends the message
+# again up to this many times, each time waiting for a reply
+# SEND_RETRY_BACKOFF times as long as the time before. NB a message
+# which is sent again may be received more than once.
+#
+SEND_RETRIES = 0
+SEND_RETRY_BACKOFF = 2
+
+#
+# A message sent with a request id which a listener has already answered
+# (eg because it was sent again after no reply came in time) is sent the
+# same reply again rather than being handled again. Each listening address
+# keeps its latest REPLY_CACHE_SIZE replies, and remembers no more than
+# that many messages still waiting for a reply; set it to 0 to keep none.
+#
+REPLY_CACHE_SIZE = 1000
+
+#
+# A publisher whose news is cached (see set_news_policy) keeps the latest
+# news for at most NEWS_CACHE_SIZE topics, forgetting the topic which has
+# gone longest without news when another is published
+#
+NEWS_CACHE_SIZE = 10000
+
+#
+# With USE_IO_THREAD set, messages & news are sent & received by one
+# thread which owns every socket, rather than by each thread using its
+# own. Any thread can then wait for messages on an address another is
+# listening on, and threads sending to the same address share one
+# connection. A message received by a concurrent listener can be replied
+# to from any thread with its reply handle; otherwise the reply must
+# still come from the thread which received the message. Set it before
+# sending or receiving anything. (send_messages_to, iter_news_from
+# and the stream & file functions still use each thread's own sockets;
+# see the iothread module.)
+#
+USE_IO_THREAD = False
+
+#
+# Files & streams are sent in chunks (files in chunks of STREAM_CHUNK_SIZE
+# bytes) with no more than STREAM_WINDOW chunks on their way to the
+# receiver at once, so memory use doesn't grow with the size of a file
+#
+STREAM_CHUNK_SIZE = 256 * 1024
+STREAM_WINDOW = 16
+
+#
+# ZeroMQ options set on every socket before it binds or connects, named
+# as in zmq (eg SNDBUF, RCVBUF, TCP_KEEPALIVE, IMMEDIATE, LINGER, SNDHWM,
+# RCVHWM), plus IO_THREADS: how many threads ZeroMQ uses for I/O, which
+# only takes effect if set before the first socket is created.
+# SOCKET_PROFILE picks one of the sets in SOCKET_PROFILES (or None for
+# ZeroMQ's defaults) and SOCKET_OPTIONS adds to or overrides it. A news
+# policy's high-water mark (see set_news_policy) overrides both.
+#
+SOCKET_PROFILES = {
+    #
+    # Keep queues short so nothing waits long behind a backlog, notice
+    # a dead peer quickly and don't hang on to unsent messages
+    #
+    "low-latency" : {
+        "SNDHWM" : 100,
+        "RCVHWM" : 100,
+        "LINGER" : 0,
+        "TCP_KEEPALIVE" : 1,
+        "TCP_KEEPALIVE_IDLE" : 10,
+    },
+    #
+    # Use several cores for I/O, large kernel buffers & long queues
+    #
+    "high-throughput" : {
+        "IO_THREADS" : 4,
+        "SNDBUF" : 4 * 1024 * 1024,
+        "RCVBUF" : 4 * 1024 * 1024,
+        "SNDHWM" : 100000,
+        "RCVHWM" : 100000,
+        "TCP_KEEPALIVE" : 1,
+    },
+}
+SOCKET_PROFILE = None
+SOCKET_OPTIONS = {}
+
+#
+# A socket bound to an address also listens on an ipc:// endpoint in
+# IPC_DIRECTORY (by default, a directory only this user can use in the
+# system's temporary directory) and sockets connecting to the address
+# from the same machine use that rather than TCP if it belongs to the
+# same user. Set USE_IPC to False to use only TCP.
+#
+USE_IPC = True
+IPC_DIRECTORY = None
+
 VALID_PORTS = range(0x10000)
 DYNAMIC_PORTS = range(0xC000, 0x10000)
+
+#
+# Messages & news are serialised as JSON unless another serialiser
+# is asked for, either per call or per address. Messages serialised
+# by anything not listed here are refused when they're received.
+# (See the serialisers module for what's available).
+#
+DEFAULT_SERIALISER = "json"
+ACCEPTED_SERIALISERS = {"json"}
+
+#
+# Messages & news which serialise to at least COMPRESSION_THRESHOLD bytes
+# are compressed if COMPRESSOR names a compressor, eg "zlib". Compressed
+# messages are decompressed when they're received if their compressor is
+# in ACCEPTED_COMPRESSORS (which each compressor joins when it's registered)
+# but never to more than MAX_DECOMPRESSED_SIZE bytes; larger ones are
+# refused. A listener sends a refused message an empty reply and goes on
+# waiting. (See the compressors module for what's available).
+#
+COMPRESSOR = None
+COMPRESSION_THRESHOLD = 4096
+ACCEPTED_COMPRESSORS = set()
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024
+
+#
+# Messages, bytes, timeouts & retries can be counted, and round trips &
+# serialising timed, for each address (see the metrics module). Set
+# COLLECT_STATS to True to do that; it adds a few microseconds to each
+# round trip (see benchmarks/bench_messages.py).
+#
+COLLECT_STATS = False
+
+#
+# Calls which send & receive messages & news are traced only if TRACE is
+# set, and then only a fraction, TRACE_SAMPLE_RATE, of them (see core._trace).
+# Traces are logged at DEBUG level to the "networkzero.trace" logger.
+#
+TRACE = False
+TRACE_SAMPLE_RATE = 1.0
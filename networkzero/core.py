@@ -2,6 +2,7 @@
 import base64
 import fnmatch
 import logging
+import multiprocessing
 import random
 import shlex
 import socket
@@ -16,18 +17,18 @@ from . import config
 
 def get_logger(name):
     #
-    # For now, this is just a hand-off to logging.getLogger
-    # Later, though, we might want to add a null handler etc.
+    # For now, this is just a hand-off to logging.getLogger. The level
+    # is left to whoever configures logging (or to _enable_debug_logging)
+    # so that debug records aren't even created unless someone wants them.
     #
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-    return logger
+    return logging.getLogger(name)
 
 _debug_logging_enabled = False
 def _enable_debug_logging():
     global _debug_logging_enabled
     if not _debug_logging_enabled:
         logger = logging.getLogger("networkzero")
+        logger.setLevel(logging.DEBUG)
         handler = logging.FileHandler("network.log", "w", encoding="utf-8")
         handler.setFormatter(logging.Formatter("%(asctime)s %(threadName)s %(name)s %(levelname)s %(message)s"))
         handler.setLevel(logging.DEBUG)
@@ -36,6 +37,47 @@ def _enable_debug_logging():
 
 _logger = get_logger(__name__)
 
+#
+# Calls which send & receive messages & news aren't logged: at thousands
+# of calls a second even deciding not to log shows up. Instead, when
+# config.TRACE is set, they're traced: a sample of them is logged at
+# DEBUG level to the "networkzero.trace" logger, each record carrying the
+# name of the call and its arguments as nw0_event & nw0_fields so that
+# a handler can write them out as structured data.
+#
+_trace_logger = get_logger("networkzero.trace")
+
+def _trace(event, **fields):
+    """Log a sample of the calls to `event` with their arguments; only
+    call this if config.TRACE is set
+    """
+    if config.TRACE_SAMPLE_RATE < 1 and random.random() >= config.TRACE_SAMPLE_RATE:
+        return
+    if _trace_logger.isEnabledFor(logging.DEBUG):
+        _trace_logger.debug("%s %s", event, fields, extra={"nw0_event" : event, "nw0_fields" : fields})
+
+#
+# Pool workers & forwarders which run as processes are spawned rather
+# than forked: a forked child can't safely use its parent's ZeroMQ context
+# or rely on the threads (eg the beacon) it was running. A spawned child
+# starts with the default configuration, so it's passed its parent's
+# settings to apply. (get_context only arrived with Python 3.4)
+#
+try:
+    _processes = multiprocessing.get_context("spawn")
+except AttributeError:
+    _processes = multiprocessing
+
+def _config_settings():
+    """Return this process's configuration settings for a spawned process
+    to apply with _apply_config_settings
+    """
+    return dict((name, value) for (name, value) in vars(config).items() if name.isupper())
+
+def _apply_config_settings(settings):
+    for name, value in settings.items():
+        setattr(config, name, value)
+
 #
 # Common exceptions
 #
@@ -47,11 +89,14 @@ class SocketAlreadyExistsError(NetworkZeroError):
 
 class SocketTimedOutError(NetworkZeroError):
 
-    def __init__(self, n_seconds):
+    def __init__(self, n_seconds, n_attempts=1):
         self.n_seconds = n_seconds
+        self.n_attempts = n_attempts
 
     def __str__(self):
-        return "Gave up waiting after %s seconds; this connection is now unusable" % self.n_seconds
+        if self.n_attempts > 1:
+            return "Gave up waiting after %s seconds over %d attempts" % (self.n_seconds, self.n_attempts)
+        return "Gave up waiting after %s seconds" % self.n_seconds
 
 class SocketInterruptedError(NetworkZeroError):
 
@@ -59,7 +104,7 @@ class SocketInterruptedError(NetworkZeroError):
         self.after_n_seconds = after_n_seconds
 
     def __str__(self):
-        return "Interrupted after %s seconds; this connection is now unusable" % self.after_n_seconds
+        return "Interrupted after %s seconds" % self.after_n_seconds
 
 class AddressError(NetworkZeroError):
     pass
@@ -46,6 +46,8 @@ import zmq
 from . import config
 from . import core
 from . import sockets
+from . import forwarders
+from . import pools
 
 _logger = core.get_logger(__name__)
 
@@ -502,7 +504,9 @@ def _resume():
 
 _services_advertised = {}
 
-def advertise(name, address=None, fail_if_exists=False, ttl_s=config.ADVERT_TTL_S):
+def advertise(name, address=None, fail_if_exists=False, ttl_s=config.ADVERT_TTL_S,
+    handler=None, workers=1, use_processes=False, forwarder=False
+):
     """Advertise a name at an address
 
     Start to advertise service `name` at address `address`. If
@@ -511,17 +515,70 @@ def advertise(name, address=None, fail_if_exists=False, ttl_s=config.ADVERT_TTL_
 
         address = nw0.advertise("myservice")
 
+    If a handler function is given, a pool of workers is started to
+    serve the address: each message sent to the address is passed to
+    the handler in one of the workers and whatever the handler returns
+    is sent back as the reply::
+
+        address = nw0.advertise("anagrams", handler=solve, workers=4)
+
+    If `forwarder` is True, a forwarder is started which passes news from
+    any number of publishers to any number of subscribers. Subscribers
+    wait for news from the address advertised, as they would from a single
+    publisher; publishers send news to the address returned by
+    :func:`discover_forwarder`. An address can't be served by both a
+    handler and a forwarder.
+
     :param name: any text
     :param address: either "ip:port" or None
     :param fail_if_exists: fail if this name is already registered?
     :param ttl_s: the advert will persist for this many seconds other beacons
+    :param handler: a function taking a message and returning a reply [default: None]
+    :param workers: how many workers should call the handler [default: 1]
+    :param use_processes: whether the workers (or forwarder) are processes rather than threads [default: No]
+    :param forwarder: whether to forward news from publishers to subscribers [default: No]
     :returns: the address given or constructed
     """
+    if handler and forwarder:
+        raise core.NetworkZeroError("An address can be served by a handler or by a forwarder, not both")
+    #
+    # Check the arguments before advertising so that a bad one doesn't
+    # leave an advert for an address which nothing serves
+    #
+    if handler:
+        pools.check_n_workers(workers)
     _start_beacon()
     address = _rpc("advertise", name, address, fail_if_exists, ttl_s)
     _services_advertised[name] = address
+    if address and handler:
+        try:
+            pools.serve(address, handler, workers, use_processes)
+        except:
+            _withdraw_adverts([name])
+            raise
+    elif address and forwarder:
+        ip, _ = core.split_address(address)
+        publishers_name = forwarders.publishers_name(name)
+        try:
+            publishers_address = _rpc("advertise", publishers_name, core.address(ip), fail_if_exists, ttl_s)
+            _services_advertised[publishers_name] = publishers_address
+            forwarders.serve(address, publishers_address, use_processes)
+        except:
+            _withdraw_adverts([name, publishers_name])
+            raise
     return address
 
+def _withdraw_adverts(names):
+    """Remove the adverts for an address which couldn't be served (eg
+    because it couldn't be bound) so that nobody is sent there
+    """
+    for name in names:
+        _services_advertised.pop(name, None)
+        try:
+            _unadvertise(name)
+        except core.SocketTimedOutError:
+            _logger.warn("Timed out trying to unadvertise %s", name)
+
 def _unadvertise_all():
     """Remove all adverts
     """
@@ -574,6 +631,25 @@ def discover(name, wait_for_s=60):
         if timed_out(t0, wait_for_s):
             return None
 
+def discover_forwarder(name, wait_for_s=60):
+    """Discover the forwarder advertised as `name` in order to publish
+    news through it
+
+    News sent to the address returned is forwarded to every subscriber
+    waiting for news from the address advertised::
+
+        address = nw0.discover_forwarder("weather")
+        nw0.send_news_to(address, "temperature", 21)
+
+    :param name: any text
+    :param wait_for_s: how many seconds to wait before giving up
+    :returns: the address found or None
+    """
+    address = discover(forwarders.publishers_name(name), wait_for_s)
+    if address:
+        sockets._sockets.set_forwarder(address)
+    return address
+
 def discover_all(wait_for_s=60):
     """Produce a list of all known services and their addresses
 
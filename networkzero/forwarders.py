@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Forward news from many publishers to many subscribers
+
+Normally a subscriber connects to every publisher it wants news from, so
+when dozens of processes publish the same kind of news each subscriber
+has dozens of connections. A forwarder instead binds two addresses:
+publishers connect to one (an XSUB socket) and subscribers to the other
+(an XPUB socket). Subscriptions are passed from the subscribers to the
+publishers and news from the publishers to the subscribers, so each
+process has just one connection.
+
+This is normally used via :func:`networkzero.advertise` and
+:func:`networkzero.discover_forwarder`::
+
+    # The forwarder
+    nw0.advertise("weather", forwarder=True)
+
+    # Each publisher
+    weather = nw0.discover_forwarder("weather")
+    nw0.send_news_to(weather, "temperature", 21)
+
+    # Each subscriber, exactly as for a single publisher
+    weather = nw0.discover("weather")
+    topic, temperature = nw0.wait_for_news_from(weather, "temperature")
+
+A forwarder runs in a thread of the process which starts it or, if the
+news is busy enough for the GIL to get in the way, in a process of its own.
+That process is spawned rather than forked (see core._processes), so the
+main module of the program which starts it must be safe to import.
+"""
+import threading
+import uuid
+
+import zmq
+
+from . import core
+from . import sockets
+
+_logger = core.get_logger(__name__)
+
+def publishers_name(name):
+    """Return the name under which the publishers' side of the forwarder
+    advertised as `name` is advertised
+    """
+    return "%s:publishers" % name
+
+def _forward_in_process(publishers_address, subscribers_address, settings):
+    core._apply_config_settings(settings)
+    #
+    # A ZeroMQ context must not be shared across processes
+    #
+    context = zmq.Context()
+    frontend = context.socket(zmq.XSUB)
+    backend = context.socket(zmq.XPUB)
+    sockets._tune(frontend)
+    sockets._tune(backend)
+    sockets._bind(frontend, publishers_address)
+    sockets._bind(backend, subscribers_address)
+    zmq.proxy(frontend, backend)
+
+class _Forwarder(threading.Thread):
+    """Pass news from the publishers' address to the subscribers' address
+    and subscriptions back the other way
+    """
+
+    def __init__(self, subscribers_address, publishers_address, use_process=False):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.subscribers_address = subscribers_address
+        self.publishers_address = publishers_address
+        self.use_process = use_process
+        self.process = None
+
+        context = sockets.context
+        self.control_address = "inproc://nw0-forwarder-control-%s" % uuid.uuid4().hex
+        self.frontend = context.socket(zmq.XSUB)
+        self.backend = context.socket(zmq.XPUB)
+        self.control = context.socket(zmq.PAIR)
+        sockets._tune(self.frontend)
+        sockets._tune(self.backend)
+        sockets._sockets.claim_address(subscribers_address)
+        try:
+            sockets._sockets.claim_address(publishers_address)
+        except:
+            sockets._sockets.release_address(subscribers_address)
+            raise
+        try:
+            if not use_process:
+                sockets._bind(self.frontend, publishers_address)
+                sockets._bind(self.backend, subscribers_address)
+            self.control.bind(self.control_address)
+        except:
+            self._close()
+            raise
+
+    def __repr__(self):
+        return "<%s: %s -> %s%s>" % (
+            self.__class__.__name__, self.publishers_address, self.subscribers_address,
+            " in a process" if self.use_process else ""
+        )
+
+    def stop(self):
+        with sockets.context.socket(zmq.PAIR) as control:
+            control.connect(self.control_address)
+            control.send(b"TERMINATE")
+        self.join()
+
+    def _close(self):
+        sockets._unbind(self.frontend)
+        sockets._unbind(self.backend)
+        self.frontend.close(linger=0)
+        self.backend.close(linger=0)
+        self.control.close(linger=0)
+        sockets._sockets.release_address(self.subscribers_address)
+        sockets._sockets.release_address(self.publishers_address)
+        _forwarders.pop(self.subscribers_address, None)
+
+    def run(self):
+        _logger.info("Starting %r", self)
+        if self.use_process:
+            self.process = core._processes.Process(
+                target=_forward_in_process,
+                args=(self.publishers_address, self.subscribers_address, core._config_settings())
+            )
+            self.process.daemon = True
+            self.process.start()
+        #
+        # This is what zmq.proxy_steerable does but, as for a pool's
+        # broker (see pools._Pool.run), some versions of libzmq miss the
+        # TERMINATE command once messages have passed through the proxy.
+        #
+        poller = zmq.Poller()
+        poller.register(self.control, zmq.POLLIN)
+        if not self.use_process:
+            poller.register(self.frontend, zmq.POLLIN)
+            poller.register(self.backend, zmq.POLLIN)
+        try:
+            while True:
+                events = dict(poller.poll())
+                if self.control in events:
+                    break
+                if self.frontend in events:
+                    self.backend.send_multipart(self.frontend.recv_multipart(copy=False), copy=False)
+                if self.backend in events:
+                    self.frontend.send_multipart(self.backend.recv_multipart(copy=False), copy=False)
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            if self.process is not None:
+                self.process.terminate()
+                self.process.join()
+                #
+                # The process is terminated before it can tidy up itself
+                #
+                if sockets._uses_ipc():
+                    paths = [sockets._ipc_path(a) for a in (self.publishers_address, self.subscribers_address)]
+                    sockets._remove_ipc_files([p for p in paths if p is not None])
+            self._close()
+        _logger.info("Ending %r", self)
+
+_forwarders = {}
+
+def serve(subscribers_address, publishers_address=None, use_process=False):
+    """Forward news sent to `publishers_address` to `subscribers_address`
+
+    :param subscribers_address: a fully-qualified ip:port address for subscribers to connect to
+    :param publishers_address: an address for publishers to connect to [default: another port on the same IP]
+    :param use_process: whether to forward from a process of its own (rather than a thread) [default: No]
+    :returns: the forwarder
+    """
+    subscribers_address = core.address(subscribers_address)
+    if publishers_address is None:
+        ip, _ = core.split_address(subscribers_address)
+        publishers_address = ip
+    publishers_address = core.address(publishers_address)
+    forwarder = _Forwarder(subscribers_address, publishers_address, use_process)
+    forwarder.start()
+    _forwarders[subscribers_address] = forwarder
+    return forwarder
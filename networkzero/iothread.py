@@ -0,0 +1,618 @@
+# -*- coding: utf-8 -*-
+"""One thread which sends & receives messages and news for all the others
+
+Normally every thread has its own sockets: a listening address can only
+be used by the thread which first listened on it and every thread which
+sends to an address opens its own connection to it. So a pool of 64
+worker threads opens 64 connections to each address it sends to.
+
+With config.USE_IO_THREAD set, the core functions for messages & news
+are instead carried out by a single I/O thread which owns all the
+sockets. Other threads pass their requests to it, and get the results
+back, over inproc pipes. So a pool of threads shares one connection to
+each address and any of them can wait for a message on a listening
+address. A message received with concurrent=True can be replied to
+from any thread with its reply handle; otherwise the thread which
+received it must reply, as it would with a socket of its own.
+
+A speaker which times out is replaced, as it would be in the thread's
+own sockets, so its message isn't delivered later -- but only once no
+other thread is waiting for a reply over the same connection. Until
+then the message may still be delivered, and its reply is dropped.
+
+send_news_batch is carried out by the I/O thread, too. The others --
+send_messages_to, iter_news_from and the streams & files -- still use
+the calling thread's own sockets, even with config.USE_IO_THREAD set.
+That's safe because none of them binds an address the I/O thread might
+already have bound, but they don't share the I/O thread's connections.
+
+Messages & news are still serialised & unserialised by the threads which
+send & receive them; the I/O thread only moves frames between sockets.
+They're counted (see the metrics module) by those threads, too, in the
+role they'd have had with sockets of their own.
+"""
+import collections
+import itertools
+import json
+import struct
+import threading
+
+import zmq
+
+from . import config
+from . import core
+from . import metrics
+from . import sockets
+
+_logger = core.get_logger(__name__)
+
+_request_id = struct.Struct("!Q")
+
+class _IOThread(threading.Thread):
+    """Carry out requests from other threads on sockets which only this
+    thread uses
+
+    Every request gets exactly one reply. A request which waits -- for
+    a reply, a message or news -- stays pending until what it's waiting
+    for arrives or until it's cancelled by the thread which made it,
+    typically because that thread has run out of time.
+    """
+
+    address = "inproc://nw0-io-thread"
+
+    def __init__(self, context):
+        threading.Thread.__init__(self, name="nw0-io-thread")
+        self.daemon = True
+        self.requests = context.socket(zmq.ROUTER)
+        self.requests.bind(self.address)
+        #
+        # Exceptions raised while carrying out a request, keyed by its
+        # id, for the thread which made it to raise
+        #
+        self.errors = {}
+        #
+        # For every socket with requests waiting on it, those requests in
+        # the order they were made. A speaker's are keyed by the sequence
+        # number its reply will carry; others' by the requester & id.
+        #
+        self._waiting = {}
+        self._waiting_for = {}
+        self._in_use = {}
+        self._sequence = itertools.count(1)
+        #
+        # For every subscriber, the prefixes each thread last waited for
+        # news with. The subscriber stays subscribed to all of them, and
+        # news for them which no thread is waiting for yet stays queued,
+        # just as it would on a thread's own subscriber.
+        #
+        self._subscriptions = {}
+        #
+        # For every publisher still waiting for its first subscriber (see
+        # sockets.Socket._wait_for_subscribers), the news it's been asked
+        # to send, in order. Nothing else waits while it does: the news is
+        # sent, and its senders answered, once a subscription has arrived
+        # or the publisher has given up waiting.
+        #
+        self._unsent = {}
+        #
+        # Only the requests, the sockets which have requests waiting on
+        # them and the publishers waiting for subscribers are watched;
+        # anything arriving on others stays queued until it's wanted
+        #
+        self.poller = zmq.Poller()
+        self.poller.register(self.requests, zmq.POLLIN)
+
+    def run(self):
+        try:
+            while True:
+                for socket, _ in self.poller.poll(self._joining_ms()):
+                    if socket is self.requests:
+                        self._handle_request(socket.recv_multipart(copy=False))
+                    elif socket in self._waiting:
+                        self._handle_arrival(socket)
+                self._send_unsent()
+        except zmq.ContextTerminated:
+            self.requests.close(linger=0)
+
+    def _reply(self, client, request_id, status, frames=()):
+        self.requests.send_multipart([client, request_id, status] + list(frames), copy=False)
+
+    def _wait(self, socket, key, client, request_id, prefixes=None):
+        waiting = self._waiting.get(socket)
+        if waiting is None:
+            waiting = self._waiting[socket] = collections.OrderedDict()
+            #
+            # Don't let the socket be closed as idle while it's wanted
+            #
+            in_use = self._in_use[socket] = socket.in_use()
+            in_use.__enter__()
+            self.poller.register(socket, zmq.POLLIN)
+        waiting[key] = client, request_id, prefixes
+        self._waiting_for[client, request_id] = socket, key
+
+    def _stop_waiting(self, socket, key):
+        waiting = self._waiting[socket]
+        client, request_id, _ = waiting.pop(key)
+        del self._waiting_for[client, request_id]
+        if not waiting:
+            del self._waiting[socket]
+            self._in_use.pop(socket).__exit__(None, None, None)
+            self.poller.unregister(socket)
+        return client, request_id
+
+    def _handle_request(self, frames):
+        client, request_id, op, header = [f.bytes for f in frames[:4]]
+        payload = frames[4:]
+        if op == b"cancel":
+            return self._cancel(client, request_id)
+        try:
+            handler = getattr(self, "_do_" + op.decode(config.ENCODING))
+            handler(client, request_id, json.loads(header.decode(config.ENCODING)), payload)
+        except Exception as exc:
+            _logger.exception("Unable to carry out %s", op)
+            self.errors[request_id] = exc
+            self._reply(client, request_id, b"error")
+
+    def _cancel(self, client, request_id):
+        #
+        # If the request isn't waiting, it's already been answered
+        #
+        if (client, request_id) in self._waiting_for:
+            socket, key = self._waiting_for[client, request_id]
+            self._stop_waiting(socket, key)
+            #
+            # A message which has timed out may still be queued on its
+            # speaker (eg if nothing is listening yet) to be delivered
+            # late. Replace the speaker, as Sockets.send_message_to does,
+            # unless other threads are still waiting for replies on it.
+            #
+            if socket.role == "pipelined_speaker" and socket not in self._waiting:
+                sockets._sockets._replace_socket(socket)
+            self._reply(client, request_id, b"cancelled")
+
+    def _do_send_message(self, client, request_id, header, payload):
+        socket = sockets._sockets.get_socket(header["address"], "pipelined_speaker")
+        sequence = next(self._sequence)
+        socket.send_multipart([sockets._sequence.pack(sequence), b""] + payload, copy=False)
+        self._wait(socket, sequence, client, request_id)
+
+    def _do_wait_for_message(self, client, request_id, header, payload):
+        socket = sockets._sockets.get_socket(header["address"], "concurrent_listener")
+        self._wait(socket, (client, request_id), client, request_id)
+
+    def _do_send_reply(self, client, request_id, header, payload):
+        #
+        # The payload is the envelope of the message being replied to
+        # followed by the reply
+        #
+        socket = sockets._sockets.get_socket(header["address"], "concurrent_listener")
+        socket.send_multipart(payload, copy=False)
+        self._reply(client, request_id, b"ok")
+
+    def _do_send_news(self, client, request_id, header, payload):
+        self._send_when_ready(header["address"], self._send_news, client, request_id, header, payload)
+
+    def _do_send_news_batch(self, client, request_id, header, payload):
+        self._send_when_ready(header["address"], self._send_news_batch, client, request_id, header, payload)
+
+    def _send_news(self, socket, client, request_id, header, payload):
+        socket.send_multipart(payload, copy=False)
+        self._reply(client, request_id, b"ok")
+
+    def _send_news_batch(self, socket, client, request_id, header, payload):
+        #
+        # The payload is every item's frames one after another; the header
+        # says how many frames each has. Sending stops at the first item
+        # which would go beyond the high-water mark.
+        #
+        n_sent = 0
+        with socket._refusing_to_drop():
+            for n_frames in header["n_frames"]:
+                frames, payload = payload[:n_frames], payload[n_frames:]
+                try:
+                    socket.send_multipart(frames, zmq.NOBLOCK, copy=False)
+                except zmq.Again:
+                    break
+                n_sent += 1
+        self._reply(client, request_id, b"ok", [json.dumps(n_sent).encode(config.ENCODING)])
+
+    def _send_when_ready(self, address, send, client, request_id, header, payload):
+        """Send news now if the publisher is ready, otherwise once it is,
+        behind any news it's already holding back
+        """
+        role = sockets._sockets._publisher_role(address)
+        socket = sockets._sockets.get_socket(address, role)
+        unsent = self._unsent.get(socket)
+        if unsent is None:
+            if role not in sockets.Socket.publishing_roles or socket._subscribers_pending_ms() is None:
+                if role in sockets.Socket.publishing_roles:
+                    socket._collect_subscriptions()
+                send(socket, client, request_id, header, payload)
+                return
+            unsent = self._unsent[socket] = []
+            in_use = self._in_use[socket] = socket.in_use()
+            in_use.__enter__()
+            self.poller.register(socket, zmq.POLLIN)
+        unsent.append((send, client, request_id, header, payload))
+
+    def _joining_ms(self):
+        """How long the loop can wait before a publisher gives up waiting
+        for subscribers, or None if none is waiting
+        """
+        if not self._unsent:
+            return None
+        timeouts_ms = [socket._subscribers_pending_ms() for socket in self._unsent]
+        if None in timeouts_ms:
+            return 0
+        return min(timeouts_ms)
+
+    def _send_unsent(self):
+        """Send the news held back by publishers which have stopped
+        waiting for subscribers
+        """
+        for socket in [s for s in self._unsent if s._subscribers_pending_ms() is None]:
+            self.poller.unregister(socket)
+            self._in_use.pop(socket).__exit__(None, None, None)
+            socket._collect_subscriptions()
+            for send, client, request_id, header, payload in self._unsent.pop(socket):
+                try:
+                    send(socket, client, request_id, header, payload)
+                except Exception as exc:
+                    _logger.exception("Unable to send news on %s", socket)
+                    self.errors[request_id] = exc
+                    self._reply(client, request_id, b"error")
+
+    def _do_wait_for_news(self, client, request_id, header, payload):
+        address = header["address"]
+        if not isinstance(address, list):
+            address = [address]
+        #
+        # Waiting for the subscriber's connections would hold up every
+        # other thread; the publishers' wait for a first subscription
+        # keeps their early news from being missed instead
+        #
+        socket = sockets._sockets.get_socket(address, "subscriber", wait_for_connections=False)
+        prefixes = header["prefixes"]
+        self._wait(socket, (client, request_id), client, request_id, [p.encode(config.ENCODING) for p in prefixes])
+        #
+        # A thread which waits with different prefixes has stopped
+        # subscribing to the ones it used before
+        #
+        subscriptions = self._subscriptions.setdefault(socket, {})
+        subscriptions[client] = set(prefixes)
+        self._subscribe(socket)
+        self._pass_on_news(socket)
+
+    def _do_forget(self, client, request_id, header, payload):
+        """Drop the subscriptions of threads which have finished
+        """
+        clients = set(c.encode(config.ENCODING) for c in header["clients"])
+        for socket, subscriptions in self._subscriptions.items():
+            if clients.intersection(subscriptions):
+                for forgotten in clients:
+                    subscriptions.pop(forgotten, None)
+                self._subscribe(socket)
+        self._reply(client, request_id, b"ok")
+
+    def _subscribe(self, socket):
+        """Subscribe to what every thread using this socket wants
+        """
+        wanted = set()
+        for prefixes in self._subscriptions[socket].values():
+            wanted.update(prefixes)
+        socket._subscribe_to(wanted)
+
+    def _handle_arrival(self, socket):
+        frames = socket.recv_multipart(copy=False)
+        #
+        # Whatever a peer sends mustn't stop the I/O thread, which every
+        # other thread depends on: frames which can't be handled are
+        # dropped and whoever was waiting goes on waiting
+        #
+        try:
+            self._pass_on_arrival(socket, frames)
+        except Exception:
+            _logger.exception("Unable to handle what arrived on %s; dropping it", socket)
+
+    def _pass_on_arrival(self, socket, frames):
+        if socket.role == "subscriber":
+            socket._take_news(frames, sockets.DRAIN_LIMIT, copy=False)
+            self._pass_on_news(socket)
+            return
+
+        envelope, message = sockets._split_envelope(frames)
+        if socket.role == "pipelined_speaker":
+            #
+            # A reply to a request which has been cancelled is dropped
+            #
+            key, = sockets._sequence.unpack(envelope[0].bytes)
+            if key not in self._waiting[socket]:
+                return
+            client, request_id = self._stop_waiting(socket, key)
+            self._reply(client, request_id, b"ok", message)
+        else:
+            client, request_id = self._stop_waiting(socket, next(iter(self._waiting[socket])))
+            self._reply(client, request_id, b"ok", envelope + message)
+
+    def _pass_on_news(self, socket):
+        """Pass each item of news which has arrived to the thread which
+        has been waiting longest for news with its topic
+
+        News which no thread is waiting for at the moment is left queued
+        for the next thread which waits for its topic. (News for a prefix
+        no thread is subscribed to any more is dropped by _next_news).
+        """
+        unclaimed = []
+        while socket in self._waiting:
+            frames = socket._next_news(copy=False)
+            if frames is None:
+                break
+            topic = sockets._frame_bytes(frames[0])
+            for key, (_, _, prefixes) in self._waiting[socket].items():
+                if any(topic.startswith(prefix) for prefix in prefixes):
+                    client, request_id = self._stop_waiting(socket, key)
+                    self._reply(client, request_id, b"ok", frames)
+                    break
+            else:
+                unclaimed.append(frames)
+        socket._pending_news.extendleft(reversed(unclaimed))
+
+class IOSockets(object):
+    """Carry out the core operations of :class:`sockets.Sockets` by
+    passing them to the I/O thread, which is started when first needed
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._io_thread = None
+        self._tls = threading.local()
+        #
+        # Each thread's pipe to the I/O thread, kept here as well so that
+        # the pipes of threads which have finished can be closed
+        #
+        self._pipes = {}
+        self._request_ids = itertools.count(1)
+        self._client_ids = itertools.count(1)
+
+    def _get_pipe(self):
+        pipe = getattr(self._tls, "pipe", None)
+        if pipe is None:
+            with self._lock:
+                if self._io_thread is None:
+                    self._io_thread = _IOThread(sockets.context)
+                    self._io_thread.start()
+                finished = []
+                for thread in [t for t in self._pipes if not t.is_alive()]:
+                    finished_pipe, client = self._pipes.pop(thread)
+                    finished_pipe.close(linger=0)
+                    finished.append(client)
+                #
+                # Name the pipe so that the I/O thread can be told which
+                # thread's subscriptions to forget once it's finished
+                #
+                client = "nw0-client-%d" % next(self._client_ids)
+                pipe = sockets.context.socket(zmq.DEALER)
+                pipe.set(zmq.IDENTITY, client.encode(config.ENCODING))
+                pipe.connect(_IOThread.address)
+                self._pipes[threading.current_thread()] = pipe, client
+                #
+                # Nothing waits for the I/O thread's reply, which is
+                # ignored when it arrives
+                #
+                if finished:
+                    request_id = _request_id.pack(next(self._request_ids))
+                    header = json.dumps({"clients" : finished}).encode(config.ENCODING)
+                    pipe.send_multipart([request_id, b"forget", header])
+            self._tls.pipe = pipe
+        return pipe
+
+    def _wait_for_reply(self, pipe, request_id, wait_for_s, copy):
+        """Wait for the I/O thread's reply to a request, checking every
+        so often that the thread is still running so that a request
+        which will never be answered doesn't wait forever
+        """
+        if wait_for_s is config.FOREVER:
+            deadline = None
+        else:
+            deadline = sockets._clock() + wait_for_s
+        while True:
+            if deadline is None:
+                timeout_s = config.SHORT_WAIT
+            else:
+                timeout_s = min(config.SHORT_WAIT, max(0, deadline - sockets._clock()))
+            try:
+                frames = sockets._sockets._receive_with_timeout(pipe, timeout_s, use_multipart=True, copy=copy)
+            except core.SocketTimedOutError:
+                if not self._io_thread.is_alive():
+                    raise core.NetworkZeroError("The I/O thread has stopped")
+                if deadline is not None and sockets._clock() >= deadline:
+                    raise core.SocketTimedOutError(wait_for_s)
+                continue
+            if sockets._frame_bytes(frames[0]) == request_id:
+                return sockets._frame_bytes(frames[1]), frames[2:]
+
+    def _request(self, op, header, payload=(), wait_for_s=config.FOREVER, copy=True):
+        """Pass a request to the I/O thread and return the frames of its
+        reply, cancelling the request if the reply doesn't come in time
+        """
+        pipe = self._get_pipe()
+        request_id = _request_id.pack(next(self._request_ids))
+        header_bytes = json.dumps(header).encode(config.ENCODING)
+        pipe.send_multipart([request_id, op, header_bytes] + list(payload), copy=False)
+        try:
+            status, frames = self._wait_for_reply(pipe, request_id, wait_for_s, copy)
+        except (core.SocketTimedOutError, core.SocketInterruptedError):
+            #
+            # What was waited for may have arrived in the meantime, in
+            # which case it's returned rather than the request cancelled
+            #
+            pipe.send_multipart([request_id, b"cancel", b"{}"])
+            status, frames = self._wait_for_reply(pipe, request_id, config.FOREVER, copy)
+            if status == b"cancelled":
+                raise
+        if status == b"error":
+            raise self._io_thread.errors.pop(request_id)
+        return frames
+
+    def send_message_to(self, address, message, wait_for_reply_s, serialiser=None, copy=True, request_id=None):
+        caddress = core.address(address)
+        address_stats = metrics._stats.for_address(caddress, "speaker")
+        if serialiser is None:
+            serialiser = sockets._sockets._serialisers.get(caddress)
+        message_frames = address_stats.serialising(sockets._serialise_to_frames, message, serialiser)
+        if request_id is not None:
+            message_frames = sockets._request_id_frames(request_id) + message_frames
+        timeout_s = wait_for_reply_s
+        waited_s = 0
+        for n_retries in range(config.SEND_RETRIES + 1):
+            if n_retries:
+                _logger.warn("No reply from %s; sending again (retry %d of %d)", address, n_retries, config.SEND_RETRIES)
+                address_stats.retried()
+                timeout_s = timeout_s * config.SEND_RETRY_BACKOFF
+            sent_at = sockets._clock()
+            address_stats.sent(message_frames)
+            try:
+                frames = self._request(b"send_message", {"address" : address}, message_frames, timeout_s, copy)
+            except core.SocketTimedOutError:
+                address_stats.timed_out()
+                waited_s += timeout_s
+                continue
+            address_stats.round_tripped(sockets._clock() - sent_at)
+            address_stats.received(frames)
+            reply, _ = address_stats.serialising(sockets._unserialise_from_frames, frames)
+            return reply
+        raise core.SocketTimedOutError(waited_s, config.SEND_RETRIES + 1)
+
+    def _wait_for_message(self, address, wait_for_s, copy, role):
+        caddress = core.address(address)
+        address_stats = metrics._stats.for_address(caddress, role)
+        if wait_for_s is config.FOREVER:
+            deadline = None
+        else:
+            deadline = sockets._clock() + wait_for_s
+        while True:
+            if deadline is None:
+                timeout_s = config.FOREVER
+            else:
+                timeout_s = max(0, deadline - sockets._clock())
+            try:
+                frames = self._request(b"wait_for_message", {"address" : address}, (), timeout_s, copy)
+            except core.SocketTimedOutError:
+                address_stats.timed_out()
+                raise
+            envelope, frames = sockets._split_envelope(frames)
+            address_stats.received(frames)
+            request_id, frames = sockets._split_request_id(frames)
+            if request_id is not None:
+                reply_frames, is_new = sockets._sockets._reply_cache(caddress).start(request_id, envelope)
+                if not is_new:
+                    address_stats.duplicated()
+                    if reply_frames is not None:
+                        self._request(b"send_reply", {"address" : address}, envelope + reply_frames)
+                        address_stats.sent(reply_frames)
+                    continue
+            try:
+                message, serialiser = address_stats.serialising(sockets._unserialise_from_frames, frames)
+            except Exception:
+                #
+                # Otherwise its sender would never be replied to; see
+                # Sockets.wait_for_message_from
+                #
+                _logger.exception("Unable to unserialise message from %s", address)
+                reply_frames = sockets._serialise_to_frames(None)
+                envelopes = [envelope]
+                if request_id is not None:
+                    envelopes.extend(sockets._sockets._reply_cache(caddress).forget(request_id))
+                for envelope in envelopes:
+                    self._request(b"send_reply", {"address" : address}, envelope + reply_frames)
+                    address_stats.sent(reply_frames)
+                continue
+            return message, sockets.ReplyHandle(caddress, envelope, serialiser, request_id)
+
+    def wait_for_message_from(self, address, wait_for_s, copy=True):
+        try:
+            message, reply_handle = self._wait_for_message(address, wait_for_s, copy, "listener")
+        except core.SocketTimedOutError:
+            return None
+        #
+        # As with a listening socket, the reply goes to whichever message
+        # this thread received last from the address
+        #
+        if not hasattr(self._tls, "reply_handles"):
+            self._tls.reply_handles = {}
+        self._tls.reply_handles[reply_handle.address] = reply_handle
+        return message
+
+    def wait_for_concurrent_message_from(self, address, wait_for_s, copy=True):
+        try:
+            return self._wait_for_message(address, wait_for_s, copy, "concurrent_listener")
+        except core.SocketTimedOutError:
+            return None, None
+
+    def send_reply_to(self, address, reply, serialiser=None):
+        if isinstance(address, sockets.ReplyHandle):
+            reply_handle = address
+            role = "concurrent_listener"
+        else:
+            reply_handle = getattr(self._tls, "reply_handles", {}).pop(core.address(address), None)
+            if reply_handle is None:
+                raise core.NetworkZeroError("No message from %s is waiting for a reply in this thread" % address)
+            role = "listener"
+        address_stats = metrics._stats.for_address(reply_handle.address, role)
+        if serialiser is None:
+            serialiser = reply_handle.serialiser
+        reply_frames = address_stats.serialising(sockets._serialise_to_frames, reply, serialiser)
+        self._request(b"send_reply", {"address" : reply_handle.address}, reply_handle.envelope + reply_frames)
+        address_stats.sent(reply_frames)
+        if reply_handle.request_id is not None:
+            for envelope in sockets._sockets._reply_cache(reply_handle.address).finish(reply_handle.request_id, reply_frames):
+                self._request(b"send_reply", {"address" : reply_handle.address}, envelope + reply_frames)
+                address_stats.sent(reply_frames)
+
+    def send_news_to(self, address, topic, data, serialiser=None):
+        caddress = core.address(address)
+        address_stats = metrics._stats.for_address(caddress, sockets._sockets._publisher_role(caddress))
+        if serialiser is None:
+            serialiser = sockets._sockets._serialisers.get(caddress)
+        payload = address_stats.serialising(sockets._serialise_for_pubsub, topic, data, serialiser)
+        self._request(b"send_news", {"address" : address}, payload)
+        address_stats.sent(payload)
+
+    def send_news_batch(self, address, news, serialiser=None):
+        caddress = core.address(address)
+        address_stats = metrics._stats.for_address(caddress, sockets._sockets._publisher_role(caddress))
+        if serialiser is None:
+            serialiser = sockets._sockets._serialisers.get(caddress)
+        batch = []
+        for topic, data in news:
+            batch.append(address_stats.serialising(sockets._serialise_for_pubsub, topic, data, serialiser))
+        header = {"address" : address, "n_frames" : [len(frames) for frames in batch]}
+        reply = self._request(b"send_news_batch", header, [f for frames in batch for f in frames])
+        n_sent = json.loads(sockets._frame_bytes(reply[0]).decode(config.ENCODING))
+        for frames in batch[:n_sent]:
+            address_stats.sent(frames)
+        return n_sent
+
+    def wait_for_news_from(self, address, topic, wait_for_s, is_raw=False, copy=True):
+        if isinstance(topic, str):
+            prefixes = [topic]
+        else:
+            prefixes = list(topic)
+        if isinstance(address, list):
+            caddress = tuple(core.address(a) for a in address)
+        else:
+            caddress = core.address(address)
+        address_stats = metrics._stats.for_address(caddress, "subscriber")
+        header = {"address" : address, "prefixes" : prefixes}
+        try:
+            frames = self._request(b"wait_for_news", header, (), wait_for_s, copy)
+        except core.SocketTimedOutError:
+            address_stats.timed_out()
+            return None, None
+        except core.SocketInterruptedError:
+            return None, None
+        address_stats.received(frames)
+        news = address_stats.serialising(sockets._unserialise_for_pubsub, frames, is_raw)
+        return news
+
+_io_sockets = IOSockets()
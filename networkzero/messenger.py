@@ -3,68 +3,317 @@ import uuid
 
 from . import config
 from . import core
+from . import iothread
 from . import sockets
 
 _logger = core.get_logger(__name__)
 EMPTY = None
 
-def send_message_to(address, message=EMPTY, wait_for_reply_s=config.FOREVER):
+def _core_sockets():
+    """Return what carries out the core functions for messages & news:
+    the I/O thread if config.USE_IO_THREAD is set, otherwise the calling
+    thread's own sockets
+    """
+    if config.USE_IO_THREAD:
+        return iothread._io_sockets
+    else:
+        return sockets._sockets
+
+def set_serialiser(address, serialiser):
+    """Choose the serialiser used by default when sending to an address
+    
+    :param address: a nw0 address (eg from `nw0.discover`)
+    :param serialiser: the name of a serialiser, eg "msgpack", or None for the default
+    """
+    _logger.debug("Using serialiser %s for %s", serialiser, address)
+    return sockets._sockets.set_serialiser(address, serialiser)
+
+def set_news_policy(address, hwm=None, conflate=False, cache=False):
+    """Choose how much news is queued for an address, whether only the
+    latest news for each topic is kept and whether it's cached
+    
+    A publisher keeps up to `hwm` items of news for each subscriber which
+    hasn't yet received them and a subscriber keeps up to `hwm` items from
+    each publisher; beyond that, news is dropped. A subscriber which
+    conflates a topic only ever receives the latest news it has for that
+    topic, eg the latest reading from a sensor, however far behind it is.
+    
+    A publisher which caches news sends the latest news for each topic to
+    a subscriber as soon as it subscribes rather than leaving it to wait
+    for the next news to be sent. (A subscriber already subscribed to the
+    same topic will receive that news again).
+    
+    Set the policy before news is first sent from or waited for from the
+    address, on the publisher (for `hwm` & `cache`) and on the subscriber.
+    
+    :param address: a nw0 address (eg from `nw0.advertise` or `nw0.discover`)
+    :param hwm: how many items of news to queue [default: ZeroMQ's default, 1000]
+    :param conflate: True to keep only the latest news for every topic, or
+        a topic prefix or list of prefixes to do so for some [default: No]
+    :param cache: whether a publisher sends its latest news to new subscribers [default: No]
+    """
+    _logger.debug("Using high-water mark %s, conflating %s and caching %s for %s", hwm, conflate, cache, address)
+    return sockets._sockets.set_news_policy(address, hwm, conflate, cache)
+
+def send_message_to(address, message=EMPTY, wait_for_reply_s=config.FOREVER, serialiser=None, copy=True, request_id=None):
     """Send a message and return the reply
     
+    Bytes, bytearrays, memoryviews or anything else supporting the buffer
+    protocol are sent as they are, without being serialised or copied.
+    (So don't change a buffer's contents straight after sending it).
+    
+    If no reply comes within `wait_for_reply_s` the message is sent again,
+    up to config.SEND_RETRIES times, over a new connection. Either way, a
+    later message to the same address can be sent as usual.
+    
+    A message sent again may be received again. To have the listener
+    handle it only once, send it with a `request_id` unique to it (eg
+    from `uuid.uuid4().hex`) every time it's sent: once the listener has
+    replied to a request id it sends the same reply to that id again
+    without handling the message (see config.REPLY_CACHE_SIZE).
+    
     :param address: a nw0 address (eg from `nw0.discover`)
-    :param message: any simple Python object, including text & tuples
+    :param message: any simple Python object, including text & tuples, or binary data
     :param wait_for_reply_s: how many seconds to wait for a reply [default: forever]
+    :param serialiser: the name of a serialiser [default: the address's, or JSON]
+    :param copy: whether a binary reply is returned as bytes or as a memoryview [default: bytes]
+    :param request_id: text or bytes identifying this request [default: none]
+    
+    :returns: the reply returned from the address
+    :raises SocketTimedOutError: if no reply comes in time
+    """
+    if config.TRACE:
+        core._trace("send_message_to", address=address, message=message, request_id=request_id)
+    if isinstance(address, list):
+        raise core.InvalidAddressError("Multiple addresses are not allowed")
+    return _core_sockets().send_message_to(address, message, wait_for_reply_s, serialiser, copy, request_id)
+
+def send_messages_to(address, messages, window=10, wait_for_reply_s=config.FOREVER, serialiser=None, copy=True):
+    """Send several messages without waiting for each reply in turn
+    
+    Up to `window` messages are sent before waiting for any reply and,
+    as each reply arrives, another message is sent. The replies are
+    generated in the same order as the messages were sent::
+    
+        for reply in nw0.send_messages_to(address, lines_from_file, window=20):
+            print(reply)
     
-    :returns: the reply returned from the address or None if out of time
+    Only one such pipeline should be used at a time from one thread
+    to any one address.
+    
+    :param address: a nw0 address (eg from `nw0.discover`)
+    :param messages: any iterable of messages, each one as for :func:`send_message_to`
+    :param window: how many messages can be awaiting replies at once [default: 10]
+    :param wait_for_reply_s: how many seconds to wait for each reply [default: forever]
+    :param serialiser: the name of a serialiser [default: the address's, or JSON]
+    :param copy: whether binary replies are returned as bytes or as memoryviews [default: bytes]
+    
+    :returns: a generator of the replies
     """
-    _logger.info("Sending message %s to %s", message, address)
+    if config.TRACE:
+        core._trace("send_messages_to", address=address, window=window)
     if isinstance(address, list):
         raise core.InvalidAddressError("Multiple addresses are not allowed")
-    return sockets._sockets.send_message_to(address, message, wait_for_reply_s)
+    return sockets._sockets.send_messages_to(address, messages, window, wait_for_reply_s, serialiser, copy)
 
-def wait_for_message_from(address, wait_for_s=config.FOREVER, autoreply=False):
+def wait_for_message_from(address, wait_for_s=config.FOREVER, autoreply=False, copy=True, concurrent=False):
     """Wait for a message
     
+    Normally a reply must be sent to each message before the next one can
+    be received. If `concurrent` is True, many messages can be received
+    before any of them is replied to and the replies can be sent in any
+    order. Each message then comes with a reply handle which should be
+    passed to :func:`send_reply_to` in place of the address::
+    
+        message, reply_handle = nw0.wait_for_message_from(address, concurrent=True)
+        ...
+        nw0.send_reply_to(reply_handle, reply)
+    
+    A message which can't be unserialised (eg because its serialiser isn't
+    in config.ACCEPTED_SERIALISERS) is logged and sent an empty reply, and
+    the wait goes on.
+    
     :param address: a nw0 address (eg from `nw0.advertise`)
     :param wait_for_s: how many seconds to wait for a message before giving up [default: forever]
     :param autoreply: whether to send an empty reply [default: No]
+    :param copy: whether a binary message is returned as bytes or as a memoryview [default: bytes]
+    :param concurrent: whether to allow several messages to await replies at once [default: No]
     
-    :returns: the message received from another address or None if out of time
+    :returns: the message received from another address or None if out of time;
+        if `concurrent` is True, a 2-tuple of (message, reply handle) or (None, None)
     """
-    _logger.info("Waiting for message on %s for %s secs", address, wait_for_s)
-    message = sockets._sockets.wait_for_message_from(address, wait_for_s)
+    if config.TRACE:
+        core._trace("wait_for_message_from", address=address, wait_for_s=wait_for_s, concurrent=concurrent)
+    if concurrent:
+        message, reply_handle = _core_sockets().wait_for_concurrent_message_from(address, wait_for_s, copy)
+        if reply_handle is not None and autoreply:
+            _core_sockets().send_reply_to(reply_handle, EMPTY)
+        return message, reply_handle
+
+    message = _core_sockets().wait_for_message_from(address, wait_for_s, copy)
     if message is not None and autoreply:
-        sockets._sockets.send_reply_to(address, EMPTY)
+        _core_sockets().send_reply_to(address, EMPTY)
     return message
 
-def send_reply_to(address, reply=EMPTY):
+def send_reply_to(address, reply=EMPTY, serialiser=None):
     """Reply to a message previously received
     
-    :param address: a nw0 address (eg from `nw0.advertise`)
-    :param reply: any simple Python object, including text & tuples
+    :param address: a nw0 address (eg from `nw0.advertise`) or the reply
+        handle returned with a message by a concurrent listener
+    :param reply: any simple Python object, including text & tuples, or binary data
+    :param serialiser: the name of a serialiser [default: the one the message used]
     """
-    _logger.debug("Sending reply %s to %s", reply, address)
-    return sockets._sockets.send_reply_to(address, reply)
+    if config.TRACE:
+        core._trace("send_reply_to", address=address, reply=reply)
+    return _core_sockets().send_reply_to(address, reply, serialiser)
 
-def send_news_to(address, topic, data=None):
+def send_news_to(address, topic, data=None, serialiser=None):
     """Publish news to all subscribers
     
     :param address: a nw0 address, eg from `nw0.advertise`
     :param topic: any text object
-    :param data: any simple Python object including test & tuples [default: empty]
+    :param data: any simple Python object including test & tuples, or binary data [default: empty]
+    :param serialiser: the name of a serialiser [default: the address's, or JSON]
+    """
+    if config.TRACE:
+        core._trace("send_news_to", address=address, topic=topic, data=data)
+    return _core_sockets().send_news_to(address, topic, data, serialiser)
+
+def send_news_batch(address, news, serialiser=None):
+    """Publish many items of news to all subscribers at once
+    
+    This is quicker than calling :func:`send_news_to` for each item. Rather
+    than dropping news which a subscriber has no room for (see the `hwm` of
+    :func:`set_news_policy`) it stops sending at that point and returns how
+    many items were sent so that the rest can be sent again later.
+    
+    :param address: a nw0 address, eg from `nw0.advertise`
+    :param news: a list (or other iterable) of 2-tuples of (topic, data)
+    :param serialiser: the name of a serialiser [default: the address's, or JSON]
+    
+    :returns: how many items of news were sent
     """
-    _logger.info("Publish topic %s with data %s to %s", topic, data, address)
-    return sockets._sockets.send_news_to(address, topic, data)
+    if config.TRACE:
+        core._trace("send_news_batch", address=address)
+    return _core_sockets().send_news_batch(address, news, serialiser)
 
-def wait_for_news_from(address, prefix=config.EVERYTHING, wait_for_s=config.FOREVER, is_raw=False):
+def wait_for_news_from(address, prefix=config.EVERYTHING, wait_for_s=config.FOREVER, is_raw=False, copy=True):
     """Wait for news whose topic starts with `prefix`.
     
+    Only news matching the prefix (or prefixes) of the latest call is
+    received from an address: news for a prefix waited for before but not
+    now is no longer sent by the publisher.
+    
     :param address: a nw0 address, eg from `nw0.discover`
     :param prefix: any text object [default: all messages]
     :param wait_for_s: how many seconds to wait before giving up [default: forever]
+    :param is_raw: whether the data was sent as binary data [default: No]
+    :param copy: whether raw data is returned as bytes or as a memoryview [default: bytes]
     
     :returns: a 2-tuple of (topic, data) or (None, None) if out of time
     """
-    _logger.info("Listen on %s for news matching %s waiting for %s secs", address, prefix, wait_for_s)
-    return sockets._sockets.wait_for_news_from(address, prefix, wait_for_s, is_raw)
+    if config.TRACE:
+        core._trace("wait_for_news_from", address=address, prefix=prefix, wait_for_s=wait_for_s)
+    return _core_sockets().wait_for_news_from(address, prefix, wait_for_s, is_raw, copy)
+
+def iter_news_from(address, prefix=config.EVERYTHING, wait_for_s=config.FOREVER, is_raw=False, copy=True, batch=None):
+    """Generate news whose topic starts with `prefix` as it arrives
+    
+    This is the same as calling :func:`wait_for_news_from` in a loop, but
+    each time it wakes up it takes all the news which has already arrived
+    so that a busy publisher (eg a sensor sending many readings a second)
+    can be kept up with::
+    
+        for topic, reading in nw0.iter_news_from(sensor, "temperature"):
+            print(reading)
+    
+    :param address: a nw0 address, eg from `nw0.discover`
+    :param prefix: any text object [default: all messages]
+    :param wait_for_s: how many seconds to wait for news before stopping [default: forever]
+    :param is_raw: whether the data was sent as binary data [default: No]
+    :param copy: whether raw data is returned as bytes or as a memoryview [default: bytes]
+    :param batch: if given, generate lists of up to this many items of news at a time
+    
+    :returns: a generator of 2-tuples of (topic, data), or of lists of them
+        if `batch` is given, which stops if no news comes in time
+    """
+    if config.TRACE:
+        core._trace("iter_news_from", address=address, prefix=prefix, wait_for_s=wait_for_s)
+    return sockets._sockets.iter_news_from(address, prefix, wait_for_s, is_raw, copy, batch)
+
+def send_stream_to(address, chunks, wait_for_s=config.FOREVER):
+    """Send a stream of binary data, however large, in chunks
+    
+    Chunks are taken from `chunks` only as fast as the receiver (which
+    is calling :func:`iter_stream_from`) takes them, with no more than
+    config.STREAM_WINDOW of them on their way at once. As with
+    :func:`send_message_to`, chunks are sent without being copied so
+    don't reuse a buffer for the next chunk.
+    
+    :param address: a nw0 address (eg from `nw0.discover`)
+    :param chunks: a list (or other iterable, eg a generator) of bytes or other binary data
+    :param wait_for_s: how many seconds to wait for the receiver before giving up [default: forever]
+    
+    :returns: how many bytes were sent
+    :raises NetworkZeroError: if the receiver stops taking the stream before its end
+    """
+    if config.TRACE:
+        core._trace("send_stream_to", address=address, wait_for_s=wait_for_s)
+    return sockets._sockets.send_stream_to(address, chunks, wait_for_s)
 
+def iter_stream_from(address, wait_for_s=config.FOREVER, copy=True):
+    """Generate the chunks of a stream sent by :func:`send_stream_to` or
+    :func:`send_file_to` as they arrive
+    
+    If a stream is started while another is being received, it is
+    received by the next call. Closing the generator (eg by breaking out
+    of a loop over it) before the stream's end cancels the stream.
+    
+    :param address: a nw0 address (eg from `nw0.advertise`)
+    :param wait_for_s: how many seconds to wait for a stream to start
+        or for its next chunk [default: forever]
+    :param copy: whether chunks are returned as bytes or as memoryviews [default: bytes]
+    
+    :returns: a generator of chunks, which stops if no stream starts in
+        time and raises SocketTimedOutError if its sender goes quiet
+    """
+    if config.TRACE:
+        core._trace("iter_stream_from", address=address, wait_for_s=wait_for_s)
+    return sockets._sockets.iter_stream_from(address, wait_for_s, copy)
+
+def send_file_to(address, path, wait_for_s=config.FOREVER):
+    """Send the contents of a file, however large, without reading it all
+    into memory
+    
+    The file is sent as a stream in chunks of config.STREAM_CHUNK_SIZE
+    bytes (see :func:`send_stream_to`) and can be received by
+    :func:`receive_file_from` or :func:`iter_stream_from`.
+    
+    :param address: a nw0 address (eg from `nw0.discover`)
+    :param path: the path to a file
+    :param wait_for_s: how many seconds to wait for the receiver before giving up [default: forever]
+    
+    :returns: how many bytes were sent
+    :raises NetworkZeroError: if the receiver stops taking the file before its end
+    """
+    if config.TRACE:
+        core._trace("send_file_to", address=address, path=path, wait_for_s=wait_for_s)
+    return sockets._sockets.send_file_to(address, path, wait_for_s)
+
+def receive_file_from(address, path, wait_for_s=config.FOREVER):
+    """Receive a file sent by :func:`send_file_to` (or any stream sent by
+    :func:`send_stream_to`) and write it to `path`
+    
+    The file is written alongside `path` and only renamed to it once it
+    has all arrived, so nothing is left at `path` if the sender goes quiet.
+    
+    :param address: a nw0 address (eg from `nw0.advertise`)
+    :param path: the path of the file to write
+    :param wait_for_s: how many seconds to wait for a file to start
+        or for its next chunk [default: forever]
+    
+    :returns: how many bytes were written, or None if no file came in time
+    """
+    if config.TRACE:
+        core._trace("receive_file_from", address=address, path=path, wait_for_s=wait_for_s)
+    return sockets._sockets.receive_file_from(address, path, wait_for_s)
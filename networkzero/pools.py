@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""Serve one address from a pool of worker threads or processes
+
+A broker thread binds the address with a ROUTER socket and passes each
+message, fairly queued, to one of a number of workers through a DEALER
+socket (as sketched in trials/router-dealer.py). Each worker calls a
+handler function with the message and sends back whatever it returns.
+A process sending to the address uses :func:`send_message_to` exactly
+as it would for a single listener.
+
+This is normally used via :func:`networkzero.advertise`::
+
+    def solve(anagram):
+        ...
+        return solutions
+
+    address = nw0.advertise("anagrams", handler=solve, workers=4)
+
+Thread workers share this process (and its GIL) and talk to the broker
+over inproc://. Process workers talk to it over an ipc:// endpoint in a
+directory only this user can use (see sockets._ipc_directory) so that
+no other user on the machine can connect as a worker; where there's no
+ipc:// (eg on Windows) they fall back to tcp:// on the loopback
+interface. They're spawned rather than forked (see core._processes), so
+their handler must be a function which can be pickled, ie one defined at
+the top level of a module, and the program's main module must be safe
+to import.
+"""
+import os
+import threading
+import uuid
+
+import zmq
+
+from . import core
+from . import sockets
+
+_logger = core.get_logger(__name__)
+
+#
+# Sent by the broker to each worker thread when the pool is stopped
+#
+STOP_MARKER = b"\x00stop"
+
+def _serve(context, backend_address, handler, connected=None):
+    """Receive messages from the broker, call the handler & send its reply
+    """
+    with context.socket(zmq.REP) as socket:
+        socket.connect(backend_address)
+        if connected:
+            connected.set()
+        while True:
+            try:
+                frames = socket.recv_multipart(copy=False)
+            except zmq.ContextTerminated:
+                break
+
+            if len(frames) == 1 and frames[0].bytes == STOP_MARKER:
+                break
+            #
+            # A message's request id is sent back ahead of the reply so
+            # that the broker can cache the reply (see _Pool.run)
+            #
+            request_id, frames = sockets._split_request_id(frames)
+            #
+            # A reply must be sent for the worker to receive another
+            # message, even for one which can't be unserialised (eg if
+            # its serialiser isn't accepted) or which the handler fails
+            # on; the best we can do is log the problem & send an empty
+            # reply.
+            #
+            try:
+                message, serialiser = sockets._unserialise_from_frames(frames)
+            except Exception:
+                _logger.exception("Unable to unserialise message")
+                message, serialiser, reply = None, None, None
+            else:
+                try:
+                    reply = handler(message)
+                except Exception:
+                    _logger.exception("Problem handling %r", message)
+                    reply = None
+            reply_frames = sockets._serialise_to_frames(reply, serialiser)
+            if request_id is not None:
+                reply_frames = sockets._request_id_frames(request_id) + reply_frames
+            socket.send_multipart(reply_frames, copy=False)
+
+def _serve_in_process(backend_address, handler, settings):
+    core._apply_config_settings(settings)
+    #
+    # A ZeroMQ context must not be shared across processes
+    #
+    _serve(zmq.Context(), backend_address, handler)
+
+class _Pool(threading.Thread):
+    """Broker which fair-queues messages between an address and its workers
+    """
+
+    def __init__(self, address, handler, n_workers, use_processes=False):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.address = address
+        self.handler = handler
+        self.n_workers = n_workers
+        self.use_processes = use_processes
+        self.workers = []
+
+        context = sockets.context
+        self.control_address = "inproc://nw0-pool-control-%s" % uuid.uuid4().hex
+        self.frontend = context.socket(zmq.ROUTER)
+        self.backend = context.socket(zmq.DEALER)
+        self.control = context.socket(zmq.PAIR)
+        sockets._tune(self.frontend)
+        sockets._sockets.claim_address(address)
+        try:
+            sockets._bind(self.frontend, address)
+            if use_processes:
+                self.backend_address = self._bind_for_processes()
+            else:
+                self.backend_address = "inproc://nw0-pool-%s" % uuid.uuid4().hex
+                self.backend.bind(self.backend_address)
+            self.control.bind(self.control_address)
+        except:
+            self._close()
+            raise
+
+    def _bind_for_processes(self):
+        """Bind the backend where only this user's processes can connect
+        if possible, and return the endpoint
+        """
+        directory = sockets._ipc_directory() if sockets._has_ipc() else None
+        if directory is not None:
+            path = os.path.join(directory, "nw0-pool-%s.ipc" % uuid.uuid4().hex)
+            return sockets._bind_ipc(self.backend, path)
+        port = self.backend.bind_to_random_port("tcp://127.0.0.1")
+        return "tcp://127.0.0.1:%d" % port
+
+    def __repr__(self):
+        return "<%s: %d %s on %s>" % (
+            self.__class__.__name__, self.n_workers,
+            "processes" if self.use_processes else "threads", self.address
+        )
+
+    def start_workers(self):
+        for n in range(self.n_workers):
+            if self.use_processes:
+                worker = core._processes.Process(target=_serve_in_process, args=(self.backend_address, self.handler, core._config_settings()))
+                worker.daemon = True
+                worker.start()
+            else:
+                #
+                # Wait for each thread to connect so that, when the pool
+                # stops, there's a worker to receive each stop marker
+                #
+                connected = threading.Event()
+                worker = threading.Thread(target=_serve, args=(sockets.context, self.backend_address, self.handler, connected))
+                worker.daemon = True
+                worker.start()
+                connected.wait()
+            self.workers.append(worker)
+
+    def stop(self):
+        with sockets.context.socket(zmq.PAIR) as control:
+            control.connect(self.control_address)
+            control.send(b"TERMINATE")
+        self.join()
+
+    def _close(self):
+        sockets._unbind(self.frontend)
+        self.frontend.close(linger=0)
+        self.control.close(linger=0)
+        #
+        # Allow any stop markers time to reach the worker threads
+        #
+        self.backend.close(linger=1000)
+        sockets._sockets.release_address(self.address)
+        _pools.pop(self.address, None)
+
+    def _stop_workers(self):
+        for worker in self.workers:
+            if self.use_processes:
+                worker.terminate()
+                worker.join()
+            else:
+                #
+                # The DEALER socket deals messages round-robin so each
+                # worker thread will receive exactly one of these
+                #
+                self.backend.send_multipart([b"", STOP_MARKER])
+
+    #
+    # A message which comes with a request id is answered from the
+    # address's reply cache if a worker has already replied to it, or
+    # along with the first if a worker is still handling it, so that a
+    # message sent again isn't handled again. Otherwise the broker just
+    # passes frames back and forth.
+    #
+    def _pass_on_message(self, frames):
+        envelope, message = sockets._split_envelope(frames)
+        request_id, _ = sockets._split_request_id(message)
+        if request_id is not None:
+            reply_frames, is_new = sockets._sockets._reply_cache(self.address).start(request_id, envelope)
+            if not is_new:
+                if reply_frames is not None:
+                    self.frontend.send_multipart(envelope + reply_frames, copy=False)
+                return
+        self.backend.send_multipart(frames, copy=False)
+
+    def _pass_on_reply(self, frames):
+        envelope, reply = sockets._split_envelope(frames)
+        request_id, reply_frames = sockets._split_request_id(reply)
+        if request_id is None:
+            self.frontend.send_multipart(frames, copy=False)
+            return
+        self.frontend.send_multipart(envelope + reply_frames, copy=False)
+        for waiting_envelope in sockets._sockets._reply_cache(self.address).finish(request_id, reply_frames):
+            self.frontend.send_multipart(waiting_envelope + reply_frames, copy=False)
+
+    def _handle_arrival(self, socket, pass_on):
+        frames = socket.recv_multipart(copy=False)
+        #
+        # Whatever a peer sends mustn't stop the broker, which every
+        # message to the address goes through: frames which can't be
+        # handled are dropped and the broker goes on polling
+        #
+        try:
+            pass_on(frames)
+        except Exception:
+            _logger.exception("Unable to handle what arrived on %r; dropping it", self)
+
+    def run(self):
+        _logger.info("Starting %r", self)
+        #
+        # This is what zmq.proxy_steerable does but some versions of
+        # libzmq (eg 4.3.5) miss the TERMINATE command once messages
+        # have passed through the proxy, so the broker would never stop.
+        #
+        poller = zmq.Poller()
+        for socket in (self.frontend, self.backend, self.control):
+            poller.register(socket, zmq.POLLIN)
+        try:
+            while True:
+                events = dict(poller.poll())
+                if self.control in events:
+                    break
+                if self.frontend in events:
+                    self._handle_arrival(self.frontend, self._pass_on_message)
+                if self.backend in events:
+                    self._handle_arrival(self.backend, self._pass_on_reply)
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            self._stop_workers()
+            self._close()
+        _logger.info("Ending %r", self)
+
+_pools = {}
+
+def check_n_workers(n_workers):
+    """Raise an exception if a pool can't have `n_workers` workers
+    """
+    if n_workers < 1:
+        raise core.NetworkZeroError("A pool needs at least one worker, not %r" % n_workers)
+
+def serve(address, handler, n_workers, use_processes=False):
+    """Serve `address` from a pool of workers each calling `handler`
+
+    :param address: a fully-qualified ip:port address to bind to
+    :param handler: a function which takes a message and returns a reply
+    :param n_workers: how many workers to start
+    :param use_processes: whether workers are processes (rather than threads) [default: No]
+    :returns: the pool broker
+    """
+    check_n_workers(n_workers)
+    address = core.address(address)
+    pool = _Pool(address, handler, n_workers, use_processes)
+    pool.start()
+    pool.start_workers()
+    _pools[address] = pool
+    return pool
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Serialisers which turn message payloads into bytes and back again
+
+Every message, reply and item of news passes through one of the
+serialisers registered here. Three are built in:
+
+    * json -- always available and the default
+    * pickle -- always available, using protocol 5 where the Python
+      version supports it. Because unpickling can run arbitrary code,
+      pickled messages are refused unless "pickle" is added to
+      config.ACCEPTED_SERIALISERS
+    * msgpack -- available if the msgpack package is installed
+
+JSON messages go across the wire exactly as they always have so that
+older networkzero nodes can still read them. Every other serialiser
+prefixes its output with a one-byte tag. The receiving end looks at that
+tag to decide how to unserialise the message, so the two ends never
+need to agree in advance.
+"""
+import json
+import pickle
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from . import config
+from . import core
+
+_logger = core.get_logger(__name__)
+
+#
+# Tags are single control bytes which can never start a JSON document.
+# Tab, newline & carriage return are excluded because JSON text is
+# allowed to start with whitespace.
+#
+VALID_TAGS = set(range(0x01, 0x10)) - {0x09, 0x0a, 0x0d}
+
+#
+# JSON is built in rather than registered: its output goes untagged
+#
+_JSON = "json"
+
+class _Serialiser(object):
+    """Convenience container for a named pair of serialise / unserialise
+    functions and the tag which marks their output on the wire
+    """
+
+    def __init__(self, name, tag, serialise, unserialise):
+        self.name = name
+        self.tag = tag
+        self.serialise = serialise
+        self.unserialise = unserialise
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.__class__.__name__, self.name)
+
+_serialisers = {}
+_serialisers_by_tag = {}
+
+def register(name, tag, serialise, unserialise, accept=True):
+    """Register a serialiser under a name so it can be used for messages & news
+
+    :param name: any text, used to select the serialiser when sending
+    :param tag: an integer in VALID_TAGS identifying the serialiser on the wire
+    :param serialise: a function taking an object and returning bytes
+    :param unserialise: a function taking bytes and returning an object
+    :param accept: whether messages using this serialiser should be accepted [default: yes]
+    """
+    if tag not in VALID_TAGS:
+        raise core.NetworkZeroError("Serialiser tag must be one of %s, not %r" % (sorted(VALID_TAGS), tag))
+    tag_bytes = bytes(bytearray([tag]))
+    existing = _serialisers_by_tag.get(tag_bytes)
+    if existing and existing.name != name:
+        raise core.NetworkZeroError("Tag %d is already used by serialiser %s" % (tag, existing.name))
+
+    serialiser = _Serialiser(name, tag_bytes, serialise, unserialise)
+    _serialisers[name] = serialiser
+    _serialisers_by_tag[tag_bytes] = serialiser
+    if accept:
+        config.ACCEPTED_SERIALISERS.add(name)
+    return serialiser
+
+def names():
+    """Return the names of all the serialisers available in this process
+    """
+    return [_JSON] + sorted(_serialisers)
+
+def check_name(name):
+    """Raise an exception if no serialiser is registered as `name`
+    """
+    if name != _JSON and name not in _serialisers:
+        raise core.NetworkZeroError("No serialiser is registered as %r; try one of %s" % (name, ", ".join(names())))
+
+def serialise(message, name=None):
+    """Serialise a message with a named serialiser, tagging it if needed
+
+    :param message: any object the serialiser can handle
+    :param name: the name of a registered serialiser [default: config.DEFAULT_SERIALISER]
+    :returns: bytes
+    """
+    if name is None:
+        name = config.DEFAULT_SERIALISER
+    if name == _JSON:
+        return json.dumps(message).encode(config.ENCODING)
+
+    serialiser = _serialisers.get(name)
+    if serialiser is None:
+        check_name(name)
+    return serialiser.tag + serialiser.serialise(message)
+
+def unserialise(message_bytes):
+    """Unserialise bytes produced by :func:`serialise`
+
+    :param message_bytes: a bytes-like object
+    :returns: a 2-tuple of (message, name of the serialiser used)
+    """
+    serialiser = _serialisers_by_tag.get(bytes(message_bytes[:1]))
+    if serialiser is None:
+        return json.loads(bytes(message_bytes).decode(config.ENCODING)), _JSON
+
+    if serialiser.name not in config.ACCEPTED_SERIALISERS:
+        raise core.NetworkZeroError("Refusing a message serialised with %s; add it to config.ACCEPTED_SERIALISERS to accept it" % serialiser.name)
+    return serialiser.unserialise(message_bytes[1:]), serialiser.name
+
+#
+# Built-in serialisers
+#
+PICKLE_PROTOCOL = min(5, pickle.HIGHEST_PROTOCOL)
+
+def _pickle_dumps(message):
+    return pickle.dumps(message, protocol=PICKLE_PROTOCOL)
+
+register("pickle", 0x01, _pickle_dumps, pickle.loads, accept=False)
+
+if msgpack is not None:
+    def _msgpack_dumps(message):
+        return msgpack.packb(message, use_bin_type=True)
+
+    def _msgpack_loads(message_bytes):
+        return msgpack.unpackb(message_bytes, raw=False)
+
+    register("msgpack", 0x02, _msgpack_dumps, _msgpack_loads)
@@ -1,52 +1,620 @@
 # -*- coding: utf-8 -*-
-import json
+import atexit
+import collections
+import contextlib
+import math
+import mmap
+import os
+import signal
+import socket as _socket
+import stat
+import struct
+import tempfile
 import threading
 import time
+import uuid
 try:
     string = unicode
 except NameError:
     string = str
 
 import zmq
+import zmq.utils.monitor
 
 from . import config
 from . import core
+from . import compressors
+from . import serialisers
+from . import metrics
 
 _logger = core.get_logger(__name__)
 
-def _serialise(message):
-    return json.dumps(message).encode(config.ENCODING)
+def _serialise(message, serialiser=None):
+    return compressors.compress(serialisers.serialise(message, serialiser))
 
 def _unserialise(message_bytes):
-    return json.loads(message_bytes.decode(config.ENCODING))
+    message, _ = serialisers.unserialise(compressors.decompress(message_bytes))
+    return message
 
-def _serialise_for_pubsub(topic, data):
+#
+# Binary data -- bytes, bytearrays, memoryviews and anything else which
+# supports the buffer protocol -- is never serialised. A binary message
+# is sent as a one-byte marker frame followed by the data itself, which
+# lets pyzmq hand the buffer to ZeroMQ without copying it.
+#
+# On Python 2 a plain str is bytes as well as text; it's treated as text
+# so that "hello" arrives as "hello" whichever Python the peer is running.
+# Binary data can be sent from Python 2 as a bytearray or memoryview.
+#
+BINARY_MARKER = b"\x00"
+_non_binary_types = (string, str, int, float, list, tuple, dict, type(None))
+
+def _supports_buffer(data):
+    try:
+        memoryview(data)
+    except TypeError:
+        return False
+    else:
+        return True
+
+def _is_binary(data):
+    if isinstance(data, _non_binary_types):
+        return False
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return True
+    return _supports_buffer(data)
+
+def _frame_bytes(frame):
+    return frame.bytes if isinstance(frame, zmq.Frame) else frame
+
+def _frame_data(frame):
+    return frame.buffer if isinstance(frame, zmq.Frame) else frame
+
+def _serialise_to_frames(message, serialiser=None):
+    if _is_binary(message):
+        return [BINARY_MARKER, message]
+    else:
+        return [_serialise(message, serialiser)]
+
+def _unserialise_from_frames(frames):
+    """Return the message carried by a list of frames (bytes or zmq.Frame)
+    together with the name of the serialiser used, or None if the
+    message was binary.
+    """
+    if len(frames) == 2 and _frame_bytes(frames[0]) == BINARY_MARKER:
+        return _frame_data(frames[1]), None
+    else:
+        return serialisers.unserialise(compressors.decompress(_frame_data(frames[0])))
+
+def _split_envelope(frames):
+    """Split the frames received by a ROUTER socket into the routing
+    envelope -- up to and including the empty delimiter frame -- and
+    the frames which make up the message itself.
+    """
+    for n, frame in enumerate(frames):
+        if not len(frame):
+            return frames[:n + 1], frames[n + 1:]
+    raise core.NetworkZeroError("No routing envelope found in message")
+
+#
+# Pipelined messages are sent with a sequence number ahead of the empty
+# delimiter frame. Listeners treat it as part of the routing envelope and
+# send it back with the reply, which lets replies be matched to messages.
+#
+_sequence = struct.Struct("!Q")
+
+#
+# Files & other streams of bytes are sent in chunks from a DEALER to a
+# ROUTER, every frame carrying an id for the stream so that anything
+# left over from an abandoned stream can be ignored. The receiver grants
+# credit for config.STREAM_WINDOW chunks when the stream starts and for
+# another chunk each time one is taken, and the sender only sends while
+# it has credit. So however large the stream, no more than a window of
+# chunks is ever queued between the two. A receiver which stops taking
+# the stream before its end cancels it, so that the sender doesn't go on
+# waiting for credit which will never come.
+#
+_STREAM_START = b"start"
+_STREAM_DATA = b"data"
+_STREAM_END = b"end"
+_STREAM_CREDIT = b"credit"
+_STREAM_DONE = b"done"
+_STREAM_CANCEL = b"cancel"
+_credit = struct.Struct("!I")
+#
+# How many frames follow the stream id & kind of each kind of frame
+#
+_stream_n_frames = {
+    _STREAM_START : 0,
+    _STREAM_DATA : 1,
+    _STREAM_END : 0,
+    _STREAM_CREDIT : 1,
+    _STREAM_DONE : 0,
+    _STREAM_CANCEL : 0,
+}
+
+def _split_stream_frames(frames):
+    """Split the frames of a stream into the routing envelope, the id of
+    the stream, the kind of frame and whatever follows, or return None
+    if they're malformed (eg sent by something other than networkzero)
+    """
+    try:
+        envelope, frames = _split_envelope(frames)
+    except core.NetworkZeroError:
+        return None
+    if len(frames) < 2:
+        return None
+    stream_id, kind, rest = _frame_bytes(frames[0]), _frame_bytes(frames[1]), frames[2:]
+    if _stream_n_frames.get(kind) != len(rest):
+        return None
+    if kind == _STREAM_CREDIT and len(_frame_bytes(rest[0])) != _credit.size:
+        return None
+    return envelope, stream_id, kind, rest
+
+#
+# A file being received is written alongside the file it will become
+# and renamed only once it's complete, so that a transfer which fails
+# part way through never leaves a truncated file behind. (os.replace,
+# which can rename over an existing file on Windows, arrived with 3.3).
+#
+_replace = getattr(os, "replace", os.rename)
+
+#
+# A message can be sent with a request id, in two frames ahead of the
+# message itself, so that a listener can recognise the same message sent
+# again -- eg by a speaker which gave up waiting for its reply -- and
+# answer it from a cache of its replies rather than handling it again.
+# (No serialised message starts with a zero byte).
+#
+REQUEST_ID_MARKER = b"\x00id"
+
+def _request_id_frames(request_id):
+    if isinstance(request_id, string):
+        request_id = request_id.encode(config.ENCODING)
+    return [REQUEST_ID_MARKER, bytes(request_id)]
+
+def _split_request_id(frames):
+    """Split the frames of a message into its request id, or None if it
+    has none, and the frames which make up the message itself
+    """
+    if len(frames) > 2 and _frame_bytes(frames[0]) == REQUEST_ID_MARKER:
+        return _frame_bytes(frames[1]), frames[2:]
+    else:
+        return None, frames
+
+class _ReplyCache(object):
+    """The latest replies sent from one address to messages which came
+    with a request id, together with the senders of any message sent
+    again while the first is still being handled
+
+    No more than `size` of each are kept. A message which is never replied
+    to (eg because its handler failed) is forgotten once `size` messages
+    have been received since, so that it isn't kept forever.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._replies = collections.OrderedDict()
+        self._pending = collections.OrderedDict()
+
+    def start(self, request_id, envelope=None):
+        """Start handling a message with a request id
+
+        Return a 2-tuple of the reply already sent to the same request id,
+        if any, and whether the message should be handled. If a message
+        with the same id is still being handled, keep this one's envelope
+        (if it has one; a listening socket's messages don't) so that it's
+        sent the same reply.
+        """
+        if not self.size:
+            return None, True
+        with self._lock:
+            reply_frames = self._replies.pop(request_id, None)
+            if reply_frames is not None:
+                #
+                # Put back as the latest reply (OrderedDict.move_to_end
+                # only arrived with Python 3.2)
+                #
+                self._replies[request_id] = reply_frames
+                return reply_frames, False
+            if request_id in self._pending and envelope is not None:
+                self._pending[request_id].append(envelope)
+                return None, False
+            self._pending[request_id] = []
+            while len(self._pending) > self.size:
+                self._pending.popitem(last=False)
+            return None, True
+
+    def finish(self, request_id, reply_frames):
+        """Keep the reply to a request id, forgetting the oldest reply if
+        there are too many, and return the envelopes of any senders of
+        the same message which are waiting for it
+        """
+        if not self.size:
+            return []
+        #
+        # A binary reply is sent without copying it, but the reply kept
+        # mustn't change if the buffer is reused
+        #
+        reply_frames = [f if isinstance(f, bytes) else bytes(memoryview(f)) for f in reply_frames]
+        with self._lock:
+            self._replies.pop(request_id, None)
+            self._replies[request_id] = reply_frames
+            while len(self._replies) > self.size:
+                self._replies.popitem(last=False)
+            return self._pending.pop(request_id, [])
+
+    def forget(self, request_id):
+        """Forget a message which is no longer being handled (eg because
+        it couldn't be unserialised) without keeping a reply to it, and
+        return the envelopes of any senders of the same message
+        """
+        if not self.size:
+            return []
+        with self._lock:
+            return self._pending.pop(request_id, [])
+
+class ReplyHandle(object):
+    """Identifies the sender of a message received by a concurrent listener
+
+    Pass this to send_reply_to in place of the address to reply to that
+    sender. Replies can be sent in any order but must be sent from the
+    thread which received the message.
+    """
+
+    def __init__(self, address, envelope, serialiser, request_id=None):
+        self.address = address
+        self.envelope = envelope
+        self.serialiser = serialiser
+        self.request_id = request_id
+
+    def __repr__(self):
+        return "<%s for %s>" % (self.__class__.__name__, self.address)
+
+def _serialise_for_pubsub(topic, data, serialiser=None):
     topic_bytes = topic.encode(config.ENCODING)
-    if isinstance(data, bytes):
+    if _is_binary(data):
         data_bytes = data
     else:
-        data_bytes = _serialise(data)
+        data_bytes = _serialise(data, serialiser)
     return [topic_bytes, data_bytes]
 
 def _unserialise_for_pubsub(message_bytes, is_raw=False):
     topic_bytes, data_bytes = message_bytes
-    topic = topic_bytes.decode(config.ENCODING)
+    topic = _frame_bytes(topic_bytes).decode(config.ENCODING)
     if is_raw:
-        data = data_bytes
+        data = _frame_data(data_bytes)
     else:
-        data = _unserialise(data_bytes)
+        data = _unserialise(_frame_data(data_bytes))
     return topic, data 
 
+_clock = getattr(time, "monotonic", time.time)
+#
+# The most news a subscriber will take from its queue at one time
+#
+DRAIN_LIMIT = 1000
+
+def _conflate(news, prefixes):
+    """Keep only the latest item of news for each topic which starts
+    with one of `prefixes`, leaving other news as it is
+    """
+    latest = {}
+    for n, frames in enumerate(news):
+        topic = _frame_bytes(frames[0])
+        if any(topic.startswith(prefix) for prefix in prefixes):
+            latest[topic] = n
+    conflated = set(latest.values())
+    return [
+        frames for n, frames in enumerate(news)
+            if n in conflated or _frame_bytes(frames[0]) not in latest
+    ]
+HANDSHAKE_EVENT = getattr(zmq, "EVENT_HANDSHAKE_SUCCEEDED", zmq.EVENT_CONNECTED)
+
+def _socket_options():
+    """Return the ZeroMQ options chosen by config.SOCKET_PROFILE together
+    with any in config.SOCKET_OPTIONS
+    """
+    if config.SOCKET_PROFILE is None:
+        options = {}
+    elif config.SOCKET_PROFILE in config.SOCKET_PROFILES:
+        options = dict(config.SOCKET_PROFILES[config.SOCKET_PROFILE])
+    else:
+        raise core.NetworkZeroError("No socket profile is named %r; try one of %s" % (config.SOCKET_PROFILE, ", ".join(sorted(config.SOCKET_PROFILES))))
+    options.update(config.SOCKET_OPTIONS)
+    return options
+
+def _tune(socket):
+    """Set the configured ZeroMQ options on a socket which hasn't yet
+    been bound or connected
+    """
+    for name, value in _socket_options().items():
+        if name == "IO_THREADS":
+            continue
+        option = getattr(zmq, name, None)
+        if option is None:
+            raise core.NetworkZeroError("%s is not a ZeroMQ socket option" % name)
+        socket.set(option, value)
+
+#
+# A peer on this machine can be reached through a Unix domain socket
+# (ipc://) more cheaply than through the loopback TCP stack. So a socket
+# which binds to an address listens on an ipc:// endpoint named after it
+# as well, and a socket connecting to an address on this machine uses
+# that endpoint if something is listening there. Addresses are still
+# advertised & passed around as ip:port.
+#
+# The endpoints' names are predictable, so they're kept in a directory
+# which only this user can use and a connecting socket only uses one
+# which belongs to this user. Otherwise another user on the machine
+# could listen on an address's endpoint first and be sent its messages.
+#
+def _ipc_directory():
+    """Return the directory for ipc:// endpoints: config.IPC_DIRECTORY
+    if it's set, otherwise one for this user alone in the temporary
+    directory, or None if that's been made usable by anyone else
+    """
+    if config.IPC_DIRECTORY:
+        return config.IPC_DIRECTORY
+    directory = os.path.join(tempfile.gettempdir(), "nw0-%d" % os.getuid())
+    try:
+        os.mkdir(directory, 0o700)
+    except OSError:
+        pass
+    try:
+        info = os.lstat(directory)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        _logger.warn("Not using ipc:// because %s is not private to this user", directory)
+        return None
+    return directory
+
+def _ipc_path(address):
+    """Return the path of an address's ipc:// endpoint, or None if there's
+    nowhere safe for it
+    """
+    directory = _ipc_directory()
+    if directory is None:
+        return None
+    return os.path.join(directory, "nw0-%s.ipc" % address.replace(":", "-"))
+
+def _has_ipc():
+    #
+    # Some libzmq builds for Windows support ipc:// but Python there has
+    # no Unix domain sockets to check whether anything's listening, nor
+    # users' ids to check who owns an endpoint
+    #
+    return hasattr(_socket, "AF_UNIX") and hasattr(os, "getuid") and zmq.has("ipc")
+
+def _uses_ipc():
+    return config.USE_IPC and _has_ipc()
+
+def _is_owned(path):
+    """Whether a file belongs to this user
+    """
+    try:
+        return os.lstat(path).st_uid == os.getuid()
+    except OSError:
+        return False
+
+def _is_listening(path):
+    """Whether anything is listening on a Unix domain socket. (A file
+    left behind by a process which has died is not).
+    """
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (IOError, OSError):
+        return False
+    else:
+        return True
+    finally:
+        sock.close()
+
+def _bind(socket, address):
+    """Bind a socket to an ip:port address and to its ipc:// endpoint
+    """
+    socket.bind("tcp://%s" % address)
+    _bound(socket)
+    path = _ipc_path(address) if _uses_ipc() else None
+    if path is not None:
+        try:
+            _bind_ipc(socket, path)
+        except zmq.ZMQError as exc:
+            _logger.warn("Unable to listen for %s over ipc://: %s", address, exc)
+
+def _bind_ipc(socket, path):
+    """Bind a socket to an ipc:// endpoint and return the endpoint
+    """
+    endpoint = "ipc://%s" % path
+    socket.bind(endpoint)
+    _bound(socket)
+    #
+    # ZeroMQ leaves the file behind when the socket is closed
+    # (or if it's never closed before the process exits)
+    #
+    socket.__dict__.setdefault('_ipc_paths', []).append(path)
+    _ipc_paths.add(path)
+    return endpoint
+
+#
+# ZeroMQ closes a socket's endpoints in the background, so an address
+# may still be in use for a moment after the socket bound to it has been
+# closed. Before an address is given up, its socket is unbound from every
+# endpoint and then waits (up to UNBIND_TIMEOUT_S) for each to be closed,
+# so that the address can be bound again as soon as it's been released.
+#
+UNBIND_TIMEOUT_S = 1.0
+
+def _bound(socket):
+    """Record the endpoint a socket has just bound to
+    """
+    endpoint = socket.get(zmq.LAST_ENDPOINT).decode(config.ENCODING)
+    socket.__dict__.setdefault('_endpoints', []).append(endpoint)
+
+def _unbind(socket):
+    """Unbind a socket from every endpoint it's been bound to, waiting
+    until ZeroMQ has actually closed them
+    """
+    endpoints = socket.__dict__.pop('_endpoints', None)
+    if not endpoints or socket.closed:
+        return
+    monitor_address = "inproc://nw0-unbind-%s" % uuid.uuid4().hex
+    socket.monitor(monitor_address, zmq.EVENT_CLOSED)
+    #
+    # A plain socket so that the wait blocks even if the socket being
+    # unbound is an asyncio one
+    #
+    monitor = zmq.Socket(socket.context, zmq.PAIR)
+    try:
+        monitor.connect(monitor_address)
+        for endpoint in endpoints:
+            socket.unbind(endpoint)
+        n_open = len(endpoints)
+        deadline = _clock() + UNBIND_TIMEOUT_S
+        while n_open > 0:
+            timeout_ms = int(math.ceil(1000 * (deadline - _clock())))
+            if timeout_ms <= 0 or not monitor.poll(timeout_ms):
+                _logger.warn("Gave up waiting for %d endpoint(s) of %r to close", n_open, socket)
+                break
+            event = zmq.utils.monitor.recv_monitor_message(monitor)
+            if event['event'] == zmq.EVENT_CLOSED:
+                n_open -= 1
+    finally:
+        socket.disable_monitor()
+        monitor.close(linger=0)
+
+_ipc_paths = set()
+
+def _remove_ipc_files(paths):
+    for path in paths:
+        _ipc_paths.discard(path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+atexit.register(lambda: _remove_ipc_files(list(_ipc_paths)))
+
+def _endpoint(address):
+    """Return the endpoint to connect to for an ip:port address: its
+    ipc:// endpoint if it's on this machine, belongs to this user & is
+    listening, otherwise tcp://
+    """
+    if _uses_ipc():
+        ip, _ = core.split_address(address)
+        if ip in core._find_ip4_addresses():
+            path = _ipc_path(address)
+            if path is not None and _is_owned(path) and _is_listening(path):
+                return "ipc://%s" % path
+    return "tcp://%s" % address
+
+#
+# The blocking & asyncio sockets share one underlying context, whose
+# number of I/O threads can only be changed before its first socket
+#
+_context_configured = False
+
+def _configure_context(context):
+    global _context_configured
+    if not _context_configured:
+        _context_configured = True
+        io_threads = _socket_options().get("IO_THREADS")
+        if io_threads:
+            context.set(zmq.IO_THREADS, io_threads)
+
+class _Waker(object):
+    """Wake any blocking poll in the main thread when a signal arrives
+
+    Python only runs a signal handler -- eg the one which raises
+    KeyboardInterrupt for Ctrl-C -- once control is back in the interpreter,
+    and on some platforms a blocking ZeroMQ poll is never interrupted. By
+    handing one end of a socket pair to signal.set_wakeup_fd and including
+    the other end in every poll made by the main thread, any signal will
+    cause the poll to return at once.
+
+    If something else (eg an asyncio event loop) has already claimed the
+    wakeup fd, it is left alone and the waker is not used.
+    """
+
+    def __init__(self):
+        self._is_installed = False
+        self._is_tried = False
+        self.reader = self.writer = None
+
+    def install(self):
+        """Install the waker if possible. This must be called from the main thread.
+
+        :returns: the socket to poll on or None if the waker is not available
+        """
+        if not self._is_tried:
+            self._is_tried = True
+            try:
+                self.reader, self.writer = _socket.socketpair()
+                self.reader.setblocking(False)
+                self.writer.setblocking(False)
+                previous_fd = signal.set_wakeup_fd(self.writer.fileno())
+            except (AttributeError, ValueError, OSError, _socket.error) as exc:
+                _logger.debug("Unable to install a signal wakeup fd: %s", exc)
+            else:
+                if previous_fd == -1:
+                    self._is_installed = True
+                else:
+                    signal.set_wakeup_fd(previous_fd)
+                    _logger.debug("Signal wakeup fd already in use; not installing")
+        return self.reader if self._is_installed else None
+
+    def drain(self):
+        try:
+            while self.reader.recv(1024):
+                pass
+        except (OSError, _socket.error):
+            pass
+
+_waker = _Waker()
+
 class Socket(zmq.Socket):
 
-    binding_roles = {"listener", "publisher"}
+    binding_roles = {"listener", "concurrent_listener", "publisher", "stream_receiver"}
+    #
+    # XPUB sockets, which are told about their subscribers' subscriptions
+    #
+    publishing_roles = {"publisher", "forwarded_publisher"}
+    #
+    # Sockets which hold nothing between uses, so that one closed while
+    # idle can be opened again without anything being lost
+    #
+    evictable_roles = {"speaker"}
+    waits_for_connections = True
     
     def __init__(self, *args, **kwargs):
-        zmq.Socket.__init__(self, *args, **kwargs)
+        super(Socket, self).__init__(*args, **kwargs)
         #
         # Keep track of which thread this socket was created in
         #
         self.__dict__['_thread'] = threading.current_thread()
+        #
+        # News which a subscriber has taken from its queue but not yet
+        # returned, and the topics for which only the latest news is kept
+        #
+        self.__dict__['_pending_news'] = collections.deque()
+        self.__dict__['_conflated_prefixes'] = set()
+        #
+        # Streams which a receiver has been asked to start while it
+        # was busy with another
+        #
+        self.__dict__['_pending_streams'] = collections.deque()
+
+    def close(self, linger=None):
+        super(Socket, self).close(linger)
+        paths = self.__dict__.pop('_ipc_paths', None)
+        #
+        # A socket can be closed by pyzmq's __del__ as the interpreter
+        # shuts down, after every ipc file has been removed at exit and
+        # perhaps after this module's globals have gone
+        #
+        if paths and _ipc_paths:
+            _remove_ipc_files(paths)
 
     def __repr__(self):
         return "<%s socket %x on %s>" % (self.role, id(self), getattr(self, "address", "<No address>"))
@@ -59,40 +627,261 @@ class Socket(zmq.Socket):
             if isinstance(address, (list, tuple)):
                 raise core.NetworkZeroError("A listening socket can be bound to only one address, not: %r" % address)
             else:
-                self.bind("tcp://%s" % address)
+                _bind(self, address)
         else:
             if isinstance(address, (list, tuple)):
                 addresses = address
             else:
                 addresses = [address]
+            is_waiting = self.role == "subscriber" and self.waits_for_connections
+            if is_waiting:
+                monitor = self.get_monitor_socket(HANDSHAKE_EVENT)
             for a in addresses:
                 _logger.debug("About to connect to %s", a)
-                self.connect("tcp://%s" % a)
+                if self.role == "cached_publisher":
+                    self.connect(_NewsCache.feed_address(a))
+                else:
+                    self.connect(_endpoint(a))
+            if is_waiting:
+                self._wait_for_connections(monitor, len(addresses))
  
         self.__dict__['_address'] = address
-        #
-        # ZeroMQ has a well-documented feature whereby the
-        # newly-added subscriber will always miss the first
-        # few posts by a publisher. Just to avoid the surprise,
-        # we hackily avoid this here by having each socket
-        # wait a short while once it's bound/connected.
-        #
-        if self.role in ("publisher", "subscriber"):
-            time.sleep(0.5)
+        self.__dict__['_joined_at'] = _clock()
     address = property(_get_address, _set_address)
-    
+
+    #
+    # ZeroMQ has a well-documented feature whereby a newly-added
+    # subscriber will always miss the first few posts by a publisher
+    # because its subscription hasn't yet reached the publisher. Rather
+    # than have every socket wait a while after it's bound or connected,
+    # a subscriber waits until its connections are actually made, and a
+    # publisher (which is an XPUB socket so it's told about subscriptions)
+    # waits before its first post until a subscription has arrived. Each
+    # wait gives up after config.SLOW_JOINER_TIMEOUT_S.
+    #
+    def _wait_for_connections(self, monitor, n_connections):
+        deadline = _clock() + config.SLOW_JOINER_TIMEOUT_S
+        try:
+            while n_connections > 0:
+                timeout_ms = int(math.ceil(1000 * (deadline - _clock())))
+                if timeout_ms <= 0 or not monitor.poll(timeout_ms):
+                    _logger.debug("Gave up waiting for %d connection(s)", n_connections)
+                    break
+                event = zmq.utils.monitor.recv_monitor_message(monitor)
+                if event['event'] == HANDSHAKE_EVENT:
+                    n_connections -= 1
+        finally:
+            self.disable_monitor()
+            monitor.close(linger=0)
+
+    def _collect_subscriptions(self):
+        """Read any (un)subscriptions which have reached this publisher
+        """
+        subscriptions = self.__dict__.setdefault('_subscriptions', set())
+        while self.get(zmq.EVENTS) & zmq.POLLIN:
+            message = zmq.Socket.recv(self, zmq.NOBLOCK)
+            if message[:1] == b"\x01":
+                subscriptions.add(message[1:])
+            elif message[:1] == b"\x00":
+                subscriptions.discard(message[1:])
+        return subscriptions
+
+    def _subscribers_pending_ms(self):
+        """How long to wait for a first subscriber, in milliseconds, or
+        None if it's no longer worth waiting.
+        """
+        if self.__dict__.get('_is_ready'):
+            return None
+        timeout_ms = int(math.ceil(1000 * (self._joined_at + config.SLOW_JOINER_TIMEOUT_S - _clock())))
+        if self._collect_subscriptions() or timeout_ms <= 0:
+            self.__dict__['_is_ready'] = True
+            return None
+        return timeout_ms
+
+    def _wait_for_subscribers(self):
+        timeout_ms = self._subscribers_pending_ms()
+        while timeout_ms is not None:
+            zmq.Socket.poll(self, timeout_ms)
+            timeout_ms = self._subscribers_pending_ms()
+        self._collect_subscriptions()
+
+    #
+    # A subscriber keeps track of the prefixes it's subscribed to so that
+    # each is subscribed to only once, however often news is waited for,
+    # and any which are no longer wanted are unsubscribed from.
+    #
+    def _subscribe_to(self, prefixes):
+        """Subscribe to exactly these prefixes, unsubscribing from any others
+        """
+        wanted = set(p.encode(config.ENCODING) for p in prefixes)
+        subscribed = self.__dict__.get('_prefixes', set())
+        for prefix in wanted - subscribed:
+            self.set(zmq.SUBSCRIBE, prefix)
+        for prefix in subscribed - wanted:
+            self.set(zmq.UNSUBSCRIBE, prefix)
+        self.__dict__['_prefixes'] = wanted
+
+    def _is_subscribed_to(self, topic_frame):
+        """Whether news with this topic is still wanted. (News for a prefix
+        which has just been unsubscribed from may already have arrived).
+        """
+        topic = _frame_bytes(topic_frame)
+        return any(topic.startswith(prefix) for prefix in self._prefixes)
+
+    def _recv_multipart_now(self, copy=True):
+        parts = [zmq.Socket.recv(self, zmq.NOBLOCK, copy=copy)]
+        while self.get(zmq.RCVMORE):
+            parts.append(zmq.Socket.recv(self, zmq.NOBLOCK, copy=copy))
+        return parts
+
+    def _take_news(self, frames, limit, copy=True):
+        """Queue one item of news (if one has been received) together with
+        whatever else has already arrived, up to `limit` items, keeping
+        only the latest news for any conflated topic -- including news
+        which was queued before
+        """
+        news = [] if frames is None else [frames]
+        while len(news) < limit and self.get(zmq.EVENTS) & zmq.POLLIN:
+            news.append(self._recv_multipart_now(copy))
+        if self._conflated_prefixes:
+            news = _conflate(list(self._pending_news) + news, self._conflated_prefixes)
+            self._pending_news.clear()
+        self._pending_news.extend(news)
+
+    def _next_news(self, copy=True):
+        """Return the next queued item of news which is still wanted or
+        None if there is none
+
+        If any topics are conflated, whatever has arrived is taken first
+        so that older news queued for a topic isn't returned when newer
+        news for it is already waiting
+        """
+        if self._conflated_prefixes:
+            self._take_news(None, DRAIN_LIMIT, copy)
+        while self._pending_news:
+            frames = self._pending_news.popleft()
+            if self._is_subscribed_to(frames[0]):
+                return frames
+        return None
+
+    @contextlib.contextmanager
+    def _refusing_to_drop(self):
+        """Have a publisher refuse news (raising zmq.Again when sending
+        without blocking) rather than silently dropping it when any
+        subscriber's queue is full
+        """
+        is_publisher = self.role in self.publishing_roles
+        if is_publisher:
+            self.set(zmq.XPUB_NODROP, 1)
+        try:
+            yield self
+        finally:
+            if is_publisher:
+                self.set(zmq.XPUB_NODROP, 0)
+
     def _get_role(self):
         return self._role
     def _set_role(self, role):
         self.__dict__['_role'] = role
     role = property(_get_role, _set_role)
 
+    @contextlib.contextmanager
+    def in_use(self):
+        """Keep the socket from being evicted from the cache while a
+        conversation on it is suspended (eg in a generator or coroutine)
+        """
+        self.__dict__['_n_users'] = self.__dict__.get('_n_users', 0) + 1
+        try:
+            yield self
+        finally:
+            self.__dict__['_n_users'] -= 1
+
 class Context(zmq.Context):
     
     _socket_class = Socket
 
+    def socket(self, *args, **kwargs):
+        _configure_context(self)
+        return super(Context, self).socket(*args, **kwargs)
+
 context = Context()
 
+class _NewsCache(threading.Thread):
+    """Publish news from an address, keeping the latest news for each
+    topic to send to each new subscriber as soon as it subscribes
+
+    The cache binds the address with an XPUB socket in verbose mode so
+    that it hears about every subscription, even to a prefix which
+    another subscriber has already subscribed to. Each thread sending
+    news pushes it to the cache over inproc:// (see send_news_to).
+    Subscribers which have already subscribed to a prefix will receive
+    its latest news again when another subscriber subscribes to it. Only
+    the config.NEWS_CACHE_SIZE most recently published topics are kept.
+    """
+
+    def __init__(self, address, hwm=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.address = address
+        self.latest = collections.OrderedDict()
+        self.publisher = context.socket(zmq.XPUB)
+        self.publisher.set(zmq.XPUB_VERBOSE, 1)
+        _tune(self.publisher)
+        if hwm is not None:
+            self.publisher.set(zmq.SNDHWM, hwm)
+        self.feed = context.socket(zmq.PULL)
+        try:
+            _bind(self.publisher, address)
+            self.feed.bind(self.feed_address(address))
+        except:
+            self._close()
+            raise
+
+    def __repr__(self):
+        return "<%s on %s>" % (self.__class__.__name__, self.address)
+
+    @staticmethod
+    def feed_address(address):
+        return "inproc://nw0-news-cache-%s" % address
+
+    def _close(self):
+        self.publisher.close(linger=0)
+        self.feed.close(linger=0)
+
+    def _keep(self, frames):
+        """Keep the latest news for a topic, forgetting the topic with the
+        oldest news if there are too many
+        """
+        self.latest.pop(frames[0], None)
+        self.latest[frames[0]] = frames
+        while len(self.latest) > config.NEWS_CACHE_SIZE:
+            self.latest.popitem(last=False)
+
+    def run(self):
+        _logger.info("Starting %r", self)
+        poller = zmq.Poller()
+        poller.register(self.feed, zmq.POLLIN)
+        poller.register(self.publisher, zmq.POLLIN)
+        try:
+            while True:
+                events = dict(poller.poll())
+                if self.feed in events:
+                    frames = self.feed.recv_multipart()
+                    self._keep(frames)
+                    self.publisher.send_multipart(frames)
+                if self.publisher in events:
+                    subscription = self.publisher.recv()
+                    if subscription[:1] == b"\x01":
+                        prefix = subscription[1:]
+                        for topic, frames in list(self.latest.items()):
+                            if topic.startswith(prefix):
+                                self.publisher.send_multipart(frames)
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            self._close()
+        _logger.info("Ending %r", self)
+
 #
 # Global mapping from address to socket. When a socket
 # is needed, its address (ip:port) is looked up here. If
@@ -102,34 +891,291 @@ context = Context()
 #
 class Sockets:
 
-    try_length_ms = 500 # wait for .5 second at a time
     roles = {
         "listener" : zmq.REP,
+        "concurrent_listener" : zmq.ROUTER,
         "speaker" : zmq.REQ,
-        "publisher" : zmq.PUB,
-        "subscriber" : zmq.SUB
+        "pipelined_speaker" : zmq.DEALER,
+        "publisher" : zmq.XPUB,
+        "cached_publisher" : zmq.PUSH,
+        "forwarded_publisher" : zmq.XPUB,
+        "subscriber" : zmq.SUB,
+        "stream_sender" : zmq.DEALER,
+        "stream_receiver" : zmq.ROUTER
     }
     
-    def __init__(self):
+    def __init__(self, zmq_context=None):
+        self.context = zmq_context or context
         self._tls = threading.local()
         self._lock = threading.Lock()
         with self._lock:
             self._sockets = set()
+        #
+        # Each thread's cache of sockets, kept here as well so that the
+        # sockets of a thread which has finished can be closed
+        #
+        self._thread_sockets = {}
+        #
+        # Addresses whose sockets, left by threads which have finished,
+        # are being closed in the background, each with an event which is
+        # set once the address has been released
+        #
+        self._reaping = {}
+        self.counters = collections.Counter()
+        #
+        # Serialiser to use by default when sending to an address
+        # if none is specified when the message is sent
+        #
+        self._serialisers = {}
+        #
+        # High-water mark, conflation & caching to use for news sent
+        # from or received from an address, and the news caches running
+        #
+        self._news_policies = {}
+        self._news_caches = {}
+        #
+        # Addresses which are the publishers' side of a forwarder, to
+        # which news is sent by connecting rather than binding
+        #
+        self._forwarders = set()
+        #
+        # Replies sent from each listening address to messages which
+        # came with a request id (see _ReplyCache)
+        #
+        self._reply_caches = {}
+
+    def set_serialiser(self, address, serialiser):
+        """Use a particular serialiser by default when sending to `address`
+        """
+        if serialiser is not None:
+            serialisers.check_name(serialiser)
+        self._serialisers[core.address(address)] = serialiser
+
+    def set_news_policy(self, address, hwm=None, conflate=False, cache=False):
+        """Use a high-water mark, conflation and caching for news sent
+        from or received from `address`
+        """
+        if hwm is not None and hwm < 0:
+            raise core.NetworkZeroError("A high-water mark cannot be negative, not %r" % hwm)
+        if conflate is True:
+            prefixes = {b""}
+        elif isinstance(conflate, str):
+            prefixes = {conflate.encode(config.ENCODING)}
+        else:
+            prefixes = set(p.encode(config.ENCODING) for p in conflate or [])
+        self._news_policies[core.address(address)] = hwm, prefixes, cache
+
+    def _apply_news_policy(self, socket, caddress):
+        """Set the high-water mark & conflated topics for a publisher or
+        subscriber before it binds or connects (after which a new
+        high-water mark would have no effect)
+        """
+        if isinstance(caddress, tuple):
+            caddresses = caddress
+        else:
+            caddresses = [caddress]
+        policies = [self._news_policies[a] for a in caddresses if a in self._news_policies]
+        hwms = [hwm for hwm, _, _ in policies if hwm is not None]
+        if hwms:
+            if socket.role in Socket.publishing_roles:
+                socket.set(zmq.SNDHWM, min(hwms))
+            else:
+                socket.set(zmq.RCVHWM, min(hwms))
+        for _, prefixes, _ in policies:
+            socket._conflated_prefixes.update(prefixes)
+
+    def set_forwarder(self, address):
+        """Send news for an address by connecting to it as the publishers'
+        side of a forwarder (see the forwarders module)
+        """
+        self._forwarders.add(core.address(address))
+
+    def _publisher_role(self, address):
+        """A publisher whose news is cached sends it through the cache
+        and one whose news is forwarded connects to the forwarder
+        """
+        caddress = core.address(address)
+        if caddress in self._forwarders:
+            return "forwarded_publisher"
+        hwm, prefixes, cache = self._news_policies.get(caddress, (None, None, False))
+        return "cached_publisher" if cache else "publisher"
+
+    def _start_news_cache(self, caddress):
+        """Start the news cache for an address unless it's already running
+        """
+        with self._lock:
+            if caddress in self._news_caches:
+                return
+            if caddress in self._sockets:
+                raise core.SocketAlreadyExistsError("You cannot create a listening socket in more than one thread")
+            hwm, _, _ = self._news_policies[caddress]
+            news_cache = _NewsCache(caddress, hwm)
+            self._sockets.add(caddress)
+            self._news_caches[caddress] = news_cache
+        news_cache.start()
     
-    def get_socket(self, address, role):
-        """Create or retrieve a socket of the right type, already connected
-        to the address. Address (ip:port) must be fully specified at this
-        point. core.address can be used to generate an address.
+    def _reply_cache(self, caddress):
+        reply_cache = self._reply_caches.get(caddress)
+        if reply_cache is None:
+            with self._lock:
+                reply_cache = self._reply_caches.setdefault(caddress, _ReplyCache(config.REPLY_CACHE_SIZE))
+        return reply_cache
+
+    def claim_address(self, caddress):
+        """Record that a canonical address is about to be bound in this
+        process, raising SocketAlreadyExistsError if it already has been.
+        """
+        #
+        # An address whose socket is being reaped will be released shortly
+        #
+        with self._lock:
+            reaping = self._reaping.get(caddress)
+        if reaping is not None:
+            reaping.wait()
+        with self._lock:
+            if caddress in self._sockets:
+                raise core.SocketAlreadyExistsError("You cannot create a listening socket in more than one thread")
+            else:
+                self._sockets.add(caddress)
+
+    def release_address(self, caddress):
+        """Record that a canonical address is no longer bound in this process
+        """
+        with self._lock:
+            self._sockets.discard(caddress)
+
+    def _local_sockets(self):
+        """Return the cache of sockets which can be used by this thread
         """
         #
         # If this thread doesn't yet have a sockets cache
         # in its local storage, create one here.
         #
         try:
-            self._tls.sockets
+            return self._tls.sockets
         except AttributeError:
-            self._tls.sockets = {}
-        
+            self._tls.sockets = collections.OrderedDict()
+            with self._lock:
+                self._thread_sockets[threading.current_thread()] = self._tls.sockets
+            return self._tls.sockets
+
+    def cache_info(self):
+        """Return the number of sockets cached & bound and how many have
+        been closed by each of the cache's policies
+        """
+        with self._lock:
+            n_cached = sum(len(cache) for cache in self._thread_sockets.values())
+            n_bound = len(self._sockets)
+        info = dict(cached=n_cached, bound=n_bound)
+        for reason in ("evicted_lru", "evicted_idle", "reaped"):
+            info[reason] = self.counters[reason]
+        return info
+
+    def _close_socket(self, identifier, socket, reason):
+        _logger.debug("Closing %s socket %s (%s)", socket.role, identifier, reason)
+        if socket.role in Socket.binding_roles:
+            _unbind(socket)
+        socket.close(linger=0)
+        if socket.role in Socket.binding_roles:
+            self.release_address(identifier[0])
+        with self._lock:
+            self.counters[reason] += 1
+
+    #
+    # Sockets are kept in each thread's cache in the order they were
+    # last used. Sockets which haven't been used for a while, and the
+    # least-recently-used sockets of a full cache, are closed -- but only
+    # speakers, which can be opened again as they were. Bound sockets have
+    # had their address given out, and the others hold something which
+    # closing them would lose: a subscriber its subscriptions & the news
+    # queued for it, a pipelined speaker its replies on their way & a
+    # stream its chunks. All the sockets of a thread which has finished
+    # are closed, though, freeing any addresses they were bound to.
+    #
+    def _evict_sockets(self, local_sockets, n_wanted=0):
+        """Close sockets in this thread's cache which have been idle for
+        too long or which would take the cache beyond its size limit
+        """
+        now = _clock()
+        idle_timeout_s = config.SOCKET_IDLE_TIMEOUT_S
+        n_over = len(local_sockets) + n_wanted - config.SOCKET_CACHE_SIZE
+        to_evict = []
+        for identifier, socket in local_sockets.items():
+            is_idle = idle_timeout_s is not config.FOREVER and now - socket._used_at > idle_timeout_s
+            if not is_idle and n_over <= 0:
+                break
+            if socket.role not in Socket.evictable_roles or socket.__dict__.get('_n_users'):
+                continue
+            to_evict.append((identifier, "evicted_idle" if is_idle else "evicted_lru"))
+            n_over -= 1
+        for identifier, reason in to_evict:
+            self._close_socket(identifier, local_sockets.pop(identifier), reason)
+
+    def _replace_socket(self, socket):
+        """Close a socket which can't be used again (eg a speaker which
+        never got its reply) so that the next get_socket creates another
+        """
+        identifier = socket.address, socket.role
+        local_sockets = self._local_sockets()
+        if local_sockets.get(identifier) is socket:
+            del local_sockets[identifier]
+        _logger.debug("Replacing %s socket %s", socket.role, identifier)
+        socket.close(linger=0)
+
+    def _finished_caches(self):
+        """Remove & return the caches of any threads which have finished;
+        call with self._lock held
+        """
+        finished = [t for t in self._thread_sockets if not t.is_alive()]
+        return [self._thread_sockets.pop(t) for t in finished]
+
+    #
+    # Closing a bound socket waits for its endpoints to close (see _unbind),
+    # which mustn't hold up whichever thread happened to find the sockets
+    # to reap. So bound sockets are closed by a thread of their own; only
+    # something which wants to bind one of their addresses waits for it.
+    #
+    def _reap_sockets(self):
+        """Close the sockets of any threads which have finished
+        """
+        to_close, to_unbind = [], []
+        with self._lock:
+            for cache in self._finished_caches():
+                while cache:
+                    identifier, socket = cache.popitem()
+                    if socket.role in Socket.binding_roles:
+                        self._reaping[identifier[0]] = threading.Event()
+                        to_unbind.append((identifier, socket))
+                    else:
+                        to_close.append((identifier, socket))
+        for identifier, socket in to_close:
+            self._close_socket(identifier, socket, "reaped")
+        if to_unbind:
+            thread = threading.Thread(target=self._close_reaped, args=(to_unbind,), name="nw0-reaper")
+            thread.daemon = True
+            thread.start()
+
+    def _close_reaped(self, reaped):
+        for identifier, socket in reaped:
+            try:
+                self._close_socket(identifier, socket, "reaped")
+            except Exception:
+                _logger.exception("Unable to close %s socket %s", socket.role, identifier)
+            finally:
+                with self._lock:
+                    reaping = self._reaping.pop(identifier[0])
+                reaping.set()
+
+    def get_socket(self, address, role, wait_for_connections=True):
+        """Create or retrieve a socket of the right type, already connected
+        to the address. Address (ip:port) must be fully specified at this
+        point. core.address can be used to generate an address.
+
+        A new subscriber waits for its connections to be made (see
+        Socket._wait_for_connections) unless `wait_for_connections` is False.
+        """
+        local_sockets = self._local_sockets()
+
         # Convert the address to a single canonical string.
         #
         # If a list of addresses is passed, turn it into a tuple
@@ -152,10 +1198,12 @@ class Sockets:
         # to [addressB, addressA], three separate sockets will be
         # created and used.
         #
-        identifier = caddress
+        identifier = caddress, role
         
-        if identifier not in self._tls.sockets:
+        if identifier not in local_sockets:
             _logger.debug("%s does not exist in local sockets", identifier)
+            self._reap_sockets()
+            self._evict_sockets(local_sockets, 1)
             #
             # If this is a listening / subscribing socket, it can only
             # be bound once, regardless of thread. Therefore keep a
@@ -163,99 +1211,369 @@ class Sockets:
             # one hasn't been used elsewhere.
             #
             if role in Socket.binding_roles:
-                with self._lock:
-                    if identifier in self._sockets:
-                        raise core.SocketAlreadyExistsError("You cannot create a listening socket in more than one thread")
-                    else:
-                        self._sockets.add(identifier)
+                self.claim_address(caddress)
+            elif role == "cached_publisher":
+                self._start_news_cache(caddress)
             
-            type = self.roles[role]
-            socket = context.socket(type)
-            socket.role = role
-            socket.address = caddress
+            socket = None
+            try:
+                socket = self.context.socket(self.roles[role])
+                socket.role = role
+                if not wait_for_connections:
+                    socket.__dict__['waits_for_connections'] = False
+                _tune(socket)
+                if role in ("publisher", "forwarded_publisher", "subscriber"):
+                    self._apply_news_policy(socket, caddress)
+                socket.address = caddress
+            except:
+                #
+                # Don't keep an address claimed if it couldn't be bound
+                #
+                if socket is not None:
+                    socket.close(linger=0)
+                if role in Socket.binding_roles:
+                    self.release_address(caddress)
+                raise
             #
             # Do this last so that an exception earlier will result
             # in the socket not being cached
             #
-            self._tls.sockets[identifier] = socket
+            local_sockets[identifier] = socket
         else:
-            _logger.debug("%s already not exist in local sockets", identifier)
             #
             # Only return sockets created in this thread
             #
-            socket = self._tls.sockets[identifier]
+            socket = local_sockets.pop(identifier)
+            self._evict_sockets(local_sockets, 1)
+            local_sockets[identifier] = socket
 
+        socket.__dict__['_used_at'] = _clock()
         return socket
     
-    def intervals_ms(self, timeout_ms):
-        """Generate a series of interval lengths, in ms, which
-        will add up to the number of ms in timeout_ms. If timeout_ms
-        is None, keep returning intervals forever.
+    def _get_poller(self, socket):
+        """Return a poller for this socket, creating it on first use.
+
+        The poller is kept with the socket for as long as the socket lives.
+        A poller created in the main thread also watches the signal waker
+        so that Ctrl-C can interrupt an otherwise indefinite wait.
         """
-        if timeout_ms is config.FOREVER:
-            while True:
-                yield self.try_length_ms
-        else:
-            whole_intervals, part_interval = divmod(timeout_ms, self.try_length_ms)
-            for _ in range(whole_intervals):
-                yield self.try_length_ms
-            yield part_interval
+        poller = socket.__dict__.get('_poller')
+        if poller is None:
+            poller = zmq.Poller()
+            poller.register(socket, zmq.POLLIN)
+            #
+            # (threading.main_thread only arrived with Python 3.4)
+            #
+            if isinstance(threading.current_thread(), threading._MainThread):
+                waker_socket = _waker.install()
+                if waker_socket is not None:
+                    poller.register(waker_socket, zmq.POLLIN)
+            socket.__dict__['_poller'] = poller
+        return poller
 
-    def _receive_with_timeout(self, socket, timeout_s, use_multipart=False):
+    def _receive_with_timeout(self, socket, timeout_s, use_multipart=False, copy=True):
         """Check for socket activity and either return what's
         received on the socket or time out if timeout_s expires
         without anything on the socket.
         
-        This is implemented in loops of self.try_length_ms milliseconds 
-        to allow Ctrl-C handling to take place.
+        This blocks in a single poll until the deadline; a signal such as
+        Ctrl-C wakes the poll early (see _Waker) so it can be handled.
+
+        If copy is False, zmq.Frame objects are returned rather than
+        bytes so that large payloads need not be copied.
         """
+        started_at = _clock()
         if timeout_s is config.FOREVER:
-            timeout_ms = config.FOREVER
+            deadline = None
         else:
-            timeout_ms = int(1000 * timeout_s)
+            deadline = started_at + timeout_s
 
-        poller = zmq.Poller()
-        poller.register(socket, zmq.POLLIN)
-        ms_so_far = 0
+        poller = self._get_poller(socket)
         try:
-            for interval_ms in self.intervals_ms(timeout_ms):
-                sockets = dict(poller.poll(interval_ms))
-                ms_so_far += interval_ms
-                if socket in sockets:
+            while True:
+                if deadline is None:
+                    timeout_ms = None
+                else:
+                    timeout_ms = max(0, int(math.ceil(1000 * (deadline - _clock()))))
+                events = dict(poller.poll(timeout_ms))
+                if socket in events:
                     if use_multipart:
-                        return socket.recv_multipart()
+                        return socket.recv_multipart(copy=copy)
                     else:
-                        return socket.recv()
-            else:
-                raise core.SocketTimedOutError(timeout_s)
+                        return socket.recv(copy=copy)
+                if _waker.reader is not None and _waker.reader.fileno() in events:
+                    _waker.drain()
+                if deadline is not None and _clock() >= deadline:
+                    raise core.SocketTimedOutError(timeout_s)
         except KeyboardInterrupt:
-            raise core.SocketInterruptedError(ms_so_far / 1000.0)
+            raise core.SocketInterruptedError(_clock() - started_at)
 
-    def wait_for_message_from(self, address, wait_for_s):
+    #
+    # A message which has been answered already, according to its request
+    # id, is sent the same reply again and the listener goes on waiting
+    #
+    def wait_for_message_from(self, address, wait_for_s, copy=True):
         socket = self.get_socket(address, "listener")
-        try:
-            message = self._receive_with_timeout(socket, wait_for_s)
-        except (core.SocketTimedOutError):
-            return None
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if wait_for_s is config.FOREVER:
+            deadline = None
         else:
-            return _unserialise(message)
-        
-    def send_message_to(self, address, message, wait_for_reply_s):
+            deadline = _clock() + wait_for_s
+        while True:
+            if deadline is None:
+                timeout_s = config.FOREVER
+            else:
+                timeout_s = max(0, deadline - _clock())
+            try:
+                frames = self._receive_with_timeout(socket, timeout_s, use_multipart=True, copy=copy)
+            except (core.SocketTimedOutError):
+                address_stats.timed_out()
+                return None
+            address_stats.received(frames)
+            request_id, frames = _split_request_id(frames)
+            if request_id is not None:
+                reply_frames, is_new = self._reply_cache(socket.address).start(request_id)
+                if not is_new:
+                    socket.send_multipart(reply_frames, copy=False)
+                    address_stats.sent(reply_frames)
+                    address_stats.duplicated()
+                    continue
+            try:
+                message, serialiser = address_stats.serialising(_unserialise_from_frames, frames)
+            except Exception:
+                #
+                # A listening socket can't receive again until it has
+                # replied, so a message which can't be unserialised (eg
+                # because its serialiser isn't accepted) is logged & sent
+                # an empty reply, and the listener goes on waiting.
+                #
+                _logger.exception("Unable to unserialise message from %s", socket.address)
+                reply_frames = _serialise_to_frames(None)
+                socket.send_multipart(reply_frames, copy=False)
+                address_stats.sent(reply_frames)
+                if request_id is not None:
+                    self._reply_cache(socket.address).forget(request_id)
+                continue
+            socket.__dict__['_request_id'] = request_id
+            #
+            # Unless told otherwise, reply using whichever serialiser
+            # the sender used: we know it can understand that.
+            #
+            socket.__dict__['_reply_serialiser'] = serialiser
+            return message
+
+    def wait_for_concurrent_message_from(self, address, wait_for_s, copy=True):
+        socket = self.get_socket(address, "concurrent_listener")
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if wait_for_s is config.FOREVER:
+            deadline = None
+        else:
+            deadline = _clock() + wait_for_s
+        while True:
+            if deadline is None:
+                timeout_s = config.FOREVER
+            else:
+                timeout_s = max(0, deadline - _clock())
+            try:
+                frames = self._receive_with_timeout(socket, timeout_s, use_multipart=True, copy=copy)
+            except (core.SocketTimedOutError):
+                address_stats.timed_out()
+                return None, None
+            envelope, frames = _split_envelope(frames)
+            address_stats.received(frames)
+            request_id, frames = _split_request_id(frames)
+            if request_id is not None:
+                reply_frames, is_new = self._reply_cache(socket.address).start(request_id, envelope)
+                if not is_new:
+                    address_stats.duplicated()
+                    #
+                    # If the first message is still being handled, this
+                    # one will be answered along with it
+                    #
+                    if reply_frames is not None:
+                        socket.send_multipart(envelope + reply_frames, copy=False)
+                        address_stats.sent(reply_frames)
+                    continue
+            try:
+                message, serialiser = address_stats.serialising(_unserialise_from_frames, frames)
+            except Exception:
+                _logger.exception("Unable to unserialise message from %s", socket.address)
+                reply_frames = _serialise_to_frames(None)
+                envelopes = [envelope]
+                if request_id is not None:
+                    envelopes.extend(self._reply_cache(socket.address).forget(request_id))
+                for envelope in envelopes:
+                    socket.send_multipart(envelope + reply_frames, copy=False)
+                    address_stats.sent(reply_frames)
+                continue
+            return message, ReplyHandle(socket.address, envelope, serialiser, request_id)
+
+    #
+    # A REQ socket which has sent a message must receive a reply before
+    # it can send again. If the reply never comes the socket is stuck, so
+    # close it & send again on a new one (the "Lazy Pirate" pattern).
+    #
+    def send_message_to(self, address, message, wait_for_reply_s, serialiser=None, copy=True, request_id=None):
         socket = self.get_socket(address, "speaker")
-        serialised_message = _serialise(message)
-        socket.send(serialised_message)
-        return _unserialise(self._receive_with_timeout(socket, wait_for_reply_s))
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if serialiser is None:
+            serialiser = self._serialisers.get(socket.address)
+        message_frames = address_stats.serialising(_serialise_to_frames, message, serialiser)
+        if request_id is not None:
+            message_frames = _request_id_frames(request_id) + message_frames
+        timeout_s = wait_for_reply_s
+        waited_s = 0
+        for n_retries in range(config.SEND_RETRIES + 1):
+            if n_retries:
+                _logger.warn("No reply from %s; sending again (retry %d of %d)", socket.address, n_retries, config.SEND_RETRIES)
+                address_stats.retried()
+                timeout_s = timeout_s * config.SEND_RETRY_BACKOFF
+                socket = self.get_socket(address, "speaker")
+            sent_at = _clock()
+            socket.send_multipart(message_frames, copy=False)
+            address_stats.sent(message_frames)
+            try:
+                frames = self._receive_with_timeout(socket, timeout_s, use_multipart=True, copy=copy)
+            except core.SocketTimedOutError:
+                address_stats.timed_out()
+                self._replace_socket(socket)
+                waited_s += timeout_s
+            except:
+                self._replace_socket(socket)
+                raise
+            else:
+                address_stats.round_tripped(_clock() - sent_at)
+                address_stats.received(frames)
+                reply, _ = address_stats.serialising(_unserialise_from_frames, frames)
+                return reply
+        raise core.SocketTimedOutError(waited_s, config.SEND_RETRIES + 1)
+
+    def send_messages_to(self, address, messages, window, wait_for_reply_s, serialiser=None, copy=True):
+        """Send messages keeping up to `window` of them awaiting replies at
+        once, and generate the replies in the order the messages were sent.
+        """
+        if window < 1:
+            raise core.NetworkZeroError("The window must allow at least one message, not %r" % window)
+        socket = self.get_socket(address, "pipelined_speaker")
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if serialiser is None:
+            serialiser = self._serialisers.get(socket.address)
+
+        messages = iter(messages)
+        is_exhausted = False
+        in_flight = collections.deque()
+        sent_at = {}
+        replies = {}
+        with socket.in_use():
+            while True:
+                while not is_exhausted and len(in_flight) < window:
+                    try:
+                        message = next(messages)
+                    except StopIteration:
+                        is_exhausted = True
+                        break
+                    sequence = socket.__dict__.get('_sequence', 0) + 1
+                    socket.__dict__['_sequence'] = sequence
+                    message_frames = address_stats.serialising(_serialise_to_frames, message, serialiser)
+                    sent_at[sequence] = _clock()
+                    socket.send_multipart([_sequence.pack(sequence), b""] + message_frames, copy=False)
+                    address_stats.sent(message_frames)
+                    in_flight.append(sequence)
 
-    def send_reply_to(self, address, reply):
+                if not in_flight:
+                    return
+                if in_flight[0] in replies:
+                    yield replies.pop(in_flight.popleft())
+                    continue
+
+                try:
+                    frames = self._receive_with_timeout(socket, wait_for_reply_s, use_multipart=True, copy=copy)
+                except core.SocketTimedOutError:
+                    address_stats.timed_out()
+                    raise
+                envelope, frames = _split_envelope(frames)
+                sequence, = _sequence.unpack(_frame_bytes(envelope[0]))
+                #
+                # A reply to a message from an earlier, abandoned, pipeline
+                # will not be in flight now; ignore it.
+                #
+                if sequence >= in_flight[0]:
+                    address_stats.round_tripped(_clock() - sent_at.pop(sequence))
+                    address_stats.received(frames)
+                    replies[sequence], _ = address_stats.serialising(_unserialise_from_frames, frames)
+
+    def send_reply_to(self, address, reply, serialiser=None):
+        if isinstance(address, ReplyHandle):
+            return self._send_concurrent_reply_to(address, reply, serialiser)
         socket = self.get_socket(address, "listener")
-        reply = _serialise(reply)
-        return socket.send(reply)
-    
-    def send_news_to(self, address, topic, data):
-        socket = self.get_socket(address, "publisher")
-        return socket.send_multipart(_serialise_for_pubsub(topic, data))
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if serialiser is None:
+            serialiser = socket.__dict__.get('_reply_serialiser')
+        reply_frames = address_stats.serialising(_serialise_to_frames, reply, serialiser)
+        socket.send_multipart(reply_frames, copy=False)
+        address_stats.sent(reply_frames)
+        request_id = socket.__dict__.pop('_request_id', None)
+        if request_id is not None:
+            self._reply_cache(socket.address).finish(request_id, reply_frames)
+
+    def _send_concurrent_reply_to(self, handle, reply, serialiser=None):
+        socket = self.get_socket(handle.address, "concurrent_listener")
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if serialiser is None:
+            serialiser = handle.serialiser
+        reply_frames = address_stats.serialising(_serialise_to_frames, reply, serialiser)
+        socket.send_multipart(handle.envelope + reply_frames, copy=False)
+        address_stats.sent(reply_frames)
+        if handle.request_id is not None:
+            for envelope in self._reply_cache(socket.address).finish(handle.request_id, reply_frames):
+                socket.send_multipart(envelope + reply_frames, copy=False)
+                address_stats.sent(reply_frames)
+
+    def send_news_to(self, address, topic, data, serialiser=None):
+        role = self._publisher_role(address)
+        socket = self.get_socket(address, role)
+        #
+        # A new subscriber will receive cached news however late it
+        # subscribes so there's no need to wait for one
+        #
+        if role in Socket.publishing_roles:
+            socket._wait_for_subscribers()
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if serialiser is None:
+            serialiser = self._serialisers.get(socket.address)
+        news_frames = address_stats.serialising(_serialise_for_pubsub, topic, data, serialiser)
+        socket.send_multipart(news_frames, copy=False)
+        address_stats.sent(news_frames)
+
+    def send_news_batch(self, address, news, serialiser=None):
+        """Send many items of news, stopping at the first which would go
+        beyond the high-water mark, and return how many were sent
+        """
+        role = self._publisher_role(address)
+        socket = self.get_socket(address, role)
+        if role in Socket.publishing_roles:
+            socket._wait_for_subscribers()
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        if serialiser is None:
+            serialiser = self._serialisers.get(socket.address)
+        batch = []
+        for topic, data in news:
+            batch.append(address_stats.serialising(_serialise_for_pubsub, topic, data, serialiser))
+        n_sent = 0
+        with socket._refusing_to_drop():
+            for frames in batch:
+                try:
+                    socket.send_multipart(frames, zmq.NOBLOCK, copy=False)
+                except zmq.Again:
+                    break
+                address_stats.sent(frames)
+                n_sent += 1
+        return n_sent
     
-    def wait_for_news_from(self, address, topic, wait_for_s, is_raw=False):
+    def _get_subscriber(self, address, topic):
+        """Return a subscriber socket for one or more addresses, subscribed
+        to one or more topic prefixes
+        """
         if isinstance(address, list):
             addresses = address
         else:
@@ -265,16 +1583,248 @@ class Sockets:
             topics = [topic]
         else:
             topics = topic
-        for t in topics:
-            socket.set(zmq.SUBSCRIBE, t.encode(config.ENCODING))        
+        socket._subscribe_to(topics)
+        return socket
+
+    def wait_for_news_from(self, address, topic, wait_for_s, is_raw=False, copy=True):
+        socket = self._get_subscriber(address, topic)
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        #
+        # Conflating news means taking everything which has arrived to
+        # find the latest for each topic; otherwise take one at a time
+        #
+        limit = DRAIN_LIMIT if socket._conflated_prefixes else 1
+        if wait_for_s is config.FOREVER:
+            deadline = None
+        else:
+            deadline = _clock() + wait_for_s
         try:
-            result = self._receive_with_timeout(socket, wait_for_s, use_multipart=True)
-            unserialised_result = _unserialise_for_pubsub(result, is_raw)
-            return unserialised_result
-        except (core.SocketTimedOutError, core.SocketInterruptedError):
+            while True:
+                frames = socket._next_news(copy)
+                if frames is not None:
+                    address_stats.received(frames)
+                    news = address_stats.serialising(_unserialise_for_pubsub, frames, is_raw)
+                    return news
+                if deadline is None:
+                    timeout_s = config.FOREVER
+                else:
+                    timeout_s = max(0, deadline - _clock())
+                frames = self._receive_with_timeout(socket, timeout_s, use_multipart=True, copy=copy)
+                socket._take_news(frames, limit, copy)
+        except core.SocketTimedOutError:
+            address_stats.timed_out()
+            return None, None
+        except core.SocketInterruptedError:
             return None, None
 
+    #
+    # Once a subscriber has been woken by one item of news it takes
+    # whatever else has already arrived without polling again, up to a
+    # limit so that a fast publisher can't stop it from ever yielding.
+    #
+    def iter_news_from(self, address, topic, wait_for_s, is_raw=False, copy=True, batch=None):
+        if batch is not None and batch < 1:
+            raise core.NetworkZeroError("A batch must hold at least one item of news, not %r" % batch)
+        socket = self._get_subscriber(address, topic)
+        address_stats = metrics._stats.for_address(socket.address, socket.role)
+        limit = batch or DRAIN_LIMIT
+        with socket.in_use():
+            while True:
+                news = []
+                while len(news) < limit:
+                    frames = socket._next_news(copy)
+                    if frames is None:
+                        break
+                    address_stats.received(frames)
+                    news.append(address_stats.serialising(_unserialise_for_pubsub, frames, is_raw))
+                if not news:
+                    try:
+                        frames = self._receive_with_timeout(socket, wait_for_s, use_multipart=True, copy=copy)
+                    except core.SocketTimedOutError:
+                        address_stats.timed_out()
+                        return
+                    except core.SocketInterruptedError:
+                        return
+                    socket._take_news(frames, limit, copy)
+                elif batch is None:
+                    for item in news:
+                        yield item
+                else:
+                    yield news
+
+    def send_stream_to(self, address, chunks, wait_for_s):
+        """Send chunks of binary data as one stream, sending each only when
+        the receiver has given credit for it, and return how many bytes
+        were sent
+        """
+        socket = self.get_socket(address, "stream_sender")
+        stream_id = os.urandom(16)
+        n_bytes = 0
+        credit = 0
+        with socket.in_use():
+            try:
+                socket.send_multipart([b"", stream_id, _STREAM_START])
+                for chunk in chunks:
+                    #
+                    # (A stream carries only binary data so, unlike a
+                    # message, it can take a Python 2 str as bytes)
+                    #
+                    if isinstance(chunk, string) or not _supports_buffer(chunk):
+                        raise core.NetworkZeroError("A stream can only be made of binary data, not %r" % type(chunk))
+                    while not credit:
+                        credit = self._wait_for_stream_credit(socket, stream_id, wait_for_s)
+                    socket.send_multipart([b"", stream_id, _STREAM_DATA, chunk], copy=False)
+                    credit -= 1
+                    n_bytes += memoryview(chunk).nbytes
+                socket.send_multipart([b"", stream_id, _STREAM_END])
+                while self._wait_for_stream_credit(socket, stream_id, wait_for_s) is not None:
+                    pass
+            except:
+                #
+                # Don't leave chunks of a stream which has been given up
+                # queued on a socket which might be used for another
+                #
+                self._replace_socket(socket)
+                raise
+        return n_bytes
+
+    def _wait_for_stream_credit(self, socket, stream_id, wait_for_s):
+        """Return how many more chunks of a stream can be sent, or None
+        once the receiver has taken the whole stream
+        """
+        while True:
+            frames = self._receive_with_timeout(socket, wait_for_s, use_multipart=True)
+            stream_frames = _split_stream_frames(frames)
+            if stream_frames is None:
+                _logger.warn("Dropping malformed stream frames from %s", socket.address)
+                continue
+            _, frame_stream_id, kind, rest = stream_frames
+            if frame_stream_id != stream_id:
+                continue
+            if kind == _STREAM_DONE:
+                return None
+            if kind == _STREAM_CANCEL:
+                raise core.NetworkZeroError("The receiver stopped taking the stream sent to %s" % socket.address)
+            if kind == _STREAM_CREDIT:
+                n_chunks, = _credit.unpack(rest[0])
+                return n_chunks
+
+    def send_file_to(self, address, path, wait_for_s):
+        """Send the contents of a file as a stream, reading it in chunks
+        from a memory map so that it is never read into memory all at once
+        """
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            #
+            # An empty file can't be memory-mapped
+            #
+            if not size:
+                return self.send_stream_to(address, [], wait_for_s)
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                chunk_size = config.STREAM_CHUNK_SIZE
+                chunks = (mapped[n:n + chunk_size] for n in range(0, size, chunk_size))
+                return self.send_stream_to(address, chunks, wait_for_s)
+            finally:
+                mapped.close()
+
+    def _wait_for_stream(self, socket, wait_for_s):
+        """Wait for a sender to start a stream and return the envelope
+        to reply to it with and the stream's id
+        """
+        pending = socket._pending_streams
+        while not pending:
+            frames = self._receive_with_timeout(socket, wait_for_s, use_multipart=True)
+            stream_frames = _split_stream_frames(frames)
+            if stream_frames is None:
+                _logger.warn("Dropping malformed stream frames sent to %s", socket.address)
+                continue
+            envelope, stream_id, kind, _ = stream_frames
+            #
+            # Anything else is left over from an abandoned stream
+            #
+            if kind == _STREAM_START:
+                pending.append((envelope, stream_id))
+        return pending.popleft()
+
+    def _receive_stream(self, socket, envelope, stream_id, wait_for_s, copy=True):
+        """Generate the chunks of a stream which has started, granting
+        credit for another chunk as each is taken, and cancel the stream
+        if the generator is closed (or fails) before the stream's end
+        """
+        socket.send_multipart(envelope + [stream_id, _STREAM_CREDIT, _credit.pack(config.STREAM_WINDOW)])
+        is_finished = False
+        try:
+            while True:
+                frames = self._receive_with_timeout(socket, wait_for_s, use_multipart=True, copy=copy)
+                stream_frames = _split_stream_frames(frames)
+                if stream_frames is None:
+                    _logger.warn("Dropping malformed stream frames sent to %s", socket.address)
+                    continue
+                sender, frame_stream_id, kind, rest = stream_frames
+                if kind == _STREAM_START:
+                    socket._pending_streams.append(([_frame_bytes(f) for f in sender], frame_stream_id))
+                elif frame_stream_id != stream_id:
+                    continue
+                elif kind == _STREAM_END:
+                    is_finished = True
+                    socket.send_multipart(envelope + [stream_id, _STREAM_DONE])
+                    return
+                elif kind == _STREAM_DATA:
+                    yield _frame_data(rest[0])
+                    socket.send_multipart(envelope + [stream_id, _STREAM_CREDIT, _credit.pack(1)])
+        finally:
+            if not is_finished and not socket.closed:
+                socket.send_multipart(envelope + [stream_id, _STREAM_CANCEL])
+
+    def iter_stream_from(self, address, wait_for_s, copy=True):
+        socket = self.get_socket(address, "stream_receiver")
+        with socket.in_use():
+            try:
+                envelope, stream_id = self._wait_for_stream(socket, wait_for_s)
+            except (core.SocketTimedOutError, core.SocketInterruptedError):
+                return
+            chunks = self._receive_stream(socket, envelope, stream_id, wait_for_s, copy)
+            try:
+                for chunk in chunks:
+                    yield chunk
+            finally:
+                chunks.close()
+
+    def receive_file_from(self, address, path, wait_for_s):
+        socket = self.get_socket(address, "stream_receiver")
+        try:
+            envelope, stream_id = self._wait_for_stream(socket, wait_for_s)
+        except (core.SocketTimedOutError, core.SocketInterruptedError):
+            return None
+        n_bytes = 0
+        directory, filename = os.path.split(os.path.abspath(path))
+        partial_path = os.path.join(directory, ".%s.%s.part" % (filename, uuid.uuid4().hex))
+        #
+        # Create the file as open() would, so that it's given the same
+        # permissions as the file it's renamed to would have had
+        #
+        fd = os.open(partial_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        chunks = self._receive_stream(socket, envelope, stream_id, wait_for_s, copy=False)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    n_bytes += len(chunk)
+            _replace(partial_path, path)
+        except:
+            chunks.close()
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+            raise
+        return n_bytes
+
 _sockets = Sockets()
 
 def get_socket(address, role):
     return _sockets.get_socket(address, role)
+
+def cache_info():
+    return _sockets.cache_info()
@@ -0,0 +1,203 @@
+import asyncio
+import uuid
+
+import pytest
+
+import networkzero as nw0
+import networkzero.aio as nw0_aio
+nw0.core._enable_debug_logging()
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def echo(address, n_messages):
+    for _ in range(n_messages):
+        message = await nw0_aio.wait_for_message_from(address, wait_for_s=5)
+        await nw0_aio.send_reply_to(address, message)
+
+def test_send_message():
+    address = nw0.core.address()
+    message = uuid.uuid4().hex
+
+    async def main():
+        server = asyncio.ensure_future(echo(address, 1))
+        reply = await nw0_aio.send_message_to(address, message, wait_for_reply_s=5)
+        await server
+        return reply
+
+    assert run(main()) == message
+
+def test_send_message_with_request_id_handled_once():
+    address = nw0.core.address()
+    request_id = uuid.uuid4().hex
+
+    async def main():
+        server = asyncio.ensure_future(echo(address, 1))
+        first = await nw0_aio.send_message_to(address, "first", wait_for_reply_s=5, request_id=request_id)
+        await server
+        #
+        # The listener answers the second message from its cache and
+        # goes on waiting
+        #
+        server = asyncio.ensure_future(nw0_aio.wait_for_message_from(address, wait_for_s=1))
+        second = await nw0_aio.send_message_to(address, "second", wait_for_reply_s=5, request_id=request_id)
+        return first, second, await server
+
+    assert run(main()) == ("first", "first", None)
+
+def test_unreadable_message_answered():
+    address = nw0.core.address()
+    message = uuid.uuid4().hex
+
+    async def main():
+        server = asyncio.ensure_future(echo(address, 1))
+        unreadable = await nw0_aio.send_message_to(address, message, wait_for_reply_s=5, serialiser="pickle")
+        reply = await nw0_aio.send_message_to(address, message, wait_for_reply_s=5)
+        await server
+        return unreadable, reply
+
+    assert run(main()) == (None, message)
+
+def test_concurrent_messages_to_one_address():
+    address = nw0.core.address()
+    messages = [uuid.uuid4().hex for _ in range(10)]
+
+    async def main():
+        server = asyncio.ensure_future(echo(address, len(messages)))
+        replies = await asyncio.gather(*(
+            nw0_aio.send_message_to(address, message, wait_for_reply_s=5) for message in messages
+        ))
+        await server
+        return replies
+
+    assert run(main()) == messages
+
+def test_concurrent_listener():
+    address = nw0.core.address()
+    messages = [uuid.uuid4().hex for _ in range(3)]
+
+    async def serve():
+        received = [await nw0_aio.wait_for_message_from(address, wait_for_s=5, concurrent=True) for _ in messages]
+        for message, reply_handle in reversed(received):
+            await nw0_aio.send_reply_to(reply_handle, message.upper())
+
+    async def ask(message):
+        #
+        # Each speaker is given its own event loop's worth of sockets
+        # by running in its own thread
+        #
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, nw0.send_message_to, address, message, 5)
+
+    async def main():
+        server = asyncio.ensure_future(serve())
+        replies = await asyncio.gather(*(ask(message) for message in messages))
+        await server
+        return replies
+
+    assert run(main()) == [message.upper() for message in messages]
+
+def test_wait_for_message_with_timeout():
+    address = nw0.core.address()
+    assert run(nw0_aio.wait_for_message_from(address, wait_for_s=0.1)) is None
+
+def test_listen_again_from_another_event_loop():
+    address = nw0.core.address()
+    assert run(nw0_aio.wait_for_message_from(address, wait_for_s=0.1)) is None
+    #
+    # The first loop has been closed, freeing the address it listened on
+    #
+    assert run(nw0_aio.wait_for_message_from(address, wait_for_s=0.1)) is None
+
+def test_send_message_with_timeout():
+    address = nw0.core.address()
+    with pytest.raises(nw0.SocketTimedOutError):
+        run(nw0_aio.send_message_to(address, wait_for_reply_s=0.1))
+
+def test_send_message_after_timeout():
+    address = nw0.core.address()
+    message = uuid.uuid4().hex
+
+    async def main():
+        timeouts = await asyncio.gather(*(
+            nw0_aio.send_message_to(address, wait_for_reply_s=0.1) for _ in range(2)
+        ), return_exceptions=True)
+        assert all(isinstance(e, nw0.SocketTimedOutError) for e in timeouts)
+        server = asyncio.ensure_future(echo(address, 1))
+        reply = await nw0_aio.send_message_to(address, message, wait_for_reply_s=5)
+        await server
+        return reply
+
+    assert run(main()) == message
+
+def test_news():
+    address = nw0.core.address()
+    topic = uuid.uuid4().hex
+    data = uuid.uuid4().hex
+
+    async def publish():
+        while True:
+            await nw0_aio.send_news_to(address, topic, data)
+            await asyncio.sleep(0.1)
+
+    async def main():
+        publisher = asyncio.ensure_future(publish())
+        try:
+            return await nw0_aio.wait_for_news_from(address, topic, wait_for_s=5)
+        finally:
+            publisher.cancel()
+
+    assert run(main()) == (topic, data)
+
+def test_iter_news():
+    address = nw0.core.address()
+    topic = uuid.uuid4().hex
+    n_items = 50
+
+    async def publish(is_ready):
+        while not is_ready.is_set():
+            await nw0_aio.send_news_to(address, topic, None)
+            await asyncio.sleep(0.1)
+        for n in range(n_items):
+            await nw0_aio.send_news_to(address, topic, n)
+
+    async def main():
+        is_ready = asyncio.Event()
+        publisher = asyncio.ensure_future(publish(is_ready))
+        received = []
+        async for batch in nw0_aio.iter_news_from(address, topic, wait_for_s=5, batch=10):
+            assert 1 <= len(batch) <= 10
+            is_ready.set()
+            received.extend(data for _, data in batch if data is not None)
+            if len(received) == n_items:
+                break
+        await publisher
+        return received
+
+    assert run(main()) == list(range(n_items))
+
+def test_send_news_batch():
+    address = nw0.core.address()
+    topic = uuid.uuid4().hex
+    n_items = 50
+
+    async def subscribe():
+        received = []
+        async for in_topic, in_data in nw0_aio.iter_news_from(address, topic, wait_for_s=5):
+            received.append(in_data)
+            if len(received) == n_items:
+                return received
+
+    async def main():
+        subscriber = asyncio.ensure_future(subscribe())
+        await asyncio.sleep(0.1)
+        n_sent = await nw0_aio.send_news_batch(address, [(topic, n) for n in range(n_items)])
+        return n_sent, await subscriber
+
+    assert run(main()) == (n_items, list(range(n_items)))
+
+def test_bound_by_blocking_code():
+    address = nw0.core.address()
+    nw0.sockets.get_socket(address, "listener")
+    with pytest.raises(nw0.SocketAlreadyExistsError):
+        run(nw0_aio.wait_for_message_from(address, wait_for_s=0))
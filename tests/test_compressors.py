@@ -0,0 +1,92 @@
+import uuid
+import zlib
+
+import pytest
+
+import networkzero as nw0
+nw0.core._enable_debug_logging()
+
+compressors = nw0.compressors
+
+@pytest.fixture
+def zlib_compression(monkeypatch):
+    monkeypatch.setattr(nw0.config, "COMPRESSOR", "zlib")
+    monkeypatch.setattr(nw0.config, "COMPRESSION_THRESHOLD", 1024)
+
+def test_no_compression_by_default():
+    message_bytes = b"x" * 100000
+    assert compressors.compress(message_bytes) is message_bytes
+
+def test_small_message_not_compressed(zlib_compression):
+    message_bytes = b"x" * 100
+    assert compressors.compress(message_bytes) is message_bytes
+
+def test_incompressible_message_not_compressed(zlib_compression):
+    message_bytes = bytes(bytearray(range(256))) + b"".join(uuid.uuid4().bytes for _ in range(100))
+    assert compressors.compress(message_bytes) is message_bytes
+
+def test_zlib_roundtrip(zlib_compression):
+    message_bytes = b"x" * 100000
+    compressed = compressors.compress(message_bytes)
+    assert compressed[:1] == b"\x10"
+    assert len(compressed) < len(message_bytes)
+    assert compressors.decompress(compressed) == message_bytes
+
+def test_uncompressed_message_passes_through():
+    message_bytes = nw0.serialisers.serialise(uuid.uuid4().hex)
+    assert compressors.decompress(message_bytes) is message_bytes
+
+def test_message_roundtrip(zlib_compression):
+    message = [uuid.uuid4().hex] * 1000
+    serialised = nw0.sockets._serialise(message)
+    assert serialised[:1] == b"\x10"
+    assert nw0.sockets._unserialise(serialised) == message
+
+def test_decompressed_size_limited(monkeypatch):
+    monkeypatch.setattr(nw0.config, "MAX_DECOMPRESSED_SIZE", 1000)
+    monkeypatch.setattr(nw0.config, "COMPRESSION_THRESHOLD", 0)
+    assert compressors.decompress(compressors.compress(b"x" * 1000, "zlib")) == b"x" * 1000
+    with pytest.raises(nw0.NetworkZeroError):
+        compressors.decompress(compressors.compress(b"x" * 1001, "zlib"))
+
+def test_compression_bomb_refused():
+    #
+    # A few kilobytes which would decompress to far more than is allowed
+    #
+    bomb = b"\x10" + zlib.compress(b"\x00" * (nw0.config.MAX_DECOMPRESSED_SIZE * 4))
+    assert len(bomb) < nw0.config.MAX_DECOMPRESSED_SIZE // 100
+    with pytest.raises(nw0.NetworkZeroError):
+        compressors.decompress(memoryview(bomb))
+
+def test_compressor_not_accepted(monkeypatch):
+    monkeypatch.setattr(nw0.config, "ACCEPTED_COMPRESSORS", set())
+    with pytest.raises(nw0.NetworkZeroError):
+        compressors.decompress(compressors.compress(b"x" * 100000, "zlib"))
+
+def test_unknown_compressor():
+    with pytest.raises(nw0.NetworkZeroError):
+        compressors.compress(b"x" * 100000, uuid.uuid4().hex)
+
+def test_invalid_tag():
+    with pytest.raises(nw0.NetworkZeroError):
+        compressors.register(uuid.uuid4().hex, 0x01, bytes, bytes)
+
+@pytest.mark.skipif(compressors.lz4_frame is None, reason="lz4 is not installed")
+def test_lz4_roundtrip():
+    message_bytes = b"x" * 100000
+    assert compressors.decompress(compressors.compress(message_bytes, "lz4")) == message_bytes
+
+@pytest.mark.skipif(compressors.zstandard is None, reason="zstandard is not installed")
+def test_zstd_roundtrip():
+    message_bytes = b"x" * 100000
+    assert compressors.decompress(compressors.compress(message_bytes, "zstd")) == message_bytes
+
+@pytest.mark.parametrize("name", ["lz4", "zstd"])
+def test_decompressed_size_limited_for_optional_compressors(monkeypatch, name):
+    if name not in compressors.names():
+        pytest.skip("%s is not installed" % name)
+    monkeypatch.setattr(nw0.config, "MAX_DECOMPRESSED_SIZE", 1000)
+    monkeypatch.setattr(nw0.config, "COMPRESSION_THRESHOLD", 0)
+    assert compressors.decompress(compressors.compress(b"x" * 1000, name)) == b"x" * 1000
+    with pytest.raises(nw0.NetworkZeroError):
+        compressors.decompress(compressors.compress(b"x" * 100000, name))
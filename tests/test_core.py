@@ -1,4 +1,6 @@
 import base64
+import logging
+import pickle
 import re
 import uuid
 
@@ -108,4 +110,72 @@ class TestBytesToString(object):
         assert nw0.core.string_to_bytes(nw0.core.bytes_to_string(self.bytes)) == self.bytes
     
     def test_reflection_from_string(self):
-        assert nw0.core.bytes_to_string(nw0.core.string_to_bytes(self.string)) == self.string
\ No newline at end of file
+        assert nw0.core.bytes_to_string(nw0.core.string_to_bytes(self.string)) == self.string
+
+
+class TestTracing(object):
+
+    @pytest.fixture
+    def records(self):
+        class ListHandler(logging.Handler):
+            def __init__(self):
+                logging.Handler.__init__(self)
+                self.records = []
+            def emit(self, record):
+                self.records.append(record)
+        handler = ListHandler()
+        logger = logging.getLogger("networkzero.trace")
+        logger.addHandler(handler)
+        yield handler.records
+        logger.removeHandler(handler)
+
+    def test_get_logger_leaves_level_alone(self):
+        logger = nw0.core.get_logger("networkzero.tests.%s" % uuid.uuid4().hex)
+        assert logger.level == logging.NOTSET
+
+    def test_not_traced_by_default(self, records):
+        nw0.wait_for_message_from(nw0.address(), wait_for_s=0.01)
+        assert not records
+
+    def test_traced(self, records, monkeypatch):
+        monkeypatch.setattr(nw0.config, "TRACE", True)
+        address = nw0.address()
+        nw0.wait_for_message_from(address, wait_for_s=0.01)
+        [record] = records
+        assert record.nw0_event == "wait_for_message_from"
+        assert record.nw0_fields["address"] == address
+        assert record.nw0_fields["wait_for_s"] == 0.01
+
+    def test_file_traced(self, records, monkeypatch, tmp_path):
+        monkeypatch.setattr(nw0.config, "TRACE", True)
+        address = nw0.address()
+        path = str(tmp_path / "received")
+        assert nw0.receive_file_from(address, path, wait_for_s=0.01) is None
+        [record] = records
+        assert record.nw0_event == "receive_file_from"
+        assert record.nw0_fields["path"] == path
+
+    def test_trace_sampled(self, records, monkeypatch):
+        monkeypatch.setattr(nw0.config, "TRACE", True)
+        monkeypatch.setattr(nw0.config, "TRACE_SAMPLE_RATE", 0.5)
+        for n in range(1000):
+            nw0.core._trace("event", n=n)
+        assert 300 < len(records) < 700
+
+    def test_trace_never_sampled(self, records, monkeypatch):
+        monkeypatch.setattr(nw0.config, "TRACE", True)
+        monkeypatch.setattr(nw0.config, "TRACE_SAMPLE_RATE", 0)
+        nw0.core._trace("event")
+        assert not records
+
+class TestConfigSettings(object):
+
+    def test_settings_applied(self, monkeypatch):
+        monkeypatch.setattr(nw0.config, "SOCKET_OPTIONS", {"SNDHWM" : 10})
+        monkeypatch.setattr(nw0.config, "SOCKET_IDLE_TIMEOUT_S", nw0.config.FOREVER)
+        settings = pickle.loads(pickle.dumps(nw0.core._config_settings()))
+        monkeypatch.setattr(nw0.config, "SOCKET_OPTIONS", {})
+        monkeypatch.setattr(nw0.config, "SOCKET_IDLE_TIMEOUT_S", 60)
+        nw0.core._apply_config_settings(settings)
+        assert nw0.config.SOCKET_OPTIONS == {"SNDHWM" : 10}
+        assert nw0.config.SOCKET_IDLE_TIMEOUT_S is nw0.config.FOREVER
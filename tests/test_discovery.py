@@ -120,6 +120,32 @@ def test_advertise_ttl(beacon):
     finally:
         nw0.discovery._resume()
 
+def advertised_names():
+    return [service.name for service in nw0.discovery._beacon._services_to_advertise]
+
+def test_advertise_withdrawn_if_handler_not_served(beacon):
+    service = uuid.uuid4().hex
+    address = nw0.core.address()
+    #
+    # Something else is already listening on the address
+    #
+    nw0.wait_for_message_from(address, wait_for_s=0)
+    with pytest.raises(nw0.SocketAlreadyExistsError):
+        nw0.advertise(service, address, handler=str.upper)
+    assert service not in advertised_names()
+    assert service not in nw0.discovery._services_advertised
+
+def test_advertise_withdrawn_if_forwarder_not_served(beacon):
+    service = uuid.uuid4().hex
+    address = nw0.core.address()
+    nw0.wait_for_message_from(address, wait_for_s=0)
+    with pytest.raises(nw0.SocketAlreadyExistsError):
+        nw0.advertise(service, address, forwarder=True)
+    publishers_name = nw0.forwarders.publishers_name(service)
+    for name in service, publishers_name:
+        assert name not in advertised_names()
+        assert name not in nw0.discovery._services_advertised
+
 def test_unadvertise(beacon):
     ttl_s = 2
     service = uuid.uuid4().hex
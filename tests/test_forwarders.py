@@ -0,0 +1,55 @@
+import threading
+import uuid
+
+import pytest
+
+import networkzero as nw0
+nw0.core._enable_debug_logging()
+
+@pytest.fixture(params=[False, True], ids=["thread", "process"])
+def forwarder(request):
+    forwarder = nw0.forwarders.serve(nw0.core.address(), use_process=request.param)
+    nw0.sockets._sockets.set_forwarder(forwarder.publishers_address)
+    yield forwarder
+    forwarder.stop()
+
+def wait_for_data(address, topic, data):
+    received = set()
+    while received != data:
+        in_topic, in_data = nw0.wait_for_news_from(address, topic, wait_for_s=5)
+        assert in_topic == topic
+        received.add(in_data)
+
+def test_news_from_many_publishers(forwarder):
+    topic = uuid.uuid4().hex
+    data = set(uuid.uuid4().hex for _ in range(3))
+    #
+    # Each publisher sends to the forwarder; the subscriber waits for
+    # news from the forwarder's other side, and each publisher keeps
+    # sending until the subscriber's subscription has reached it
+    #
+    stop = threading.Event()
+    def publish(item):
+        while not stop.is_set():
+            nw0.send_news_to(forwarder.publishers_address, topic, item)
+            stop.wait(0.05)
+    publishers = [threading.Thread(target=publish, args=(item,)) for item in data]
+    for publisher in publishers:
+        publisher.start()
+    try:
+        wait_for_data(forwarder.subscribers_address, topic, data)
+    finally:
+        stop.set()
+        for publisher in publishers:
+            publisher.join()
+
+def test_addresses_are_released_on_stop():
+    forwarder = nw0.forwarders.serve(nw0.core.address())
+    with pytest.raises(nw0.SocketAlreadyExistsError):
+        nw0.sockets.get_socket(forwarder.subscribers_address, "publisher")
+    forwarder.stop()
+    nw0.sockets.get_socket(forwarder.subscribers_address, "publisher")
+
+def test_advertise_with_handler_and_forwarder():
+    with pytest.raises(nw0.NetworkZeroError):
+        nw0.advertise(uuid.uuid4().hex, handler=str.upper, forwarder=True)
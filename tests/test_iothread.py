@@ -0,0 +1,244 @@
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import threading
+import time
+import uuid
+
+import pytest
+import zmq
+
+import networkzero as nw0
+nw0.core._enable_debug_logging()
+
+@pytest.fixture(autouse=True)
+def io_thread(monkeypatch):
+    monkeypatch.setattr(nw0.config, "USE_IO_THREAD", True)
+
+def support_echo(address, n_messages):
+    for _ in range(n_messages):
+        message = nw0.wait_for_message_from(address, wait_for_s=5)
+        nw0.send_reply_to(address, message)
+
+def test_send_message():
+    address = nw0.address()
+    message = uuid.uuid4().hex
+    thread = threading.Thread(target=support_echo, args=(address, 1))
+    thread.start()
+    assert nw0.send_message_to(address, message, wait_for_reply_s=5) == message
+    thread.join()
+
+def test_send_message_with_timeout():
+    address = nw0.address()
+    with pytest.raises(nw0.SocketTimedOutError):
+        nw0.send_message_to(address, wait_for_reply_s=0.1)
+
+def test_timed_out_message_not_delivered_late():
+    address = nw0.address()
+    message = uuid.uuid4().hex
+    with pytest.raises(nw0.SocketTimedOutError):
+        nw0.send_message_to(address, uuid.uuid4().hex, wait_for_reply_s=0.1)
+    thread = threading.Thread(target=support_echo, args=(address, 1))
+    thread.start()
+    assert nw0.send_message_to(address, message, wait_for_reply_s=5) == message
+    thread.join()
+    assert nw0.wait_for_message_from(address, wait_for_s=0.5) is None
+
+def test_wait_for_message_with_timeout():
+    address = nw0.address()
+    assert nw0.wait_for_message_from(address, wait_for_s=0.1) is None
+
+def test_message_after_timeout_reaches_next_wait():
+    address = nw0.address()
+    message = uuid.uuid4().hex
+    assert nw0.wait_for_message_from(address, wait_for_s=0.1) is None
+    replies = queue.Queue()
+    thread = threading.Thread(target=lambda: replies.put(nw0.send_message_to(address, message, wait_for_reply_s=5)))
+    thread.start()
+    assert nw0.wait_for_message_from(address, wait_for_s=5) == message
+    nw0.send_reply_to(address, message)
+    thread.join()
+    assert replies.get(timeout=5) == message
+
+def test_listener_served_by_many_threads():
+    address = nw0.address()
+    n_threads, n_messages = 4, 5
+    workers = [threading.Thread(target=support_echo, args=(address, n_messages)) for _ in range(n_threads)]
+    for worker in workers:
+        worker.start()
+    #
+    # Each sender waits for its reply, so send from as many threads as
+    # there are workers for all the workers to be busy at once
+    #
+    replies = queue.Queue()
+    def send(messages):
+        for message in messages:
+            replies.put((message, nw0.send_message_to(address, message, wait_for_reply_s=5)))
+    senders = [threading.Thread(target=send, args=([uuid.uuid4().hex for _ in range(n_messages)],)) for _ in range(n_threads)]
+    for sender in senders:
+        sender.start()
+    for thread in senders + workers:
+        thread.join()
+    assert replies.qsize() == n_threads * n_messages
+    while not replies.empty():
+        message, reply = replies.get()
+        assert message == reply
+
+def test_reply_from_another_thread():
+    address = nw0.address()
+    message = uuid.uuid4().hex
+    replies = queue.Queue()
+    sender = threading.Thread(target=lambda: replies.put(nw0.send_message_to(address, message, wait_for_reply_s=5)))
+    sender.start()
+    received, reply_handle = nw0.wait_for_message_from(address, wait_for_s=5, concurrent=True)
+    replier = threading.Thread(target=nw0.send_reply_to, args=(reply_handle, received))
+    replier.start()
+    for thread in sender, replier:
+        thread.join()
+    assert replies.get(timeout=5) == message
+
+def test_send_reply_without_message():
+    with pytest.raises(nw0.NetworkZeroError):
+        nw0.send_reply_to(nw0.address(), uuid.uuid4().hex)
+
+def test_send_news():
+    address = nw0.address()
+    topic = uuid.uuid4().hex
+    data = uuid.uuid4().hex
+    received = queue.Queue()
+    def subscribe():
+        received.put(nw0.wait_for_news_from(address, topic, wait_for_s=5))
+    thread = threading.Thread(target=subscribe)
+    thread.start()
+    while thread.is_alive():
+        nw0.send_news_to(address, topic, data)
+        thread.join(0.1)
+    assert received.get(timeout=5) == (topic, data)
+
+def test_send_news_batch_after_send_news(monkeypatch):
+    monkeypatch.setattr(nw0.config, "COLLECT_STATS", True)
+    address = nw0.address()
+    topic = uuid.uuid4().hex
+    #
+    # Both are sent through the publisher which the I/O thread binds here
+    #
+    nw0.send_news_to(address, "other", 1)
+    received = queue.Queue()
+    def subscribe():
+        received.put(nw0.wait_for_news_from(address, topic, wait_for_s=5))
+    thread = threading.Thread(target=subscribe)
+    thread.start()
+    while thread.is_alive():
+        assert nw0.send_news_batch(address, [(topic, 1), (topic, 2)]) == 2
+        thread.join(0.1)
+    assert received.get(timeout=5) == (topic, 1)
+    assert nw0.stats()[address]["publisher"]["messages_sent"] >= 3
+
+def test_news_kept_for_thread_not_waiting():
+    address = nw0.address()
+    topic_a = uuid.uuid4().hex
+    topic_b = uuid.uuid4().hex
+    nw0.send_news_to(address, "other", None)
+    #
+    # This thread subscribes to one topic and another thread waits for
+    # news with another while this one's news arrives
+    #
+    assert nw0.wait_for_news_from(address, topic_a, wait_for_s=0.1) == (None, None)
+    received = queue.Queue()
+    thread = threading.Thread(target=lambda: received.put(nw0.wait_for_news_from(address, topic_b, wait_for_s=5)))
+    thread.start()
+    time.sleep(0.5)
+    for n in range(10):
+        nw0.send_news_to(address, topic_a, n)
+    try:
+        for n in range(10):
+            assert nw0.wait_for_news_from(address, topic_a, wait_for_s=5) == (topic_a, n)
+    finally:
+        nw0.send_news_to(address, topic_b, None)
+        thread.join()
+    assert received.get(timeout=5) == (topic_b, None)
+
+def test_publisher_waiting_for_subscribers_holds_up_nobody(monkeypatch):
+    monkeypatch.setattr(nw0.config, "SLOW_JOINER_TIMEOUT_S", 2)
+    news_address = nw0.address()
+    address = nw0.address()
+    sent = threading.Event()
+    def publish():
+        nw0.send_news_to(news_address, "topic", None)
+        sent.set()
+    thread = threading.Thread(target=publish)
+    thread.start()
+    time.sleep(0.1)
+    #
+    # The publisher has no subscribers, so its news waits; this thread's
+    # request is carried out meanwhile
+    #
+    t0 = time.time()
+    assert nw0.wait_for_message_from(address, wait_for_s=0.1) is None
+    assert time.time() - t0 < 1
+    assert not sent.is_set()
+    thread.join()
+    assert sent.is_set()
+
+def test_wait_for_news_with_timeout():
+    assert nw0.wait_for_news_from(nw0.address(), wait_for_s=0.1) == (None, None)
+
+def test_request_id_handled_once():
+    address = nw0.address()
+    request_id = uuid.uuid4().hex
+    messages = queue.Queue()
+    def support_echo_until_quiet():
+        while True:
+            message = nw0.wait_for_message_from(address, wait_for_s=1)
+            messages.put(message)
+            if message is None:
+                break
+            nw0.send_reply_to(address, message)
+    thread = threading.Thread(target=support_echo_until_quiet)
+    thread.start()
+    assert nw0.send_message_to(address, "first", wait_for_reply_s=5, request_id=request_id) == "first"
+    assert nw0.send_message_to(address, "second", wait_for_reply_s=5, request_id=request_id) == "first"
+    thread.join()
+    assert [messages.get(), messages.get()] == ["first", None]
+
+def test_unreadable_message_answered():
+    address = nw0.address()
+    message = uuid.uuid4().hex
+    replies = queue.Queue()
+    def send():
+        replies.put(nw0.send_message_to(address, message, wait_for_reply_s=5, serialiser="pickle"))
+        replies.put(nw0.send_message_to(address, message, wait_for_reply_s=5))
+    thread = threading.Thread(target=send)
+    thread.start()
+    assert nw0.wait_for_message_from(address, wait_for_s=5) == message
+    nw0.send_reply_to(address, message)
+    thread.join()
+    assert [replies.get(timeout=5), replies.get(timeout=5)] == [None, message]
+
+def test_malformed_message_dropped():
+    address = nw0.address()
+    message = uuid.uuid4().hex
+    #
+    # Start listening so that the garbage is queued ahead of the message
+    #
+    assert nw0.wait_for_message_from(address, wait_for_s=0.1) is None
+    #
+    # A raw DEALER sends no empty delimiter frame so the listener can't
+    # find the routing envelope
+    #
+    peer = nw0.sockets.context.socket(zmq.DEALER)
+    peer.connect("tcp://%s" % address)
+    peer.send(b"garbage-without-delimiter")
+    time.sleep(0.2)
+    replies = queue.Queue()
+    thread = threading.Thread(target=lambda: replies.put(nw0.send_message_to(address, message, wait_for_reply_s=5)))
+    thread.start()
+    try:
+        assert nw0.wait_for_message_from(address, wait_for_s=5) == message
+        nw0.send_reply_to(address, message)
+        thread.join()
+    finally:
+        peer.close(linger=0)
+    assert replies.get(timeout=5) == message
+    assert nw0.iothread._io_sockets._io_thread.is_alive()
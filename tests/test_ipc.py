@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+import uuid
+
+import pytest
+import zmq
+
+import networkzero as nw0
+nw0.core._enable_debug_logging()
+
+pytestmark = pytest.mark.skipif(not zmq.has("ipc"), reason="ipc:// is not available")
+
+def support_echo(address):
+    message = nw0.wait_for_message_from(address, wait_for_s=5)
+    nw0.send_reply_to(address, message)
+
+def test_local_peer_uses_ipc():
+    address = nw0.core.address()
+    nw0.sockets.get_socket(address, "listener")
+    assert nw0.sockets._endpoint(address) == "ipc://%s" % nw0.sockets._ipc_path(address)
+
+def test_send_message_over_ipc():
+    address = nw0.core.address()
+    message = uuid.uuid4().hex
+    thread = threading.Thread(target=support_echo, args=(address,))
+    thread.start()
+    while not os.path.exists(nw0.sockets._ipc_path(address)):
+        thread.join(0.01)
+    assert nw0.send_message_to(address, message, wait_for_reply_s=5) == message
+    thread.join()
+
+def test_nothing_listening_uses_tcp():
+    address = nw0.core.address()
+    assert nw0.sockets._endpoint(address) == "tcp://%s" % address
+
+def test_stale_file_uses_tcp():
+    address = nw0.core.address()
+    path = nw0.sockets._ipc_path(address)
+    with open(path, "w"):
+        pass
+    try:
+        assert nw0.sockets._endpoint(address) == "tcp://%s" % address
+    finally:
+        os.remove(path)
+
+def test_remote_peer_uses_tcp():
+    address = "192.0.2.1:%d" % nw0.config.DYNAMIC_PORTS[0]
+    assert nw0.sockets._endpoint(address) == "tcp://%s" % address
+
+def test_ipc_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(nw0.config, "USE_IPC", False)
+    address = nw0.core.address()
+    nw0.sockets.get_socket(address, "listener")
+    assert not os.path.exists(nw0.sockets._ipc_path(address))
+    assert nw0.sockets._endpoint(address) == "tcp://%s" % address
+
+def test_ipc_file_removed_on_close():
+    address = nw0.core.address()
+    with nw0.sockets.context.socket(zmq.REP) as socket:
+        nw0.sockets._bind(socket, address)
+        assert os.path.exists(nw0.sockets._ipc_path(address))
+    #
+    # The socket is closed, & the file removed, by ZeroMQ's own I/O thread
+    #
+    t0 = time.time()
+    while os.path.exists(nw0.sockets._ipc_path(address)) and time.time() - t0 < 5:
+        time.sleep(0.01)
+    assert not os.path.exists(nw0.sockets._ipc_path(address))
+
+def test_ipc_needs_unix_sockets(monkeypatch):
+    monkeypatch.delattr(nw0.sockets._socket, "AF_UNIX")
+    address = nw0.core.address()
+    nw0.sockets.get_socket(address, "listener")
+    assert nw0.sockets._endpoint(address) == "tcp://%s" % address
+
+def test_ipc_directory_is_private():
+    address = nw0.core.address()
+    directory = os.path.dirname(nw0.sockets._ipc_path(address))
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    assert os.stat(directory).st_uid == os.getuid()
+
+def test_shared_ipc_directory_not_used(monkeypatch, tmp_path):
+    monkeypatch.setattr(nw0.sockets.tempfile, "tempdir", str(tmp_path))
+    directory = tmp_path / ("nw0-%d" % os.getuid())
+    directory.mkdir()
+    directory.chmod(0o777)
+    address = nw0.core.address()
+    assert nw0.sockets._ipc_path(address) is None
+    nw0.sockets.get_socket(address, "listener")
+    assert os.listdir(str(directory)) == []
+    assert nw0.sockets._endpoint(address) == "tcp://%s" % address
+
+def test_endpoint_of_another_user_uses_tcp(monkeypatch, tmp_path):
+    monkeypatch.setattr(nw0.config, "IPC_DIRECTORY", str(tmp_path))
+    address = nw0.core.address()
+    nw0.sockets.get_socket(address, "listener")
+    uid = os.getuid()
+    monkeypatch.setattr(os, "getuid", lambda: uid + 1)
+    assert nw0.sockets._endpoint(address) == "tcp://%s" % address
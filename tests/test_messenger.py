@@ -2,6 +2,7 @@ import sys
 import contextlib
 import io
 import logging
+import os
 try:
     import queue
 except ImportError:
@@ -53,6 +54,36 @@ class SupportThread(threading.Thread):
             message = nw0.sockets._unserialise(socket.recv())
             socket.send(nw0.sockets._serialise(message))
 
+    def support_test_send_message_to_with_serialiser(self, address, queue):
+        with self.context.socket(roles['listener']) as socket:
+            socket.bind("tcp://%s" % address)
+            message_bytes = socket.recv()
+            queue.put(message_bytes)
+            message, serialiser = nw0.serialisers.unserialise(message_bytes)
+            socket.send(nw0.sockets._serialise(message, serialiser))
+
+    def support_test_send_compressed_message_to(self, address, queue):
+        with self.context.socket(roles['listener']) as socket:
+            socket.bind("tcp://%s" % address)
+            message_bytes = socket.recv()
+            queue.put(message_bytes)
+            socket.send(nw0.sockets._serialise(nw0.sockets._unserialise(message_bytes)))
+
+    def support_test_send_message_to_after_silence(self, address):
+        #
+        # Ignore the first message, as though its reply had been lost,
+        # and reply to the next
+        #
+        with self.context.socket(roles['concurrent_listener']) as socket:
+            socket.bind("tcp://%s" % address)
+            socket.recv_multipart()
+            socket.send_multipart(socket.recv_multipart())
+
+    def support_test_send_binary_message_to(self, address):
+        with self.context.socket(roles['listener']) as socket:
+            socket.bind("tcp://%s" % address)
+            socket.send_multipart(socket.recv_multipart())
+
     def support_test_wait_for_message_from(self, address, message):
         with self.context.socket(roles['speaker']) as socket:
             socket.connect("tcp://%s" % address)
@@ -60,6 +91,32 @@ class SupportThread(threading.Thread):
             socket.send(nw0.sockets._serialise(message))
             socket.recv()
 
+    def support_test_wait_for_binary_message_from(self, address, message):
+        with self.context.socket(roles['speaker']) as socket:
+            socket.connect("tcp://%s" % address)
+            socket.send_multipart([nw0.sockets.BINARY_MARKER, message])
+            socket.recv()
+
+    def support_test_wait_for_message_after_unreadable_message(self, address, message, q):
+        #
+        # Pickle isn't accepted by default so the first message can't be
+        # unserialised by the listener
+        #
+        with self.context.socket(roles['speaker']) as socket:
+            socket.connect("tcp://%s" % address)
+            socket.send(nw0.sockets._serialise(message, "pickle"))
+            q.put(nw0.sockets._unserialise(socket.recv()))
+            socket.send(nw0.sockets._serialise(message))
+            q.put(nw0.sockets._unserialise(socket.recv()))
+
+    def support_test_wait_for_message_after_oversized_message(self, address, message, q):
+        with self.context.socket(roles['speaker']) as socket:
+            socket.connect("tcp://%s" % address)
+            socket.send(nw0.compressors.compress(nw0.serialisers.serialise([message] * 1000), "zlib"))
+            q.put(nw0.sockets._unserialise(socket.recv()))
+            socket.send(nw0.sockets._serialise(message))
+            q.put(nw0.sockets._unserialise(socket.recv()))
+
     def support_test_wait_for_message_from_with_autoreply(self, address, q):
         with self.context.socket(roles['speaker']) as socket:
             socket.connect("tcp://%s" % address)
@@ -76,6 +133,13 @@ class SupportThread(threading.Thread):
             reply = nw0.sockets._unserialise(socket.recv())
         queue.put(reply)
 
+    def support_test_send_reply_to_with_serialiser(self, address, serialiser, queue):
+        message = uuid.uuid4().hex
+        with self.context.socket(roles['speaker']) as socket:
+            socket.connect("tcp://%s" % address)
+            socket.send(nw0.sockets._serialise(message, serialiser))
+            queue.put(socket.recv())
+
     def support_test_send_news_to(self, address, topic, queue):
         with self.context.socket(roles['subscriber']) as socket:
             socket.connect("tcp://%s" % address)
@@ -100,6 +164,34 @@ class SupportThread(threading.Thread):
                 
             socket.send_multipart(nw0.sockets._serialise_for_pubsub(topic, data))
 
+    def support_test_wait_for_news_from_changed_prefix(self, address, topics, sync_queue):
+        with self.context.socket(roles['publisher']) as socket:
+            socket.bind("tcp://%s" % address)
+            while sync_queue.empty():
+                for topic in topics:
+                    socket.send_multipart(nw0.sockets._serialise_for_pubsub(topic, topic))
+                time.sleep(0.01)
+
+    def support_test_iter_news_from(self, address, topic, n_items, sync_queue):
+        with self.context.socket(roles['publisher']) as socket:
+            socket.bind("tcp://%s" % address)
+            while sync_queue.empty():
+                socket.send_multipart(nw0.sockets._serialise_for_pubsub(topic, None))
+                time.sleep(0.1)
+            for n in range(n_items):
+                socket.send_multipart(nw0.sockets._serialise_for_pubsub(topic, n))
+
+    def support_test_wait_for_conflated_news_from(self, address, prefix, sync_queue):
+        with self.context.socket(roles['publisher']) as socket:
+            socket.bind("tcp://%s" % address)
+            while sync_queue.empty():
+                socket.send_multipart(nw0.sockets._serialise_for_pubsub(prefix + "-ping", None))
+                time.sleep(0.1)
+            for n in range(100):
+                socket.send_multipart(nw0.sockets._serialise_for_pubsub(prefix + "-reading", n))
+                socket.send_multipart(nw0.sockets._serialise_for_pubsub(prefix + "-event", n))
+            socket.send_multipart(nw0.sockets._serialise_for_pubsub(prefix + "-end", None))
+
     def support_test_send_to_multiple_addresses(self, address1, address2):
         poller = zmq.Poller()
 
@@ -179,12 +271,240 @@ def test_send_message_with_timeout(support):
     with pytest.raises(nw0.core.SocketTimedOutError):
         nw0.send_message_to(address, wait_for_reply_s=1.0)
 
+def test_send_message_after_timeout(support):
+    address = nw0.core.address()
+    message = uuid.uuid4().hex
+    with pytest.raises(nw0.core.SocketTimedOutError):
+        nw0.send_message_to(address, wait_for_reply_s=0.2)
+    support.queue.put(("send_message_to", [address]))
+    reply = nw0.send_message_to(address, message, wait_for_reply_s=5)
+    assert reply == message
+
+def test_send_message_with_retries(support, monkeypatch):
+    monkeypatch.setattr(nw0.config, "SEND_RETRIES", 1)
+    address = nw0.core.address()
+    message = uuid.uuid4().hex
+    support.queue.put(("send_message_to_after_silence", [address]))
+    reply = nw0.send_message_to(address, message, wait_for_reply_s=0.5)
+    assert reply == message
+
+def test_send_message_retries_time_out(monkeypatch):
+    monkeypatch.setattr(nw0.config, "SEND_RETRIES", 2)
+    monkeypatch.setattr(nw0.config, "SEND_RETRY_BACKOFF", 2)
+    address = nw0.core.address()
+    with pytest.raises(nw0.core.SocketTimedOutError) as excinfo:
+        nw0.send_message_to(address, wait_for_reply_s=0.1)
+    assert excinfo.value.n_seconds == pytest.approx(0.1 + 0.2 + 0.4)
+    assert excinfo.value.n_attempts == 3
+    assert "3 attempts" in str(excinfo.value)
+
 def test_send_message_empty(support):
     address = nw0.core.address()
     support.queue.put(("send_message_to", [address]))
     reply = nw0.send_message_to(address)
     assert reply == nw0.messenger.EMPTY
 
+def test_send_message_with_serialiser(support):
+    address = nw0.core.address()
+    message = uuid.uuid4().hex
+    message_queue = queue.Queue()
+    nw0.config.ACCEPTED_SERIALISERS.add("pickle")
+    try:
+        support.queue.put(("send_message_to_with_serialiser", [address, message_queue]))
+        reply = nw0.send_message_to(address, message, serialiser="pickle")
+    finally:
+        nw0.config.ACCEPTED_SERIALISERS.discard("pickle")
+    assert reply == message
+    assert message_queue.get()[:1] == b"\x01"
+
+def test_send_compressed_message(support, monkeypatch):
+    monkeypatch.setattr(nw0.config, "COMPRESSOR", "zlib")
+    address = nw0.core.address()
+    message = [uuid.uuid4().hex] * 1000
+    message_queue = queue.Queue()
+    support.queue.put(("send_compressed_message_to", [address, message_queue]))
+    reply = nw0.send_message_to(address, message, wait_for_reply_s=5)
+    assert reply == message
+    assert message_queue.get()[:1] == b"\x10"
+
+def test_send_binary_message(support):
+    address = nw0.core.address()
+    message = uuid.uuid4().bytes
+    support.queue.put(("send_binary_message_to", [address]))
+    reply = nw0.send_message_to(address, bytearray(message), wait_for_reply_s=5)
+    assert reply == message
+
+def test_send_binary_message_without_copy(support):
+    address = nw0.core.address()
+    message = uuid.uuid4().bytes * 10000
+    support.queue.put(("send_binary_message_to", [address]))
+    reply = nw0.send_message_to(address, memoryview(message), wait_for_reply_s=5, copy=False)
+    assert isinstance(reply, memoryview)
+    assert reply.tobytes() == message
+
+def test_text_is_not_binary():
+    #
+    # On Python 2 a plain str is bytes too, but it's still sent as text
+    #
+    assert not nw0.sockets._is_binary(str("text"))
+    assert not nw0.sockets._is_binary(u"text")
+    assert nw0.sockets._is_binary(bytearray(b"binary"))
+    assert nw0.sockets._is_binary(memoryview(b"binary"))
+
+#
+# Request ids
+#
+def support_count_and_reply(address, handled, delay_s=0):
+    while True:
+        message = nw0.wait_for_message_from(address, wait_for_s=1)
+        if message is None:
+            break
+        handled.append(message)
+        time.sleep(delay_s)
+        nw0.send_reply_to(address, [message, len(handled)])
+
+def test_send_message_with_request_id_handled_once():
+    address = nw0.core.address()
+    request_id = uuid.uuid4().hex
+    handled = []
+    thread = threading.Thread(target=support_count_and_reply, args=(address, handled))
+    thread.start()
+    reply = nw0.send_message_to(address, "first", wait_for_reply_s=5, request_id=request_id)
+    assert nw0.send_message_to(address, "second", wait_for_reply_s=5, request_id=request_id) == reply
+    thread.join()
+    assert reply == ["first", 1]
+    assert handled == ["first"]
+
+def test_send_messages_with_different_request_ids():
+    address = nw0.core.address()
+    handled = []
+    thread = threading.Thread(target=support_count_and_reply, args=(address, handled))
+    thread.start()
+    assert nw0.send_message_to(address, "first", wait_for_reply_s=5, request_id=b"1") == ["first", 1]
+    assert nw0.send_message_to(address, "second", wait_for_reply_s=5, request_id=b"2") == ["second", 2]
+    thread.join()
+
+def test_retry_with_request_id_handled_once(monkeypatch):
+    monkeypatch.setattr(nw0.config, "SEND_RETRIES", 1)
+    address = nw0.core.address()
+    handled = []
+    thread = threading.Thread(target=support_count_and_reply, args=(address, handled, 0.4))
+    thread.start()
+    #
+    # The message is sent again after 0.3s while the first is still being
+    # handled; once it's handled the second is answered from the cache
+    #
+    reply = nw0.send_message_to(address, "message", wait_for_reply_s=0.3, request_id=uuid.uuid4().hex)
+    thread.join()
+    assert reply == ["message", 1]
+    assert handled == ["message"]
+
+def test_request_id_without_reply_cache(monkeypatch):
+    monkeypatch.setattr(nw0.config, "REPLY_CACHE_SIZE", 0)
+    address = nw0.core.address()
+    request_id = uuid.uuid4().hex
+    handled = []
+    thread = threading.Thread(target=support_count_and_reply, args=(address, handled))
+    thread.start()
+    assert nw0.send_message_to(address, "first", wait_for_reply_s=5, request_id=request_id) == ["first", 1]
+    assert nw0.send_message_to(address, "second", wait_for_reply_s=5, request_id=request_id) == ["second", 2]
+    thread.join()
+
+def test_concurrent_duplicate_answered_with_first():
+    address = nw0.core.address()
+    request_id = uuid.uuid4().hex
+    replies = queue.Queue()
+    def send():
+        replies.put(nw0.send_message_to(address, "message", wait_for_reply_s=5, request_id=request_id))
+    first = threading.Thread(target=send)
+    first.start()
+    message, reply_handle = nw0.wait_for_message_from(address, wait_for_s=5, concurrent=True)
+    second = threading.Thread(target=send)
+    second.start()
+    #
+    # The second message is held until the first is answered
+    #
+    assert nw0.wait_for_message_from(address, wait_for_s=0.5, concurrent=True) == (None, None)
+    nw0.send_reply_to(reply_handle, message.upper())
+    first.join()
+    second.join()
+    assert [replies.get(timeout=5), replies.get(timeout=5)] == ["MESSAGE", "MESSAGE"]
+
+def test_reply_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(nw0.config, "REPLY_CACHE_SIZE", 2)
+    reply_cache = nw0.sockets._ReplyCache(nw0.config.REPLY_CACHE_SIZE)
+    for request_id in (b"1", b"2", b"3"):
+        assert reply_cache.start(request_id) == (None, True)
+        reply_cache.finish(request_id, [request_id])
+    assert reply_cache.start(b"1") == (None, True)
+    assert reply_cache.start(b"3") == ([b"3"], False)
+
+def test_reply_cache_forgets_messages_never_replied_to():
+    reply_cache = nw0.sockets._ReplyCache(2)
+    for request_id in (b"1", b"2", b"3"):
+        assert reply_cache.start(request_id, [b"envelope"]) == (None, True)
+    assert len(reply_cache._pending) == 2
+    #
+    # The oldest has been forgotten, so the same message is handled again
+    #
+    assert reply_cache.start(b"1", [b"envelope"]) == (None, True)
+    assert reply_cache.start(b"3", [b"envelope"]) == (None, False)
+
+def test_reply_cache_forgets_messages_not_handled():
+    reply_cache = nw0.sockets._ReplyCache(2)
+    assert reply_cache.start(b"1", [b"envelope"]) == (None, True)
+    assert reply_cache.start(b"1", [b"other"]) == (None, False)
+    assert reply_cache.forget(b"1") == [[b"other"]]
+    assert reply_cache.start(b"1") == (None, True)
+
+def test_reply_cache_keeps_replies_sent_again():
+    reply_cache = nw0.sockets._ReplyCache(2)
+    for request_id in (b"1", b"2"):
+        reply_cache.start(request_id)
+        reply_cache.finish(request_id, [request_id])
+    assert reply_cache.start(b"1") == ([b"1"], False)
+    reply_cache.start(b"3")
+    reply_cache.finish(b"3", [b"3"])
+    assert reply_cache.start(b"1") == ([b"1"], False)
+    assert reply_cache.start(b"2") == (None, True)
+
+#
+# send_messages_to
+#
+def support_echo(address, n_messages):
+    for _ in range(n_messages):
+        message = nw0.wait_for_message_from(address, wait_for_s=5)
+        nw0.send_reply_to(address, message)
+
+def support_echo_in_reverse(address, n_messages, batch_size):
+    for _ in range(n_messages // batch_size):
+        received = [nw0.wait_for_message_from(address, wait_for_s=5, concurrent=True) for _ in range(batch_size)]
+        for message, reply_handle in reversed(received):
+            nw0.send_reply_to(reply_handle, message)
+
+def test_send_messages():
+    address = nw0.core.address()
+    messages = [uuid.uuid4().hex for _ in range(20)]
+    thread = threading.Thread(target=support_echo, args=(address, len(messages)))
+    thread.start()
+    replies = list(nw0.send_messages_to(address, messages, window=5, wait_for_reply_s=5))
+    thread.join()
+    assert replies == messages
+
+def test_send_messages_replies_in_order():
+    address = nw0.core.address()
+    messages = [uuid.uuid4().hex for _ in range(20)]
+    thread = threading.Thread(target=support_echo_in_reverse, args=(address, len(messages), 4))
+    thread.start()
+    replies = list(nw0.send_messages_to(address, messages, window=4, wait_for_reply_s=5))
+    thread.join()
+    assert replies == messages
+
+def test_send_messages_with_timeout():
+    address = nw0.core.address()
+    with pytest.raises(nw0.core.SocketTimedOutError):
+        list(nw0.send_messages_to(address, ["a", "b"], wait_for_reply_s=0.1))
+
 #
 # wait_for_message_from
 #
@@ -197,11 +517,73 @@ def test_wait_for_message(support):
     assert message_received == message_sent
     nw0.send_reply_to(address, message_received)
 
+def test_wait_for_binary_message(support):
+    address = nw0.core.address()
+    message_sent = uuid.uuid4().bytes
+    support.queue.put(("wait_for_binary_message_from", [address, message_sent]))
+    message_received = nw0.wait_for_message_from(address, wait_for_s=5)
+    assert message_received == message_sent
+    nw0.send_reply_to(address, message_received)
+
+def test_wait_for_message_after_unreadable_message(support):
+    address = nw0.core.address()
+    message_sent = uuid.uuid4().hex
+    reply_queue = queue.Queue()
+    support.queue.put(("wait_for_message_after_unreadable_message", [address, message_sent, reply_queue]))
+    message_received = nw0.wait_for_message_from(address, wait_for_s=5)
+    assert message_received == message_sent
+    nw0.send_reply_to(address, message_received.upper())
+    assert reply_queue.get(timeout=5) is None
+    assert reply_queue.get(timeout=5) == message_sent.upper()
+
+def test_wait_for_message_after_oversized_message(support, monkeypatch):
+    monkeypatch.setattr(nw0.config, "MAX_DECOMPRESSED_SIZE", 1000)
+    address = nw0.core.address()
+    message_sent = uuid.uuid4().hex
+    reply_queue = queue.Queue()
+    support.queue.put(("wait_for_message_after_oversized_message", [address, message_sent, reply_queue]))
+    message_received = nw0.wait_for_message_from(address, wait_for_s=5)
+    assert message_received == message_sent
+    nw0.send_reply_to(address, message_received.upper())
+    assert reply_queue.get(timeout=5) is None
+    assert reply_queue.get(timeout=5) == message_sent.upper()
+
 def test_wait_for_message_with_timeout():
     address = nw0.core.address()
     message = nw0.wait_for_message_from(address, wait_for_s=0.1)
     assert message is None
 
+def test_wait_for_message_with_short_timeout():
+    address = nw0.core.address()
+    t0 = time.time()
+    message = nw0.wait_for_message_from(address, wait_for_s=0.05)
+    assert message is None
+    assert time.time() - t0 < 0.4
+
+def test_poller_is_reused():
+    address = nw0.core.address()
+    nw0.wait_for_message_from(address, wait_for_s=0)
+    socket = nw0.sockets.get_socket(address, "listener")
+    poller = socket._poller
+    nw0.wait_for_message_from(address, wait_for_s=0)
+    assert socket._poller is poller
+
+def test_only_main_thread_poller_watches_waker():
+    address = nw0.core.address()
+    nw0.wait_for_message_from(address, wait_for_s=0)
+    pollers = queue.Queue()
+    def wait_in_thread():
+        other_address = nw0.core.address()
+        nw0.wait_for_message_from(other_address, wait_for_s=0)
+        pollers.put(nw0.sockets.get_socket(other_address, "listener")._poller)
+    thread = threading.Thread(target=wait_in_thread)
+    thread.start()
+    thread.join()
+    waker = nw0.sockets._waker.reader
+    if waker is not None:
+        assert waker in [s for s, _ in nw0.sockets.get_socket(address, "listener")._poller.sockets]
+    assert len(pollers.get().sockets) == 1
+
 def test_wait_for_message_with_autoreply(support):
     address = nw0.core.address()
     reply_queue = queue.Queue()
@@ -209,6 +591,42 @@ def test_wait_for_message_with_autoreply(support):
     nw0.wait_for_message_from(address, autoreply=True)
     assert reply_queue.get() == nw0.messenger.EMPTY
     
+def test_reply_uses_serialiser_of_message(support):
+    address = nw0.core.address()
+    reply_queue = queue.Queue()
+    nw0.config.ACCEPTED_SERIALISERS.add("pickle")
+    try:
+        support.queue.put(("send_reply_to_with_serialiser", [address, "pickle", reply_queue]))
+        message_received = nw0.wait_for_message_from(address, wait_for_s=5)
+        nw0.send_reply_to(address, message_received)
+        reply_bytes = reply_queue.get()
+    finally:
+        nw0.config.ACCEPTED_SERIALISERS.discard("pickle")
+    assert reply_bytes[:1] == b"\x01"
+
+def test_wait_for_concurrent_messages():
+    address = nw0.core.address()
+    messages = [uuid.uuid4().hex for _ in range(3)]
+    reply_queue = queue.Queue()
+    def send(message):
+        reply_queue.put((message, nw0.send_message_to(address, message, wait_for_reply_s=5)))
+    threads = [threading.Thread(target=send, args=(message,)) for message in messages]
+    for thread in threads:
+        thread.start()
+
+    received = [nw0.wait_for_message_from(address, wait_for_s=5, concurrent=True) for _ in messages]
+    assert sorted(message for (message, _) in received) == sorted(messages)
+    for message, reply_handle in reversed(received):
+        nw0.send_reply_to(reply_handle, message.upper())
+    for thread in threads:
+        thread.join()
+    replies = [reply_queue.get() for _ in messages]
+    assert all(reply == message.upper() for (message, reply) in replies)
+
+def test_wait_for_concurrent_message_with_timeout():
+    address = nw0.core.address()
+    assert nw0.wait_for_message_from(address, wait_for_s=0.1, concurrent=True) == (None, None)
+
 #
 # send_reply_to
 #
@@ -247,6 +665,51 @@ def test_send_news(support):
     
     assert in_topic, in_data == (topic, data)
 
+def test_first_news_reaches_subscriber():
+    address = nw0.core.address()
+    topic = uuid.uuid4().hex
+    data = uuid.uuid4().hex
+    news = queue.Queue()
+
+    subscriber = threading.Thread(target=lambda: news.put(nw0.wait_for_news_from(address, topic, wait_for_s=5)))
+    subscriber.daemon = True
+    subscriber.start()
+    nw0.send_news_to(address, topic, data)
+
+    assert news.get(timeout=5) == (topic, data)
+
+def test_send_news_batch():
+    address = nw0.core.address()
+    topic = uuid.uuid4().hex
+    n_items = 100
+    received = queue.Queue()
+
+    def subscribe():
+        for in_topic, in_data in nw0.iter_news_from(address, topic, wait_for_s=5):
+            received.put(in_data)
+    subscriber = threading.Thread(target=subscribe)
+    subscriber.daemon = True
+    subscriber.start()
+
+    assert nw0.send_news_batch(address, [(topic, n) for n in range(n_items)]) == n_items
+    assert [received.get(timeout=5) for _ in range(n_items)] == list(range(n_items))
+
+def test_send_news_batch_stops_at_high_water_mark():
+    address = nw0.core.address()
+    topic = uuid.uuid4().hex
+    n_items = 10000
+    nw0.set_news_policy(address, hwm=10)
+    #
+    # A subscriber which never reads its news
+    #
+    with nw0.sockets.context.socket(roles['subscriber']) as socket:
+        socket.set(zmq.RCVHWM, 10)
+        socket.connect("tcp://%s" % address)
+        socket.subscribe = topic.encode("utf-8")
+        data = b"x" * 10000
+        n_sent = nw0.send_news_batch(address, [(topic, data)] * n_items)
+    assert 0 < n_sent < n_items
+
 #
 # wait_for_news_from
 #
@@ -269,6 +732,282 @@ def test_wait_for_news(support):
 # intuitive. (It does a round-robin selection which is useful
 # for things like load-scheduling but not for broadcasting).
 #
+def test_wait_for_news_after_changing_prefix(support):
+    address = nw0.core.address()
+    topic1 = uuid.uuid4().hex
+    topic2 = uuid.uuid4().hex
+    sync_queue = queue.Queue()
+
+    support.queue.put(("wait_for_news_from_changed_prefix", [address, [topic1, topic2], sync_queue]))
+    try:
+        assert nw0.wait_for_news_from(address, topic1, wait_for_s=5) == (topic1, topic1)
+        for _ in range(10):
+            assert nw0.wait_for_news_from(address, topic2, wait_for_s=5) == (topic2, topic2)
+    finally:
+        sync_queue.put(True)
+    socket = nw0.sockets.get_socket([address], "subscriber")
+    assert socket._prefixes == {topic2.encode(nw0.config.ENCODING)}
+
+def test_wait_for_conflated_news(support):
+    address = nw0.core.address()
+    prefix = uuid.uuid4().hex
+    sync_queue = queue.Queue()
+    nw0.set_news_policy(address, conflate=prefix + "-reading")
+
+    support.queue.put(("wait_for_conflated_news_from", [address, prefix, sync_queue]))
+    in_topic, in_data = nw0.wait_for_news_from(address, prefix, wait_for_s=5)
+    sync_queue.put(True)
+    #
+    # Give the news time to arrive so that all of it is queued
+    #
+    time.sleep(0.5)
+    readings, events = [], []
+    while in_topic != prefix + "-end":
+        in_topic, in_data = nw0.wait_for_news_from(address, prefix, wait_for_s=5)
+        if in_topic == prefix + "-reading":
+            readings.append(in_data)
+        elif in_topic == prefix + "-event":
+            events.append(in_data)
+    assert readings == [99]
+    assert events == list(range(100))
+
+def test_conflated_news_is_latest_across_drains():
+    address = nw0.core.address()
+    prefix = uuid.uuid4().hex
+    nw0.set_news_policy(address, conflate=prefix + "-reading")
+    #
+    # Subscribe before anything is published so that nothing is missed
+    #
+    assert nw0.wait_for_news_from(address, prefix, wait_for_s=0) == (None, None)
+    nw0.send_news_to(address, prefix + "-event", 1)
+    for n in range(5):
+        nw0.send_news_to(address, prefix + "-reading", n)
+    time.sleep(0.5)
+    #
+    # Taking the event drains the readings which arrived with it; newer
+    # readings arriving afterwards must replace them
+    #
+    assert nw0.wait_for_news_from(address, prefix, wait_for_s=5) == (prefix + "-event", 1)
+    for n in range(5, 10):
+        nw0.send_news_to(address, prefix + "-reading", n)
+    time.sleep(0.5)
+    assert nw0.wait_for_news_from(address, prefix, wait_for_s=5) == (prefix + "-reading", 9)
+    assert nw0.wait_for_news_from(address, prefix, wait_for_s=0.5) == (None, None)
+
+def test_news_high_water_mark():
+    address = nw0.core.address()
+    nw0.set_news_policy(address, hwm=10)
+    assert nw0.sockets.get_socket(address, "publisher").get(zmq.SNDHWM) == 10
+    assert nw0.sockets.get_socket([address], "subscriber").get(zmq.RCVHWM) == 10
+
+def test_cached_news_reaches_late_subscribers():
+    address = nw0.core.address()
+    topic = uuid.uuid4().hex
+    nw0.set_news_policy(address, cache=True)
+    nw0.send_news_to(address, topic, 1)
+    nw0.send_news_to(address, topic, 2)
+    nw0.send_news_to(address, topic + "-other", 3)
+    #
+    # Two subscribers in separate threads subscribe, one after the
+    # other, to the same topic; each should get its latest news
+    #
+    for _ in range(2):
+        news = queue.Queue()
+        subscriber = threading.Thread(target=lambda: news.put(nw0.wait_for_news_from(address, topic, wait_for_s=5)))
+        subscriber.daemon = True
+        subscriber.start()
+        assert news.get(timeout=5) == (topic, 2)
+
+def test_news_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(nw0.config, "NEWS_CACHE_SIZE", 2)
+    news_cache = nw0.sockets._NewsCache(nw0.core.address())
+    try:
+        for topic in (b"1", b"2", b"1", b"3"):
+            news_cache._keep([topic, topic])
+        assert list(news_cache.latest) == [b"1", b"3"]
+    finally:
+        news_cache._close()
+
+#
+# iter_news_from
+#
+def test_iter_news(support):
+    address = nw0.core.address()
+    topic = uuid.uuid4().hex
+    n_items = 100
+    sync_queue = queue.Queue()
+
+    support.queue.put(("iter_news_from", [address, topic, n_items, sync_queue]))
+    received = []
+    for in_topic, in_data in nw0.iter_news_from(address, topic, wait_for_s=5):
+        assert in_topic == topic
+        sync_queue.put(True)
+        if in_data is not None:
+            received.append(in_data)
+        if len(received) == n_items:
+            break
+    assert received == list(range(n_items))
+
+def test_iter_news_in_batches(support):
+    address = nw0.core.address()
+    topic = uuid.uuid4().hex
+    n_items = 100
+    sync_queue = queue.Queue()
+
+    support.queue.put(("iter_news_from", [address, topic, n_items, sync_queue]))
+    received = []
+    for batch in nw0.iter_news_from(address, topic, wait_for_s=5, batch=10):
+        assert 1 <= len(batch) <= 10
+        sync_queue.put(True)
+        received.extend(in_data for in_topic, in_data in batch if in_data is not None)
+        if len(received) == n_items:
+            break
+    assert received == list(range(n_items))
+
+def test_iter_news_with_timeout():
+    address = nw0.core.address()
+    assert list(nw0.iter_news_from(address, wait_for_s=0.1)) == []
+
+#
+# Files & streams
+#
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(nw0.config, "STREAM_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(nw0.config, "STREAM_WINDOW", 2)
+
+def support_send_file_to(address, path, results):
+    results.put(nw0.send_file_to(address, path, wait_for_s=5))
+
+def test_send_file(tmp_path, small_chunks):
+    address = nw0.core.address()
+    data = os.urandom(10 * 1024 + 100)
+    sent_path = tmp_path / "sent"
+    received_path = tmp_path / "received"
+    sent_path.write_bytes(data)
+    results = queue.Queue()
+    thread = threading.Thread(target=support_send_file_to, args=(address, str(sent_path), results))
+    thread.start()
+    n_bytes = nw0.receive_file_from(address, str(received_path), wait_for_s=5)
+    thread.join()
+    assert n_bytes == results.get() == len(data)
+    assert received_path.read_bytes() == data
+
+def test_send_empty_file(tmp_path):
+    address = nw0.core.address()
+    sent_path = tmp_path / "sent"
+    received_path = tmp_path / "received"
+    sent_path.write_bytes(b"")
+    results = queue.Queue()
+    thread = threading.Thread(target=support_send_file_to, args=(address, str(sent_path), results))
+    thread.start()
+    assert nw0.receive_file_from(address, str(received_path), wait_for_s=5) == 0
+    thread.join()
+    assert received_path.read_bytes() == b""
+
+def test_receive_file_with_timeout(tmp_path):
+    address = nw0.core.address()
+    path = tmp_path / "received"
+    assert nw0.receive_file_from(address, str(path), wait_for_s=0.1) is None
+    assert not path.exists()
+
+def test_receive_file_left_unfinished(tmp_path):
+    address = nw0.core.address()
+    path = tmp_path / "received"
+    #
+    # Start listening, then start a stream which goes quiet part way through
+    #
+    assert nw0.receive_file_from(address, str(path), wait_for_s=0.1) is None
+    peer = nw0.sockets.context.socket(zmq.DEALER)
+    peer.connect("tcp://%s" % address)
+    try:
+        stream_id = uuid.uuid4().bytes
+        peer.send_multipart([b"", stream_id, b"start"])
+        peer.send_multipart([b"", stream_id, b"data", b"partial"])
+        with pytest.raises(nw0.core.SocketTimedOutError):
+            nw0.receive_file_from(address, str(path), wait_for_s=0.5)
+    finally:
+        peer.close(linger=0)
+    assert list(tmp_path.iterdir()) == []
+
+def test_malformed_stream_frames_dropped(tmp_path):
+    address = nw0.core.address()
+    data = os.urandom(1024)
+    sent_path = tmp_path / "sent"
+    received_path = tmp_path / "received"
+    sent_path.write_bytes(data)
+    assert nw0.receive_file_from(address, str(received_path), wait_for_s=0.1) is None
+    peer = nw0.sockets.context.socket(zmq.DEALER)
+    peer.connect("tcp://%s" % address)
+    try:
+        peer.send_multipart([b"", b"too-short"])
+        peer.send(b"no-delimiter")
+        time.sleep(0.2)
+        results = queue.Queue()
+        thread = threading.Thread(target=support_send_file_to, args=(address, str(sent_path), results))
+        thread.start()
+        assert nw0.receive_file_from(address, str(received_path), wait_for_s=5) == len(data)
+        thread.join()
+    finally:
+        peer.close(linger=0)
+    assert received_path.read_bytes() == data
+
+def test_send_stream_is_flow_controlled(small_chunks):
+    address = nw0.core.address()
+    chunks = [uuid.uuid4().bytes for _ in range(20)]
+    n_taken = []
+    def generate():
+        for n, chunk in enumerate(chunks):
+            n_taken.append(n)
+            yield chunk
+    results = queue.Queue()
+    thread = threading.Thread(target=lambda: results.put(nw0.send_stream_to(address, generate(), wait_for_s=5)))
+    thread.start()
+    received = []
+    for chunk in nw0.iter_stream_from(address, wait_for_s=5):
+        received.append(chunk)
+        time.sleep(0.01)
+        #
+        # The sender can only have taken the chunks received so far and
+        # those in the window it has credit for, plus one it's waiting to send
+        #
+        assert len(n_taken) <= len(received) + nw0.config.STREAM_WINDOW + 1
+    thread.join()
+    assert received == chunks
+    assert results.get() == sum(len(chunk) for chunk in chunks)
+
+def test_send_stream_cancelled_by_receiver(small_chunks):
+    address = nw0.core.address()
+    chunks = [uuid.uuid4().bytes for _ in range(20)]
+    results = queue.Queue()
+    def send():
+        try:
+            nw0.send_stream_to(address, chunks)
+        except nw0.NetworkZeroError as exc:
+            results.put(exc)
+    thread = threading.Thread(target=send)
+    thread.daemon = True
+    thread.start()
+    stream = nw0.iter_stream_from(address, wait_for_s=5)
+    assert next(stream) == chunks[0]
+    stream.close()
+    #
+    # The sender, which would otherwise wait forever for credit, gives up
+    #
+    thread.join(5)
+    assert not thread.is_alive()
+    assert isinstance(results.get(timeout=1), nw0.NetworkZeroError)
+
+def test_send_stream_with_timeout():
+    address = nw0.core.address()
+    with pytest.raises(nw0.core.SocketTimedOutError):
+        nw0.send_stream_to(address, [b"x"], wait_for_s=0.1)
+
+def test_send_stream_of_text_is_refused():
+    address = nw0.core.address()
+    with pytest.raises(nw0.NetworkZeroError):
+        nw0.send_stream_to(address, ["x"], wait_for_s=0.1)
+
 def test_send_to_multiple_addresses(support):
     address1 = nw0.core.address()
     address2 = nw0.core.address()
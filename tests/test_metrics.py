@@ -0,0 +1,157 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+import networkzero as nw0
+nw0.core._enable_debug_logging()
+
+@pytest.fixture(autouse=True)
+def collect_stats(monkeypatch):
+    monkeypatch.setattr(nw0.config, "COLLECT_STATS", True)
+
+def support_echo(address, n_messages):
+    for _ in range(n_messages):
+        message = nw0.wait_for_message_from(address, wait_for_s=5)
+        nw0.send_reply_to(address, message)
+
+def test_messages_counted():
+    address = nw0.address()
+    message = uuid.uuid4().hex
+    thread = threading.Thread(target=support_echo, args=(address, 3))
+    thread.start()
+    for _ in range(3):
+        nw0.send_message_to(address, message, wait_for_reply_s=5)
+    thread.join()
+
+    stats = nw0.stats()[address]
+    speaker, listener = stats["speaker"], stats["listener"]
+    assert speaker["messages_sent"] == speaker["messages_received"] == 3
+    assert listener["messages_sent"] == listener["messages_received"] == 3
+    #
+    # JSON serialises the message with a pair of quotes
+    #
+    assert speaker["bytes_sent"] == listener["bytes_received"] == 3 * (2 + len(message))
+    assert speaker["round_trip"]["count"] == 3
+    assert 0 < speaker["round_trip"]["min_s"] <= speaker["round_trip"]["p50_s"] <= speaker["round_trip"]["max_s"]
+    assert speaker["serialise"]["count"] == 6
+
+def test_binary_message_bytes_counted():
+    address = nw0.address()
+    message = bytearray(1000)
+    thread = threading.Thread(target=support_echo, args=(address, 1))
+    thread.start()
+    nw0.send_message_to(address, memoryview(message), wait_for_reply_s=5)
+    thread.join()
+    #
+    # Binary data is sent after a one-byte marker
+    #
+    assert nw0.stats()[address]["speaker"]["bytes_sent"] == 1 + 1000
+
+def test_timeouts_and_retries_counted(monkeypatch):
+    monkeypatch.setattr(nw0.config, "SEND_RETRIES", 2)
+    address = nw0.address()
+    with pytest.raises(nw0.SocketTimedOutError):
+        nw0.send_message_to(address, wait_for_reply_s=0.05)
+    speaker = nw0.stats()[address]["speaker"]
+    assert speaker["messages_sent"] == 3
+    assert speaker["timeouts"] == 3
+    assert speaker["retries"] == 2
+    assert speaker["round_trip"]["count"] == 0
+    assert speaker["round_trip"]["p99_s"] is None
+
+def test_wait_for_message_timeout_counted():
+    address = nw0.address()
+    assert nw0.wait_for_message_from(address, wait_for_s=0.05) is None
+    assert nw0.stats()[address]["listener"]["timeouts"] == 1
+
+def test_news_counted():
+    address = nw0.address()
+    topic = uuid.uuid4().hex
+    def publish():
+        for n in range(10):
+            nw0.send_news_to(address, topic, n)
+    thread = threading.Thread(target=publish)
+    thread.start()
+    for _ in range(10):
+        assert nw0.wait_for_news_from(address, topic, wait_for_s=5)[0] == topic
+    thread.join()
+
+    stats = nw0.stats()[address]
+    assert stats["publisher"]["messages_sent"] >= 10
+    assert stats["subscriber"]["messages_received"] == 10
+
+def test_stats_of_finished_threads_kept():
+    address = nw0.address()
+    thread = threading.Thread(target=nw0.wait_for_message_from, args=(address,), kwargs={"wait_for_s" : 0.05})
+    thread.start()
+    thread.join()
+    assert nw0.stats()[address]["listener"]["timeouts"] == 1
+    assert nw0.stats()[address]["listener"]["timeouts"] == 1
+
+def test_reset_stats():
+    address = nw0.address()
+    nw0.wait_for_message_from(address, wait_for_s=0.01)
+    assert address in nw0.stats(reset=True)
+    assert address not in nw0.stats()
+    nw0.wait_for_message_from(address, wait_for_s=0.01)
+    nw0.reset_stats()
+    assert address not in nw0.stats()
+
+def test_reset_stats_while_another_thread_counts():
+    address = nw0.address()
+    waiting, finished = threading.Event(), threading.Event()
+    def count_timeouts():
+        nw0.wait_for_message_from(address, wait_for_s=0.01)
+        waiting.set()
+        #
+        # The stats are reset during this wait, so its timeout is counted
+        # after the reset by a thread which is still running
+        #
+        nw0.wait_for_message_from(address, wait_for_s=0.5)
+        finished.set()
+        time.sleep(0.5)
+    thread = threading.Thread(target=count_timeouts)
+    thread.start()
+    waiting.wait(5)
+    time.sleep(0.1)
+    reset_info = nw0.stats(reset=True)
+    finished.wait(5)
+    try:
+        assert reset_info[address]["listener"]["timeouts"] == 1
+        assert nw0.stats()[address]["listener"]["timeouts"] == 1
+    finally:
+        thread.join()
+
+def test_stats_not_collected(monkeypatch):
+    monkeypatch.setattr(nw0.config, "COLLECT_STATS", False)
+    address = nw0.address()
+    nw0.wait_for_message_from(address, wait_for_s=0.01)
+    assert address not in nw0.stats()
+
+def test_io_thread_counted(monkeypatch):
+    monkeypatch.setattr(nw0.config, "USE_IO_THREAD", True)
+    address = nw0.address()
+    thread = threading.Thread(target=support_echo, args=(address, 1))
+    thread.start()
+    nw0.send_message_to(address, "hello", wait_for_reply_s=5)
+    thread.join()
+    stats = nw0.stats()[address]
+    assert stats["speaker"]["messages_sent"] == stats["speaker"]["round_trip"]["count"] == 1
+    assert stats["listener"]["messages_received"] == 1
+
+def test_histogram_percentiles():
+    histogram = nw0.metrics._Histogram()
+    for n in range(1, 101):
+        histogram.record(n / 1e3)
+    info = histogram.as_dict()
+    assert info["count"] == 100
+    assert info["min_s"] == 0.001
+    assert info["max_s"] == 0.1
+    #
+    # Each percentile is an upper bound, within a factor of two
+    #
+    assert 0.05 <= info["p50_s"] < 0.1
+    assert 0.09 <= info["p90_s"] <= 0.1
+    assert 0.099 <= info["p99_s"] <= 0.1
@@ -7,9 +7,12 @@ nw0.core._enable_debug_logging()
 
 def test_import_all_relevant_names():
     all_names = {
-        "advertise", "discover", "discover_all", "discover_group",
-        "send_message_to", "wait_for_message_from", "send_reply_to", 
-        "send_news_to", "wait_for_news_from",
+        "advertise", "discover", "discover_all", "discover_group", "discover_forwarder",
+        "send_message_to", "send_messages_to", "wait_for_message_from", "send_reply_to", 
+        "send_news_to", "send_news_batch", "wait_for_news_from", "iter_news_from",
+        "send_stream_to", "iter_stream_from", "send_file_to", "receive_file_from",
+        "set_serialiser", "set_news_policy",
+        "stats", "reset_stats",
         "action_and_params", "address",
         "bytes_to_string", "string_to_bytes",
         "NetworkZeroError", "SocketAlreadyExistsError",
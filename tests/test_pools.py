@@ -0,0 +1,157 @@
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import os
+import threading
+import time
+import uuid
+
+import pytest
+import zmq
+
+import networkzero as nw0
+nw0.core._enable_debug_logging()
+
+def shout(message):
+    return message.upper()
+
+def slow_shout(message):
+    time.sleep(0.5)
+    return message.upper()
+
+def send_from_threads(address, messages):
+    replies = queue.Queue()
+    def send(message):
+        replies.put((message, nw0.send_message_to(address, message, wait_for_reply_s=5)))
+    threads = [threading.Thread(target=send, args=(message,)) for message in messages]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return dict(replies.get() for _ in messages)
+
+def test_thread_workers():
+    address = nw0.core.address()
+    pool = nw0.pools.serve(address, shout, 2)
+    try:
+        message = uuid.uuid4().hex
+        assert nw0.send_message_to(address, message, wait_for_reply_s=5) == message.upper()
+    finally:
+        pool.stop()
+
+def test_workers_run_concurrently():
+    address = nw0.core.address()
+    messages = [uuid.uuid4().hex for _ in range(4)]
+    pool = nw0.pools.serve(address, slow_shout, len(messages))
+    try:
+        t0 = time.time()
+        replies = send_from_threads(address, messages)
+        assert time.time() - t0 < 1.5
+        assert replies == dict((message, message.upper()) for message in messages)
+    finally:
+        pool.stop()
+
+def test_process_workers():
+    address = nw0.core.address()
+    messages = [uuid.uuid4().hex for _ in range(4)]
+    pool = nw0.pools.serve(address, shout, 2, use_processes=True)
+    try:
+        replies = send_from_threads(address, messages)
+        assert replies == dict((message, message.upper()) for message in messages)
+    finally:
+        pool.stop()
+    #
+    # Stopped workers have been waited for, so none is left a zombie
+    #
+    assert all(worker.exitcode is not None for worker in pool.workers)
+
+@pytest.mark.skipif(not nw0.sockets._has_ipc(), reason="ipc:// is not available")
+def test_process_workers_use_private_endpoint():
+    address = nw0.core.address()
+    pool = nw0.pools.serve(address, shout, 1, use_processes=True)
+    try:
+        directory = nw0.sockets._ipc_directory()
+        assert pool.backend_address.startswith("ipc://%s" % directory)
+        assert nw0.send_message_to(address, "hello", wait_for_reply_s=5) == "HELLO"
+    finally:
+        pool.stop()
+    assert not os.path.exists(pool.backend_address[len("ipc://"):])
+
+def test_address_is_released_on_stop():
+    address = nw0.core.address()
+    pool = nw0.pools.serve(address, shout, 1)
+    with pytest.raises(nw0.SocketAlreadyExistsError):
+        nw0.sockets.get_socket(address, "listener")
+    pool.stop()
+    nw0.sockets.get_socket(address, "listener")
+
+def test_no_workers():
+    with pytest.raises(nw0.NetworkZeroError):
+        nw0.pools.serve(nw0.core.address(), shout, 0)
+
+def test_no_workers_not_advertised():
+    name = uuid.uuid4().hex
+    with pytest.raises(nw0.NetworkZeroError):
+        nw0.advertise(name, handler=shout, workers=0)
+    assert name not in nw0.discovery._services_advertised
+
+def test_message_not_unserialised_gets_empty_reply():
+    address = nw0.core.address()
+    pool = nw0.pools.serve(address, shout, 1)
+    try:
+        #
+        # Pickle isn't accepted by default so the worker can't unserialise
+        # the first message but must still be there for the next
+        #
+        assert "pickle" not in nw0.config.ACCEPTED_SERIALISERS
+        assert nw0.send_message_to(address, "x", wait_for_reply_s=5, serialiser="pickle") is None
+        assert nw0.send_message_to(address, "hello", wait_for_reply_s=5) == "HELLO"
+    finally:
+        pool.stop()
+
+def test_malformed_message_dropped():
+    address = nw0.core.address()
+    pool = nw0.pools.serve(address, shout, 1)
+    #
+    # A raw DEALER sends no empty delimiter frame so the broker can't
+    # find the routing envelope
+    #
+    peer = nw0.sockets.context.socket(zmq.DEALER)
+    peer.connect("tcp://%s" % address)
+    try:
+        peer.send(b"garbage-without-delimiter")
+        time.sleep(0.2)
+        assert pool.is_alive()
+        assert nw0.send_message_to(address, "hello", wait_for_reply_s=5) == "HELLO"
+    finally:
+        peer.close(linger=0)
+        pool.stop()
+
+def test_request_id_handled_once():
+    address = nw0.core.address()
+    handled = []
+    def handler(message):
+        handled.append(message)
+        time.sleep(0.2)
+        return message.upper()
+    pool = nw0.pools.serve(address, handler, 2)
+    try:
+        request_id = uuid.uuid4().hex
+        replies = queue.Queue()
+        def send():
+            replies.put(nw0.send_message_to(address, "message", wait_for_reply_s=5, request_id=request_id))
+        #
+        # The second message arrives while the first is being handled and
+        # the third once it's been answered
+        #
+        threads = [threading.Thread(target=send) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        send()
+        assert [replies.get(timeout=5) for _ in range(3)] == ["MESSAGE"] * 3
+        assert handled == ["message"]
+    finally:
+        pool.stop()
@@ -0,0 +1,57 @@
+import uuid
+
+import pytest
+
+import networkzero as nw0
+nw0.core._enable_debug_logging()
+
+serialisers = nw0.serialisers
+
+@pytest.fixture
+def accept_pickle():
+    nw0.config.ACCEPTED_SERIALISERS.add("pickle")
+    yield
+    nw0.config.ACCEPTED_SERIALISERS.discard("pickle")
+
+def test_json_is_untagged():
+    message = uuid.uuid4().hex
+    assert serialisers.serialise(message) == ('"%s"' % message).encode("ascii")
+
+def test_json_roundtrip():
+    message = [1, "two", {"three": 3.0}]
+    assert serialisers.unserialise(serialisers.serialise(message)) == (message, "json")
+
+def test_default_serialiser_changed(monkeypatch, accept_pickle):
+    monkeypatch.setattr(nw0.config, "DEFAULT_SERIALISER", "pickle")
+    message = (1, "two")
+    assert serialisers.unserialise(serialisers.serialise(message)) == (message, "pickle")
+    assert serialisers.unserialise(serialisers.serialise([1], "json")) == ([1], "json")
+    assert "json" in serialisers.names()
+
+def test_pickle_is_tagged(accept_pickle):
+    message = (1, "two", {"three": 3.0})
+    serialised = serialisers.serialise(message, "pickle")
+    assert serialised[:1] == b"\x01"
+    assert serialisers.unserialise(serialised) == (message, "pickle")
+
+def test_pickle_refused_by_default():
+    serialised = serialisers.serialise(uuid.uuid4().hex, "pickle")
+    with pytest.raises(nw0.NetworkZeroError):
+        serialisers.unserialise(serialised)
+
+def test_unknown_serialiser():
+    with pytest.raises(nw0.NetworkZeroError):
+        serialisers.serialise(uuid.uuid4().hex, uuid.uuid4().hex)
+
+def test_invalid_tag():
+    with pytest.raises(nw0.NetworkZeroError):
+        serialisers.register(uuid.uuid4().hex, ord("{"), repr, eval)
+
+def test_tag_already_used():
+    with pytest.raises(nw0.NetworkZeroError):
+        serialisers.register(uuid.uuid4().hex, 0x01, repr, eval)
+
+@pytest.mark.skipif(serialisers.msgpack is None, reason="msgpack is not installed")
+def test_msgpack_roundtrip():
+    message = [1, "two", {"three": 3.0}, b"four"]
+    assert serialisers.unserialise(serialisers.serialise(message, "msgpack")) == (message, "msgpack")
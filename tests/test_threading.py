@@ -3,29 +3,34 @@ try:
 except ImportError:
     import Queue as queue
 import threading
+import time
 
 import pytest
+import zmq
 
 import networkzero as nw0
 _logger = nw0.core.get_logger("networkzero.tests")
 nw0.core._enable_debug_logging()
 
-def support_test_bound_in_other_thread(address, event1):
+def support_test_bound_in_other_thread(address, event1, event2):
     #
     # Create a socket in a thread and signal to the test
     # which will try -- and fail -- to create a counterpart
-    # listening socket.
+    # listening socket. Stay alive until it has tried, since
+    # the sockets of a finished thread are closed.
     #
     nw0.sockets.get_socket(address, "listener")
     event1.set()
+    event2.wait()
 
 def test_bound_in_other_thread():
     """If a socket is bound in one thread it cannot be
     created and bound in another.
     """
     event1 = threading.Event()
+    event2 = threading.Event()
     address = nw0.address()
-    t = threading.Thread(target=support_test_bound_in_other_thread, args=(address, event1))
+    t = threading.Thread(target=support_test_bound_in_other_thread, args=(address, event1, event2))
     t.setDaemon(True)
     t.start()
     #
@@ -34,10 +39,46 @@ def test_bound_in_other_thread():
     # first and the exception occurs in the support thread
     #
     event1.wait()
-    with pytest.raises(nw0.SocketAlreadyExistsError):
-        socket_from_this_thread = nw0.sockets.get_socket(address, "listener")
+    try:
+        with pytest.raises(nw0.SocketAlreadyExistsError):
+            socket_from_this_thread = nw0.sockets.get_socket(address, "listener")
+    finally:
+        event2.set()
     t.join()
 
+def test_bound_in_finished_thread():
+    """If a socket is bound in a thread which has finished, the
+    socket is closed and the address can be bound in another.
+    """
+    address = nw0.address()
+    q = queue.Queue()
+    t = threading.Thread(target=lambda: q.put(nw0.sockets.get_socket(address, "listener")))
+    t.setDaemon(True)
+    t.start()
+    t.join()
+    socket_from_other_thread = q.get()
+    n_reaped = nw0.sockets.cache_info()["reaped"]
+
+    socket_from_this_thread = nw0.sockets.get_socket(address, "listener")
+    assert socket_from_other_thread.closed
+    assert socket_from_this_thread is not socket_from_other_thread
+    assert nw0.sockets.cache_info()["reaped"] > n_reaped
+
+def test_address_released_if_bind_fails():
+    """If a socket can't be bound to an address, the address isn't kept
+    as though it had been, so it can be bound once it's free.
+    """
+    address = nw0.address()
+    other = nw0.sockets.context.socket(nw0.sockets.Sockets.roles["listener"])
+    nw0.sockets._bind(other, address)
+    try:
+        with pytest.raises(zmq.ZMQError):
+            nw0.sockets.get_socket(address, "listener")
+    finally:
+        nw0.sockets._unbind(other)
+        other.close(linger=0)
+    nw0.sockets.get_socket(address, "listener")
+
 def support_test_connected_in_other_thread(address, q):
     #
     # Create a socket in a thread which will be a different
@@ -59,3 +100,85 @@ def test_connected_in_other_thread():
     socket_from_this_thread = nw0.sockets.get_socket(address, "speaker")
     assert socket_from_other_thread is not socket_from_this_thread
     t.join()
+
+def run_in_thread(function):
+    q = queue.Queue()
+    t = threading.Thread(target=lambda: q.put(function()))
+    t.setDaemon(True)
+    t.start()
+    t.join()
+    return q.get()
+
+def test_least_recently_used_socket_is_evicted(monkeypatch):
+    """When a thread's cache of sockets is full, the socket
+    used least recently is closed to make room for another
+    """
+    monkeypatch.setattr(nw0.config, "SOCKET_CACHE_SIZE", 2)
+    address1, address2, address3 = [nw0.address() for _ in range(3)]
+    def get_sockets():
+        socket1 = nw0.sockets.get_socket(address1, "speaker")
+        socket2 = nw0.sockets.get_socket(address2, "speaker")
+        nw0.sockets.get_socket(address1, "speaker")
+        socket3 = nw0.sockets.get_socket(address3, "speaker")
+        return socket1, socket2, socket3
+    n_evicted = nw0.sockets.cache_info()["evicted_lru"]
+
+    socket1, socket2, socket3 = run_in_thread(get_sockets)
+    assert socket2.closed
+    assert not socket1.closed
+    assert not socket3.closed
+    assert nw0.sockets.cache_info()["evicted_lru"] == n_evicted + 1
+
+def test_subscriber_is_not_evicted(monkeypatch):
+    """A subscriber would lose its subscriptions and any news queued for
+    it if it were closed, so only the speaker is evicted to make room
+    """
+    monkeypatch.setattr(nw0.config, "SOCKET_CACHE_SIZE", 2)
+    monkeypatch.setattr(nw0.config, "SOCKET_IDLE_TIMEOUT_S", 0)
+    address1, address2, address3 = [nw0.address() for _ in range(3)]
+    nw0.sockets.get_socket(address1, "publisher")
+    def get_sockets():
+        socket1 = nw0.sockets.get_socket(address1, "subscriber")
+        socket2 = nw0.sockets.get_socket(address2, "speaker")
+        socket3 = nw0.sockets.get_socket(address3, "speaker")
+        return socket1, socket2, socket3
+
+    socket1, socket2, socket3 = run_in_thread(get_sockets)
+    assert not socket1.closed
+    assert socket2.closed
+    assert not socket3.closed
+
+def test_idle_socket_is_evicted(monkeypatch):
+    """A socket which hasn't been used for a while is closed,
+    but a bound socket is not
+    """
+    monkeypatch.setattr(nw0.config, "SOCKET_IDLE_TIMEOUT_S", 0)
+    address1, address2, address3 = [nw0.address() for _ in range(3)]
+    def get_sockets():
+        socket1 = nw0.sockets.get_socket(address1, "speaker")
+        socket2 = nw0.sockets.get_socket(address2, "listener")
+        socket3 = nw0.sockets.get_socket(address3, "speaker")
+        return socket1, socket2, socket3
+
+    socket1, socket2, socket3 = run_in_thread(get_sockets)
+    assert socket1.closed
+    assert not socket2.closed
+    assert not socket3.closed
+
+def test_reaping_does_not_hold_up_other_sockets(monkeypatch):
+    """Closing a finished thread's bound sockets, which waits for their
+    endpoints to close, doesn't hold up a thread which only wants a
+    socket of its own; one which wants to bind the same address waits
+    """
+    unbind = nw0.sockets._unbind
+    def slow_unbind(socket):
+        time.sleep(1)
+        unbind(socket)
+    monkeypatch.setattr(nw0.sockets, "_unbind", slow_unbind)
+    address = nw0.address()
+    run_in_thread(lambda: nw0.sockets.get_socket(address, "listener"))
+
+    t0 = time.time()
+    run_in_thread(lambda: nw0.sockets.get_socket(nw0.address(), "speaker"))
+    assert time.time() - t0 < 0.5
+    nw0.sockets.get_socket(address, "listener")
@@ -0,0 +1,51 @@
+import zmq
+
+import pytest
+
+import networkzero as nw0
+nw0.core._enable_debug_logging()
+
+def test_no_options_by_default():
+    assert nw0.sockets._socket_options() == {}
+
+def test_profile_is_applied(monkeypatch):
+    monkeypatch.setattr(nw0.config, "SOCKET_PROFILE", "low-latency")
+    socket = nw0.sockets.get_socket(nw0.core.address(), "speaker")
+    assert socket.get(zmq.SNDHWM) == 100
+    assert socket.get(zmq.LINGER) == 0
+    assert socket.get(zmq.TCP_KEEPALIVE) == 1
+
+def test_options_override_profile(monkeypatch):
+    monkeypatch.setattr(nw0.config, "SOCKET_PROFILE", "high-throughput")
+    monkeypatch.setattr(nw0.config, "SOCKET_OPTIONS", {"SNDBUF" : 65536, "IMMEDIATE" : 1})
+    socket = nw0.sockets.get_socket(nw0.core.address(), "listener")
+    assert socket.get(zmq.SNDBUF) == 65536
+    assert socket.get(zmq.RCVBUF) == 4 * 1024 * 1024
+    assert socket.get(zmq.IMMEDIATE) == 1
+
+def test_news_policy_overrides_profile(monkeypatch):
+    monkeypatch.setattr(nw0.config, "SOCKET_PROFILE", "high-throughput")
+    address = nw0.core.address()
+    nw0.set_news_policy(address, hwm=10)
+    socket = nw0.sockets.get_socket(address, "publisher")
+    assert socket.get(zmq.SNDHWM) == 10
+
+def test_io_threads_set_on_first_socket(monkeypatch):
+    monkeypatch.setattr(nw0.config, "SOCKET_PROFILE", "high-throughput")
+    monkeypatch.setattr(nw0.sockets, "_context_configured", False)
+    context = nw0.sockets.Context()
+    try:
+        context.socket(zmq.PAIR).close()
+        assert context.get(zmq.IO_THREADS) == 4
+    finally:
+        context.term()
+
+def test_unknown_profile(monkeypatch):
+    monkeypatch.setattr(nw0.config, "SOCKET_PROFILE", "no-such-profile")
+    with pytest.raises(nw0.NetworkZeroError):
+        nw0.sockets.get_socket(nw0.core.address(), "speaker")
+
+def test_unknown_option(monkeypatch):
+    monkeypatch.setattr(nw0.config, "SOCKET_OPTIONS", {"NO_SUCH_OPTION" : 1})
+    with pytest.raises(nw0.NetworkZeroError):
+        nw0.sockets.get_socket(nw0.core.address(), "speaker")